@@ -0,0 +1,113 @@
+'''
+Benchmark of loading minute candles from a CandleArchive against building a
+DataFrame from raw cbpro responses. Every mode runs in a fresh process so
+its peak RSS can be compared. An append that died before its header is
+checked not to misalign the next one.
+
+    python -m benchmarks.archive [--years 3]
+'''
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from davidplayground.archive import CandleArchive
+from davidplayground.utils import cbquery2df
+
+COLUMNS = ['time', 'low', 'high', 'open', 'close', 'volume']
+
+
+def make_candles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 0.05, size=n))
+    times = 1577836800 + 60 * np.arange(n)
+    return np.column_stack([times, close - 0.1, close + 0.1, close, close, rng.random(n) * 10])
+
+
+def load_json_cbquery2df(root):
+    with open(os.path.join(root, 'raw.json')) as f:
+        return len(cbquery2df(json.load(f)))
+
+
+def load_json_object_frame(root):
+    # the way AlgoBot._loadData builds its history
+    with open(os.path.join(root, 'raw.json')) as f:
+        return len(pd.DataFrame(data=json.load(f), columns=COLUMNS, dtype=object))
+
+
+def load_archive_memmap(root):
+    s = CandleArchive(os.path.join(root, 'archive')).slice('2020-03-01', '2020-09-01')
+    return len(s), float(s['close'][-1])
+
+
+def load_archive_frame(root):
+    return len(CandleArchive(os.path.join(root, 'archive')).slice().to_frame())
+
+
+def _child(fn, root, out):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    t0 = time.perf_counter()
+    try:
+        result = fn(root)
+    except Exception as err:
+        result = f'FAILED: {err!r}'
+    elapsed = time.perf_counter() - t0
+    out.put((result, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - base))
+
+
+def run(fn, root):
+    ctx = mp.get_context('spawn')
+    out = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(fn, root, out))
+    proc.start()
+    result, elapsed, rss = out.get()
+    proc.join()
+    print(f'  {fn.__name__:<24} {elapsed:8.3f}s  peak RSS +{rss:7.1f} MiB  -> {result}')
+
+
+def interrupted(root, n=1000):
+    '''
+    Column bytes a crashed write left past the header count are dropped by
+    the next write instead of shifting its rows.
+    '''
+    candles = pd.DataFrame(make_candles(n), columns=COLUMNS)
+    archive = CandleArchive(os.path.join(root, 'interrupted'))
+    archive.write(candles.iloc[:n // 2])
+    # the columns of a write, without its header
+    for name in COLUMNS:
+        dtype = np.int64 if name == 'time' else np.float64
+        with open(archive._path(name), 'ab') as f:
+            f.write(np.arange(7, dtype=dtype).tobytes())
+    archive = CandleArchive(os.path.join(root, 'interrupted'))
+    assert archive.write(candles.iloc[n // 2:]) == n - n // 2
+    got = archive.slice().to_frame(unit='s')
+    for name in COLUMNS:
+        assert np.array_equal(got[name].to_numpy(dtype=np.float64), candles[name].to_numpy()), name
+        assert os.path.getsize(archive._path(name)) == n * 8, name
+
+
+def main(years=3):
+    n = years * 365 * 24 * 60
+    with tempfile.TemporaryDirectory() as root:
+        candles = make_candles(n)
+        with open(os.path.join(root, 'raw.json'), 'w') as f:
+            json.dump([[int(c[0])] + list(c[1:]) for c in candles], f)
+        CandleArchive(os.path.join(root, 'archive')).write(pd.DataFrame(candles, columns=COLUMNS))
+        del candles
+        interrupted(root)
+        print(f'{n} minute candles ({years} years)')
+        for fn in (load_json_cbquery2df, load_json_object_frame, load_archive_memmap, load_archive_frame):
+            run(fn, root)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=3)
+    args = parser.parse_args()
+    main(years=args.years)
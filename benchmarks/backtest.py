@@ -0,0 +1,95 @@
+'''
+Bars per second of TradeHandler.backtest against the per-row act_on path,
+for an EMA crossover strategy written both ways. Both paths are checked to
+end with the same trades, wallets and portfolio values.
+
+    python -m benchmarks.backtest --bars 525600
+'''
+import argparse
+import time
+
+import numpy as np
+
+from davidplayground.datasets import WienerDataset
+from davidplayground.tradehandling import TradeHandler
+from davidplayground.utils import add_ema
+
+
+class EMACross(TradeHandler):
+    '''
+    Holds `amt` of the coin while the fast EMA is above the slow one,
+    nothing otherwise.
+    '''
+    def __init__(self, amt=1.0, fast=30, slow=120, record=False, **kwargs):
+        super().__init__(logic=None, **kwargs)
+        self.amt = amt
+        self.windows = [fast, slow]
+        self.fast, self.slow = f'close_ema{fast}', f'close_ema{slow}'
+        self.record = record
+        self.values = []
+
+    def act(self, row, name):
+        super().act(row, name)
+        fast, slow = row[self.fast], row[self.slow]
+        if fast == fast and slow == slow:
+            target = self.amt if fast > slow else 0.0
+            if target > self.wallets[name]:
+                self._buy(row['close'], target - self.wallets[name], name)
+            elif target < self.wallets[name]:
+                self._sell(row['close'], self.wallets[name] - target, name)
+        if self.record:
+            self.values.append(self.portfolio_value())
+
+    def indicators(self):
+        return [(add_ema, {'dt': self.windows})]
+
+    def targets(self, df, name):
+        fast, slow = df[self.fast].to_numpy(), df[self.slow].to_numpy()
+        targets = np.where(fast > slow, self.amt, 0.0)
+        targets[np.isnan(fast) | np.isnan(slow)] = np.nan
+        return targets
+
+
+def dataset(bars, seed=0):
+    W = WienerDataset(s0=100.0, nsigma=0.5)
+    W.add_treatment(add_ema, {'dt': [30, 120]})
+    return W.generate(hours=bars // 60, seed=seed)
+
+
+def check(df, **kwargs):
+    rows = EMACross(record=True, **kwargs)
+    rows.act_on(df, 'BTC')
+    vec = EMACross(**kwargs)
+    curve = vec.backtest(df, 'BTC')
+    assert rows.trades == vec.trades, 'trades differ'
+    assert rows.wallets == vec.wallets, (rows.wallets, vec.wallets)
+    assert np.array_equal(rows.values, curve['value'].to_numpy()), 'portfolio values differ'
+    return len(vec.trades)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, default=525600)
+    parser.add_argument('--row-bars', type=int, default=20000, help='bars for the slower act_on path')
+    args = parser.parse_args()
+
+    df = dataset(args.bars)
+    small = df.iloc[:args.row_bars]
+    # plenty of capital, and too little for some of the buys
+    for capital in (10**6, 100.0):
+        trades = check(small, amt=1.0, initial_capital=capital)
+        print(f'act_on == backtest over {len(small)} bars, capital {capital}: {trades} trades')
+
+    t0 = time.perf_counter()
+    EMACross(initial_capital=10**6).act_on(small, 'BTC')
+    t_rows = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    bot = EMACross(initial_capital=10**6)
+    bot.backtest(df, 'BTC')
+    t_vec = time.perf_counter() - t0
+    print(f'  act_on    {len(small) / t_rows:12,.0f} bars/s')
+    print(f'  backtest  {len(df) / t_vec:12,.0f} bars/s  ({len(df)} bars, {len(bot.trades)} trades)')
+
+
+if __name__ == '__main__':
+    main()
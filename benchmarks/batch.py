@@ -0,0 +1,107 @@
+'''
+Scaling of SymbolBatch from one worker process to all cores, over symbols
+generated by WienerDataset so it runs offline. Every run is checked against
+treating the symbols one by one in this process, as are jobs of the same
+symbol over different ranges.
+
+    python -m benchmarks.batch --symbols 64 --hours 2000
+'''
+import argparse
+import os
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from davidplayground.batch import SymbolBatch
+from davidplayground.datasets import WienerDataset
+from davidplayground.utils import add_ema, add_bollinger, add_rsi, add_macd
+
+
+def wiener_loader(product, granularity, start, end):
+    '''
+    Loader of a minute-level Wiener path per product, the same path for the
+    same product and range.
+    '''
+    hours = int((datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds() // 3600)
+    W = WienerDataset(s0=100.0, nsigma=0.5)
+    df = W.generate(hours=hours, rng=W.path_rng(zlib.crc32(product.encode()), granularity), raw=True)
+    df['time'] = pd.date_range(start=start, periods=len(df), freq='60s')
+    return df
+
+
+def batch(loader, workers, chunk_size):
+    B = SymbolBatch(loader=loader, workers=workers, chunk_size=chunk_size)
+    B.add_treatment(add_ema, {'dt': [12, 26, 50]})
+    B.add_treatment(add_macd)
+    B.add_treatment(add_rsi, {'dt': 14, 'middle': 'wilder'})
+    B.add_treatment(add_bollinger, {'dt': 20})
+    return B
+
+
+def same(result, expected):
+    for key, df in expected.frames.items():
+        got = result[key]
+        assert list(got.columns) == list(df.columns), key
+        for col in df.columns:
+            assert np.array_equal(got[col].to_numpy(), df[col].to_numpy(), equal_nan=True), (key, col)
+
+
+def duplicates(chunk_size):
+    '''
+    Jobs of the same symbol and granularity over different ranges come back
+    as separate datasets, with or without workers.
+    '''
+    jobs = [('SYM0', 60, '2021-01-01T00:00:00', '2021-01-03T00:00:00'),
+            ('SYM0', 60, '2021-02-01T00:00:00', '2021-02-02T00:00:00'),
+            ('SYM1', 60, '2021-01-01T00:00:00', '2021-01-02T00:00:00')]
+    expected = batch(wiener_loader, 0, chunk_size).run(jobs)
+    assert list(expected.frames) == jobs
+    assert [len(df) for df in expected.frames.values()] == [48 * 60, 24 * 60, 24 * 60]
+    result = batch(wiener_loader, 2, chunk_size).run(jobs)
+    assert list(result.frames) == jobs
+    same(result, expected)
+    assert len(result['SYM1', 60]) == 24 * 60
+    try:
+        result['SYM0', 60]
+    except Exception as err:
+        assert 'matches 2 jobs' in str(err)
+    else:
+        raise AssertionError('ambiguous key did not raise')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=64)
+    parser.add_argument('--hours', type=int, default=2000)
+    parser.add_argument('--chunk-size', type=int, default=2)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    start = '2021-01-01T00:00:00'
+    end = datetime.fromtimestamp(datetime.fromisoformat(start).timestamp() + args.hours * 3600).isoformat()
+    jobs = [(f'SYM{i}', 60, start, end) for i in range(args.symbols)]
+
+    duplicates(args.chunk_size)
+    print('jobs of one symbol over different ranges kept apart')
+
+    t0 = time.perf_counter()
+    expected = batch(wiener_loader, 0, args.chunk_size).run(jobs)
+    t_inline = time.perf_counter() - t0
+    rows = sum(len(df) for df in expected.frames.values())
+    print(f'{args.symbols} symbols, {rows} rows, treated in this process in {t_inline:.2f}s')
+
+    workers = sorted({1, 2, 4, 8, 16, 32, args.max_workers} & set(range(1, args.max_workers + 1)))
+    for n in workers:
+        result = batch(wiener_loader, n, args.chunk_size).run(jobs)
+        same(result, expected)
+        table = result.timing_table()
+        print(f'  {n:>3} workers  {result.elapsed:7.2f}s  {rows / result.elapsed / 1e6:6.2f}M rows/s  '
+              f'speedup {t_inline / result.elapsed:5.2f}x  per symbol: load {table["load"].mean() * 1e3:6.1f}ms '
+              f'treat {table["treat"].mean() * 1e3:6.1f}ms transfer {table["transfer"].mean() * 1e3:6.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
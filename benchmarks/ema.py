@@ -0,0 +1,67 @@
+'''
+Benchmark of the EMA kernel against the iterrows implementation add_ema
+used to have, checking both give identical columns.
+
+    python -m benchmarks.ema [--legacy-max 100000]
+'''
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from davidplayground.datasets import WienerDataset
+from davidplayground.kernels import emas
+from davidplayground.utils import add_ema, add_macd
+
+
+def legacy_add_ema(df, dt=2, smoothing=2.0, cols=['close']):
+    for col in cols:
+        ema0 = df[col][:dt].mean()
+        if pd.isna(ema0):
+            ema0 = 0.0
+        ema_col = [None for _ in range(dt)]
+        for index, row in df.iterrows():
+            if index < dt:
+                continue
+            elif pd.isna(row[col]):
+                ema_col.append(None)
+                continue
+            ema1 = row[col]*(smoothing/(1.0 + dt)) + ema0*(1 - smoothing/(1.0 + dt))
+            ema_col.append(ema1)
+            ema0 = ema1
+        df[col + '_ema' + str(dt)] = ema_col
+    return df
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main(sizes=(10080, 10**5, 10**6), legacy_max=10**5):
+    W = WienerDataset(s0=1.0, nsigma=0.1)
+    emas(np.ones(100), [26]) # warm up the scipy import
+    for n in sizes:
+        df = W.generate(hours=n // 60, seed=0, raw=True)
+        df.loc[df.index[100:110], 'close'] = np.nan
+        new, t_new = timed(add_ema, df.copy(), dt=26)
+        line = f'{len(df):>8} bars  add_ema {t_new * 1e3:9.2f}ms'
+        if n <= legacy_max:
+            old, t_old = timed(legacy_add_ema, df.copy(), dt=26)
+            assert np.array_equal(old['close_ema26'].to_numpy(dtype=np.float64),
+                                  new['close_ema26'].to_numpy(), equal_nan=True)
+            line += f'  iterrows {t_old * 1e3:10.2f}ms  speedup {t_old / t_new:8.1f}x'
+        print(line)
+        _, t_macd = timed(add_macd, df.copy())
+        _, t_many = timed(emas, np.tile(df['close'].to_numpy()[:, None], 8), [12, 26, 50, 100, 200])
+        print(f'{"":>8}       add_macd {t_macd * 1e3:8.2f}ms  5 windows x 8 columns {t_many * 1e3:8.2f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--legacy-max', type=int, default=10**5,
+                        help='largest size to also run the iterrows EMA at')
+    args = parser.parse_args()
+    main(legacy_max=args.legacy_max)
@@ -0,0 +1,71 @@
+'''
+Benchmark of CoinDataset.get against a local stub exchange, sequential
+queries vs the concurrent fetch engine. No network access is needed.
+
+    python -m benchmarks.fetch [--days 180] [--latency 0.02]
+'''
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from davidplayground.datasets import CoinDataset
+
+
+class StubClient:
+    '''
+    Stand-in for cbpro.PublicClient serving synthetic candles after a fixed
+    latency. Calls beyond `limit` per second get cbpro's rate limit body.
+    '''
+    def __init__(self, latency=0.02, limit=None):
+        self.latency = latency
+        self.limit = limit
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_product_historic_rates(self, product_id, start=None, end=None, granularity=None):
+        now = time.monotonic()
+        with self._lock:
+            self.calls = [c for c in self.calls if now - c < 1.0]
+            if self.limit and len(self.calls) >= self.limit:
+                return {'message': 'Public rate limit exceeded'}
+            self.calls.append(now)
+        time.sleep(self.latency)
+        t0 = int(datetime.fromisoformat(start).timestamp())
+        t1 = int(datetime.fromisoformat(end).timestamp())
+        times = np.arange(t1 - t1 % granularity, t0 - 1, -granularity)
+        close = 100.0 + np.sin(times / 3600.0)
+        return [[int(t), c - 1, c + 1, c, c, 10.0] for t, c in zip(times, close)]
+
+
+def run(client, workers, rate, start, end):
+    cd = CoinDataset(name='BTC', client=client, workers=workers, rate=rate)
+    t0 = time.perf_counter()
+    df = cd.get(start, end, granularity=60, raw=True)
+    elapsed = time.perf_counter() - t0
+    stats = cd.fetcher.stats
+    print(f'  workers={workers:<3} rate={str(rate):<6} {stats["windows"]:>6} windows  '
+          f'{stats["windows"] / elapsed:8.1f} windows/s  {elapsed:7.2f}s end-to-end  '
+          f'{stats["throttled"]} throttled  {len(df)} candles')
+
+
+def main(days=180, latency=0.02, limit=200):
+    end = datetime(2021, 8, 1)
+    start = end - timedelta(days=days)
+    print(f'{start} -> {end}, 1 minute candles, stub latency {latency * 1e3:.0f}ms, '
+          f'stub limit {limit} req/s')
+    run(StubClient(latency, limit), 1, None, start.isoformat(), end.isoformat())
+    for workers in (4, 16, 32):
+        run(StubClient(latency, limit), workers, 0.75 * limit, start.isoformat(), end.isoformat())
+    run(StubClient(latency, limit), 32, None, start.isoformat(), end.isoformat())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--limit', type=int, default=200)
+    args = parser.parse_args()
+    main(days=args.days, latency=args.latency, limit=args.limit)
@@ -0,0 +1,81 @@
+'''
+Forecast latency of Forecaster over several products as their history
+grows. Each step adds one bar per product to its feature window and
+forecasts all products in one batched call. The numpy runtime runs a
+randomly initialized LSTM classifier; with TensorFlow installed the
+keras and tflite runtimes are timed on the same weights.
+
+    python -m benchmarks.forecast --products 8 --steps 500
+'''
+import argparse
+import importlib.util
+import time
+
+import numpy as np
+
+from benchmarks.walk_forward import hourly_candles
+from jacobplayground.Forecaster import Forecaster, NumpyModel
+from jacobplayground.TechnicalIndicators import TechnicalIndicators
+from jacobplayground.WalkForward import FEATURES
+
+
+def random_model(n_features, units=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return NumpyModel([
+        ('lstm', rng.normal(0, 0.1, (n_features, 4 * units)), rng.normal(0, 0.1, (units, 4 * units)),
+         np.zeros(4 * units)),
+        ('dense', rng.normal(0, 0.1, (units, 3)), np.zeros(3), 'softmax'),
+    ])
+
+
+def keras_model(numpy_model, lookback):
+    from jacobplayground.WalkForward import build_model
+
+    model = build_model(lookback, len(FEATURES), units=numpy_model.layers[0][2].shape[0])
+    weights = [w for layer in numpy_model.layers for w in layer[1:] if not isinstance(w, str)]
+    model.set_weights(weights)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=8)
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--lookback', type=int, default=96)
+    args = parser.parse_args()
+
+    histories = [10**3, 10**4, 10**5]
+    candles = {f'P{i}': hourly_candles(max(histories) + args.steps, seed=i) for i in range(args.products)}
+    numpy_model = random_model(len(FEATURES))
+    runtimes = {'numpy': numpy_model}
+    if importlib.util.find_spec('tensorflow') is not None:
+        runtimes['keras'] = runtimes['tflite'] = keras_model(numpy_model, args.lookback)
+
+    # the incremental windows hold the same features as the batch indicators
+    df = candles['P0'].iloc[:2000]
+    batch = TechnicalIndicators(df.copy(), trend=['macd', 'trix'], momentum=['rsi'], volatility=['bbands']).df
+    F = Forecaster(numpy_model, lookback=args.lookback, runtime='numpy')
+    F.addProduct('P0', df)
+    assert np.allclose(F.windows['P0'].window(), batch[FEATURES].to_numpy()[-args.lookback:], rtol=1e-5)
+
+    print(f'{args.products} products, {args.steps} forecasts per history length')
+    for runtime, model in runtimes.items():
+        for n in histories:
+            F = Forecaster(model, lookback=args.lookback, runtime=runtime)
+            t0 = time.perf_counter()
+            for product, df in candles.items():
+                F.addProduct(product, df.iloc[:n])
+            t_seed = time.perf_counter() - t0
+            F.forecast()    # warm up, loads the model
+            F.latencies.clear()
+            for step in range(n, n + args.steps):
+                for product, df in candles.items():
+                    F.update(product, df['high'].iat[step], df['low'].iat[step], df['close'].iat[step])
+                F.forecast()
+            stats = F.latency()
+            print(f'  {runtime:>6}  {n:>7} bars of history  p50 {stats["p50"]:7.3f}ms  p99 {stats["p99"]:7.3f}ms'
+                  f'  (seeding {t_seed:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
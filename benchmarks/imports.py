@@ -0,0 +1,65 @@
+'''
+Import time of the numeric core in fresh interpreters, and a regression
+check that none of the heavy optional dependencies load with it.
+
+    python -m benchmarks.imports --repeat 5
+'''
+import argparse
+import statistics
+import subprocess
+import sys
+
+CORE = [
+    'davidplayground.datasets',
+    'davidplayground.utils',
+    'davidplayground.tradehandling',
+    'davidplayground.streaming',
+    'davidplayground.batch',
+    'davidplayground.sweep',
+    'jacobplayground.TechnicalIndicators',
+    'jacobplayground.WalkForward',
+    'jacobplayground.Forecaster',
+]
+HEAVY = ['sklearn', 'scipy', 'cbpro', 'tensorflow', 'matplotlib', 'seaborn']
+
+PROBE = '''
+import sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(elapsed, ','.join(m for m in {heavy!r} if m in sys.modules))
+'''
+
+
+def import_time(module, repeat):
+    '''
+    :return: (median seconds, heavy modules loaded by the import)
+    '''
+    times, loaded = [], ''
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+                             capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        loaded = out[1] if len(out) > 1 else ''
+    return statistics.median(times), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    base, _ = import_time('numpy, pandas', args.repeat)
+    print(f'  {"numpy + pandas":<38} {base * 1e3:8.1f}ms')
+    failed = []
+    for module in CORE:
+        elapsed, loaded = import_time(module, args.repeat)
+        print(f'  {module:<38} {elapsed * 1e3:8.1f}ms  (+{(elapsed - base) * 1e3:6.1f}ms){"  loads " + loaded if loaded else ""}')
+        if loaded:
+            failed.append(module)
+    if failed:
+        raise SystemExit(f'heavy dependencies imported by {", ".join(failed)}')
+
+
+if __name__ == '__main__':
+    main()
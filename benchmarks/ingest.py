@@ -0,0 +1,66 @@
+'''
+Micro-benchmark of ingesting raw cbpro candles: the row-wise
+cbquery2df/convert_timestamps pair against cbquery2df/ingest_candles.
+
+    python -m benchmarks.ingest [--legacy-max 100000]
+'''
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from davidplayground.utils import cbquery2df, ingest_candles
+
+
+def legacy_cbquery2df(query):
+    row_format = ['time', 'low', 'high', 'open', 'close', 'volume']
+    rows = []
+    for qi in query:
+        rows.append(dict(zip(row_format, qi)))
+    # CoinDataset.get appended the windows to an empty frame, leaving object columns
+    return pd.DataFrame(rows).astype(object)
+
+
+def legacy_convert_timestamps(df):
+    def subfunc(row):
+        row['time'] = datetime.fromtimestamp(row['time'])
+        return row
+    df = df.apply(subfunc, axis=1)
+    df = df.sort_values('time', ascending=True)
+    return df.reset_index(drop=True)
+
+
+def make_query(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 0.05, size=n))
+    times = 1609459200 + 60 * np.arange(n)[::-1]
+    return [[int(t), c - 0.1, c + 0.1, c, c, v] for t, c, v in zip(times, close, rng.random(n))]
+
+
+def main(sizes=(10**5, 10**6), legacy_max=10**5):
+    for n in sizes:
+        query = make_query(n)
+        t0 = time.perf_counter()
+        new = ingest_candles(cbquery2df(query))
+        t_new = time.perf_counter() - t0
+        line = f'{n:>9} candles  vectorized {t_new:8.3f}s'
+        if n <= legacy_max:
+            t0 = time.perf_counter()
+            old = legacy_convert_timestamps(legacy_cbquery2df(query))
+            t_old = time.perf_counter() - t0
+            assert (pd.to_datetime(old['time']).to_numpy() == new['time'].to_numpy()).all()
+            assert np.array_equal(old['close'].to_numpy(dtype=np.float64), new['close'].to_numpy())
+            line += f'  row-wise {t_old:8.3f}s  speedup {t_old / t_new:7.1f}x'
+        else:
+            line += '  row-wise (skipped)'
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--legacy-max', type=int, default=10**5,
+                        help='largest size to also run the row-wise ingest at')
+    args = parser.parse_args()
+    main(legacy_max=args.legacy_max)
@@ -0,0 +1,105 @@
+'''
+Cost of the instrumentation and a sample report. A treated WienerDataset,
+a CoinDataset fetch from the stub exchange and an EMACross act_on and
+backtest run with instrumentation off, on without memory tracing, and on
+with tracemalloc, checked to give the same results every time. The report
+of the last run can be written as JSON for benchmark jobs to compare.
+
+    python -m benchmarks.instrument --hours 720 --out report.json --profile cprofile
+'''
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from benchmarks.backtest import EMACross
+from benchmarks.fetch import StubClient
+from davidplayground import instrument
+from davidplayground.datasets import CoinDataset, WienerDataset
+from davidplayground.instrument import Instrumentation
+from davidplayground.utils import add_bollinger, add_ema, add_rsi
+
+
+def workload(hours, row_bars, days):
+    W = WienerDataset(s0=100.0, nsigma=0.5)
+    W.add_treatment(add_ema, {'dt': [30, 120]})
+    W.add_treatment(add_rsi, {'dt': 14})
+    W.add_treatment(add_bollinger, {'dt': 20})
+    df = W.generate(hours=hours, seed=0)
+
+    end = datetime(2021, 8, 1)
+    coin = CoinDataset(client=StubClient(latency=0.0), workers=4, rate=None)
+    candles = coin.get((end - timedelta(days=days)).isoformat(), end.isoformat())
+
+    rows = EMACross(initial_capital=10**6)
+    rows.act_on(df.iloc[:row_bars], 'BTC')
+    vec = EMACross(initial_capital=10**6)
+    curve = vec.backtest(df, 'BTC')
+    return df, candles, rows.trades, curve
+
+
+def timed(hours, row_bars, days, instr=None):
+    t0 = time.perf_counter()
+    if instr is None:
+        out = workload(hours, row_bars, days)
+    else:
+        with instr:
+            out = workload(hours, row_bars, days)
+    return time.perf_counter() - t0, out
+
+
+def same(a, b):
+    df, candles, trades, curve = a
+    # generated times start at the current time
+    pd.testing.assert_frame_equal(df.drop(columns='time'), b[0].drop(columns='time'))
+    pd.testing.assert_frame_equal(candles, b[1])
+    assert trades == b[2], 'act_on trades differ'
+    pd.testing.assert_frame_equal(curve, b[3])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=int, default=24 * 30)
+    parser.add_argument('--row-bars', type=int, default=5000, help='bars for the per-row act_on path')
+    parser.add_argument('--days', type=int, default=30, help='days of candles to fetch')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=None)
+    parser.add_argument('--out', default=None, help='file to write the JSON report to')
+    args = parser.parse_args()
+
+    n = 10**6
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with instrument.section('step', 'noop'):
+            pass
+    per_section = (time.perf_counter() - t0) / n
+    print(f'disabled section: {per_section * 1e9:.0f}ns')
+
+    workload(args.hours, args.row_bars, args.days) # warm up
+    t_off, base = timed(args.hours, args.row_bars, args.days)
+    t_on, out = timed(args.hours, args.row_bars, args.days, Instrumentation(memory=False))
+    same(base, out)
+    instr = Instrumentation(profile=args.profile)
+    t_mem, out = timed(args.hours, args.row_bars, args.days, instr)
+    same(base, out)
+    report = instr.report()
+    sections = sum(s['calls'] for kind in report['sections'].values() for s in kind.values())
+    print(f'{sections} sections a run; disabled they cost {sections * per_section * 1e3:.2f}ms '
+          f'of the {t_off:.2f}s run')
+    print(f'  off                {t_off:7.2f}s')
+    print(f'  on                 {t_on:7.2f}s')
+    print(f'  on + tracemalloc   {t_mem:7.2f}s')
+
+    for kind, names in report['sections'].items():
+        for name, s in names.items():
+            peak = '' if s['peak_bytes'] is None else f'  peak {s["peak_bytes"] / 2**20:8.2f}MiB'
+            print(f'  {kind:<9} {name:<48} {s["calls"]:>6}x  {s["mean_ms"]:9.3f}ms  '
+                  f'p99 {s["p99_ms"]:9.3f}ms  {s["rows"]:>9} rows{peak}')
+    json.loads(instr.to_json(args.out))
+    if args.out:
+        print(f'report written to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''
+Orders per second of PaperExchange and an accelerated AlgoBot soak test
+against it. Balances are checked against replaying the order log, the
+hourly historic rates against a pandas groupby of the minute candles, and
+the soak run to cover its sessions on the virtual clock without sleeping.
+
+    python -m benchmarks.paper_exchange --orders 100000 --sessions 20
+'''
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from davidplayground.realtime.notif import Notifier, MemorySink
+from jacobplayground.AlgoBot import AlgoBot
+from jacobplayground.Clock import VirtualClock
+from jacobplayground.PaperExchange import PaperExchange, toEpoch
+
+START = '2021-01-01'
+
+
+class RandomBot(AlgoBot):
+    '''
+    AlgoBot trading on coin flips instead of a trained model.
+    '''
+    def __init__(self, *args, seed=0, **kwargs):
+        self.rng = np.random.default_rng(seed)
+        super().__init__(*args, **kwargs)
+
+    def predict(self):
+        return int(self.rng.integers(-1, 2))
+
+
+def orders(n, seed=0):
+    clock = VirtualClock(START)
+    exchange = PaperExchange.fromWiener(hours=n // 60 + 48, start=START, clock=clock, cash=1e9, seed=seed,
+                                        latency=0.05)
+    clock.sleep(3600)
+    rng = np.random.default_rng(seed)
+    sides = rng.choice(['buy', 'sell'], size=n)
+    amounts = rng.uniform(0.001, 0.01, size=n)
+    t0 = time.perf_counter()
+    for side, amount in zip(sides.tolist(), amounts.tolist()):
+        if side == 'buy':
+            exchange.place_market_order('BTC-USD', 'buy', funds=amount * 30000)
+        else:
+            exchange.place_market_order('BTC-USD', 'sell', size=amount)
+        clock.sleep(60)
+    elapsed = time.perf_counter() - t0
+
+    filled = [o for o in exchange.orders if 'filled_size' in o]
+    usd, btc = 1e9, 0.0
+    for o in filled:
+        size, value, fees = float(o['filled_size']), float(o['executed_value']), float(o['fill_fees'])
+        assert np.isclose(fees, value * exchange.fee)
+        if o['side'] == 'buy':
+            usd, btc = usd - value - fees, btc + size
+        else:
+            usd, btc = usd + value - fees, btc - size
+    assert np.isclose(usd, exchange.balances['USD']) and np.isclose(btc, exchange.balances['BTC'])
+    print(f'{n} market orders in {elapsed:.2f}s: {n / elapsed:,.0f} orders/s ({len(filled)} filled, '
+          f'{n - len(filled)} rejected for insufficient funds)')
+
+    now = clock.time()
+    rates = exchange.get_product_historic_rates('BTC-USD', start=now - 200 * 3600, end=now, granularity=3600)
+    got = pd.DataFrame(rates, columns=['time', 'low', 'high', 'open', 'close', 'volume'])[::-1]
+    minutes = pd.DataFrame({'time': exchange.time, 'low': exchange.low, 'high': exchange.high,
+                            'open': exchange.open, 'close': exchange.close, 'volume': exchange.volume})
+    minutes = minutes[minutes['time'] < np.floor(now / 3600) * 3600]
+    ref = minutes.groupby(minutes['time'] // 3600 * 3600).agg(
+        low=('low', 'min'), high=('high', 'max'), open=('open', 'first'), close=('close', 'last'),
+        volume=('volume', 'sum')).reset_index().iloc[-len(got):]
+    # the hours completed since the first candle, up to the 200 asked for
+    expected = min(200, int((now - toEpoch(START)) // 3600))
+    assert len(got) == expected, (len(got), expected)
+    assert not expected or got['time'].iloc[-1] + 3600 <= now
+    for col in ['time', 'low', 'high', 'open', 'close']:
+        assert np.array_equal(got[col].to_numpy(dtype=np.float64), ref[col].to_numpy(dtype=np.float64)), col
+    assert np.allclose(got['volume'], ref['volume'])
+
+
+def soak(sessions, seed=0):
+    clock = VirtualClock(toEpoch(START) + 181 * 86400)
+    hours = 181 * 24 + sessions * 16 * 24 + 48
+    exchange = PaperExchange.fromWiener(hours=hours, start=START, clock=clock, cash=1000.0, seed=seed)
+    sink = MemorySink()
+    bot = RandomBot('BTC-USD', 1000.0, client=exchange, clock=clock, spillDir=None,
+                    notifier=Notifier([sink], rate=None).start(), seed=seed)
+    t_start, t0 = clock.time(), time.perf_counter()
+    for _ in range(sessions):
+        bot.runSim()
+        bot.reset()
+    elapsed = time.perf_counter() - t0
+    bot.notifier.close()
+    simulated = clock.time() - t_start
+    steps = bot.session.netWorth.count
+    assert steps == sessions * (bot.MAX_TRADING_SESSION // 6)
+    assert simulated == steps * 12 * 3600
+    assert bot.session.transactions.count == len(exchange.orders)
+    print(f'{sessions} sessions of {bot.MAX_TRADING_SESSION // 6} steps: {simulated / 86400:.0f} simulated days in '
+          f'{elapsed:.2f}s ({simulated / elapsed / 86400:,.0f} days/s), {len(exchange.orders)} orders, '
+          f'net worth {bot.getNetWorth():.2f} from 1000.00')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--sessions', type=int, default=20)
+    args = parser.parse_args()
+    orders(args.orders)
+    soak(args.sessions)
+
+
+if __name__ == '__main__':
+    main()
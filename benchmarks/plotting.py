@@ -0,0 +1,105 @@
+'''
+Render time of the candlestick chart against the number of candles: the
+collection renderer with and without level-of-detail merging, and the
+former one-artist-per-candle loop up to --legacy-max candles. The drawn
+geometry is checked against the loop's rectangles and lines, and the
+merged candles against a pandas groupby.
+
+    python -m benchmarks.plotting --candles 1000 10000 100000 1000000
+'''
+import argparse
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.lines import Line2D
+from matplotlib.patches import Rectangle
+
+from benchmarks.realtime import candles
+from davidplayground.plotting import candlestick, DEFAULT_STYLE
+
+
+def legacy_candlestick(ohlc, ax):
+    '''
+    The former renderer: one Rectangle and one Line2D per candle.
+    '''
+    dt = ohlc.loc[1, 'time'] - ohlc.loc[0, 'time']
+    w = 0.75
+    for i in range(len(ohlc)):
+        o, h, l, c = ohlc.loc[i, 'open'], ohlc.loc[i, 'high'], ohlc.loc[i, 'low'], ohlc.loc[i, 'close']
+        t = ohlc.loc[i, 'time']
+        color = DEFAULT_STYLE['upcolor'] if not c < o else DEFAULT_STYLE['downcolor']
+        ax.add_patch(Rectangle((t - dt * w * 0.5, c), w * dt, o - c, facecolor=color, alpha=0.5, edgecolor='None'))
+        ax.add_line(Line2D([t, t], [l, h], marker='None', color=color, alpha=0.5))
+
+
+def render(df, draw, **kwargs):
+    fig, ax = plt.subplots(figsize=(12, 6), dpi=100)
+    t0 = time.perf_counter()
+    artist = draw(df, ax=ax, **kwargs)
+    if draw is legacy_candlestick:
+        ax.autoscale_view()
+    fig.canvas.draw()
+    elapsed = time.perf_counter() - t0
+    return fig, ax, artist, elapsed
+
+
+def check(df):
+    fig, ax, artist, _ = render(df, candlestick, lod=False)
+    _, lax, _, _ = render(df, legacy_candlestick)
+    corners = np.array([[p.get_xy(), (p.get_x() + p.get_width(), p.get_y() + p.get_height())] for p in lax.patches])
+    verts = np.array([p.vertices[:4] for p in artist.bodies.get_paths()])
+    assert np.allclose(verts.min(axis=1), np.minimum(corners[:, 0], corners[:, 1]))
+    assert np.allclose(verts.max(axis=1), np.maximum(corners[:, 0], corners[:, 1]))
+    segments = np.array([line.get_xydata() for line in lax.lines])
+    assert np.allclose(np.array(artist.wicks.get_segments()), segments)
+    ups = np.array([p.get_facecolor() for p in lax.patches])
+    assert np.allclose(artist.bodies.get_facecolor(), ups)
+    plt.close('all')
+
+    fig, ax, artist, _ = render(df, candlestick)
+    k = artist.k
+    assert k > 1
+    g = np.arange(len(df)) // k
+    ref = df.groupby(g).agg(open=('open', 'first'), high=('high', 'max'), low=('low', 'min'), close=('close', 'last'))
+    segments = np.array(artist.wicks.get_segments())
+    assert np.allclose(segments[:, 0, 1], ref['low']) and np.allclose(segments[:, 1, 1], ref['high'])
+    # zooming in re-aggregates down to the raw candles
+    ax.set_xlim(df['time'].iloc[100], df['time'].iloc[200])
+    assert artist.k == 1 and len(artist.wicks.get_segments()) == 103
+    plt.close('all')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candles', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--legacy-max', type=int, default=10000)
+    args = parser.parse_args()
+
+    check(candles(3000))
+    print(f'{"candles":>9} {"legacy":>9} {"no lod":>9} {"lod":>9} {"zoom":>9}')
+    for n in args.candles:
+        df = candles(n)
+        row = [f'{n:>9}']
+        if n <= args.legacy_max:
+            row.append(f'{render(df, legacy_candlestick)[3]:8.3f}s')
+        else:
+            row.append(f'{"-":>9}')
+        plt.close('all')
+        row.append(f'{render(df, candlestick, lod=False)[3]:8.3f}s')
+        plt.close('all')
+        fig, ax, artist, elapsed = render(df, candlestick)
+        row.append(f'{elapsed:8.3f}s')
+        t0 = time.perf_counter()
+        ax.set_xlim(df['time'].iloc[n // 2], df['time'].iloc[n // 2 + n // 10])
+        fig.canvas.draw()
+        row.append(f'{time.perf_counter() - t0:8.3f}s')
+        plt.close('all')
+        print(' '.join(row))
+
+
+if __name__ == '__main__':
+    main()
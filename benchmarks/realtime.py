@@ -0,0 +1,162 @@
+'''
+Throughput and tick -> signal latency of RealtimeFeed over a replay of
+generated minute candles, with an indicator updater, a strategy and a
+deliberately slow subscriber attached. The bars the feed aggregates are
+checked against resampling the candles with pandas, and the streaming
+RSI it keeps against seeding one on the resampled bars. A subscriber
+raising on one bar, and one too slow to keep up with a short queue, are
+checked to be counted without stalling the feed.
+
+    python -m benchmarks.realtime --candles 100000 --granularity 300
+'''
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+
+from davidplayground import streaming
+from davidplayground.datasets import WienerDataset
+from davidplayground.realtime.realtime import RealtimeFeed, ReplayTransport, IndicatorSubscriber
+
+
+def candles(n, seed=0):
+    '''
+    `n` minute candles around a Wiener path, in raw cbpro layout with
+    epoch second times.
+    '''
+    W = WienerDataset(s0=100.0, nsigma=0.5)
+    close = W.generate(hours=n // 60 + 1, rng=np.random.default_rng(seed), raw=True)['close'].to_numpy()[:n]
+    rng = np.random.default_rng(seed + 1)
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    wick = np.abs(rng.normal(0, 0.02, size=(2, n)))
+    return pd.DataFrame({
+        'time': 1609459200 + 60 * np.arange(n),
+        'low': np.minimum(open_, close) - wick[0],
+        'high': np.maximum(open_, close) + wick[1],
+        'open': open_,
+        'close': close,
+        'volume': rng.exponential(10.0, n),
+    })
+
+
+class Crossover:
+    '''
+    Streaming EMA crossover strategy: 1 to buy, -1 to sell, 0 to hold.
+    '''
+    def __init__(self, fast=12, slow=26):
+        self.fast, self.slow = streaming.EMA(dt=fast), streaming.EMA(dt=slow)
+        self.signals = []
+
+    def __call__(self, bar):
+        f, s = self.fast.update(bar), self.slow.update(bar)
+        signal = 0 if f != f or s != s else (1 if f > s else -1)
+        self.signals.append(signal)
+        return signal
+
+
+async def slow(bar):
+    await asyncio.sleep(0.002)
+
+
+def replay(df, granularity, speed, with_slow=True):
+    feed = RealtimeFeed(ReplayTransport(df, speed=speed), granularity=granularity, capacity=len(df) + 1)
+    rsi = IndicatorSubscriber({'rsi14': streaming.RSI(dt=14, middle='wilder')})
+    feed.subscribe(rsi, name='rsi')
+    feed.subscribe(Crossover(), name='crossover')
+    if with_slow:
+        feed.subscribe(slow, name='slow')
+    asyncio.run(feed.run())
+    return feed, rsi
+
+
+def check(df, granularity, feed, rsi):
+    t = df['time'] // granularity * granularity
+    expected = df.groupby(t).agg(open=('open', 'first'), high=('high', 'max'), low=('low', 'min'),
+                                 close=('close', 'last'), volume=('volume', 'sum')).reset_index()
+    got = feed.bars.last()
+    assert np.array_equal(got['time'].to_numpy(), expected['time'].to_numpy())
+    for col in ['open', 'high', 'low', 'close']:
+        assert np.array_equal(got[col].to_numpy(), expected[col].to_numpy()), col
+    assert np.allclose(got['volume'].to_numpy(), expected['volume'].to_numpy())
+    reference = streaming.RSI(dt=14, middle='wilder').seed(expected)
+    # NaN on both sides until the RSI has warmed up
+    assert np.isclose(rsi.values['rsi14'], reference.value, rtol=0, atol=0, equal_nan=True), \
+        (rsi.values['rsi14'], reference.value)
+
+
+def failing(df, granularity):
+    '''
+    A subscriber raising on its 3rd bar is counted and keeps consuming,
+    and the feed still finishes.
+    '''
+    seen = []
+
+    def flaky(bar):
+        seen.append(bar['time'])
+        if len(seen) == 3:
+            raise ValueError('bad bar')
+
+    feed = RealtimeFeed(ReplayTransport(df, speed=None), granularity=granularity, capacity=len(df) + 1)
+    feed.subscribe(flaky, name='flaky')
+    feed.subscribe(Crossover(), name='crossover')
+    asyncio.run(asyncio.wait_for(feed.run(), timeout=30))
+    stats = feed.latency()
+    assert len(seen) == feed.bars.count, (len(seen), feed.bars.count)
+    if feed.bars.count >= 3:
+        assert stats.loc['flaky', 'errors'] == 1 and 'bad bar' in stats.loc['flaky', 'last_error']
+    assert stats.loc['crossover', 'errors'] == 0 and stats.loc['crossover', 'bars'] == feed.bars.count
+    return stats
+
+
+def dropping(df, granularity, queue_size=2):
+    '''
+    A subscriber slower than the feed, with a short queue, drops the oldest
+    bars instead of holding the feed up, and the feed still finishes.
+    '''
+    feed = RealtimeFeed(ReplayTransport(df, speed=None), granularity=granularity, capacity=len(df) + 1,
+                        queue_size=queue_size)
+    feed.subscribe(slow, name='slow')
+    asyncio.run(asyncio.wait_for(feed.run(), timeout=30))
+    stats = feed.latency()
+    assert stats.loc['slow', 'bars'] + stats.loc['slow', 'dropped'] == feed.bars.count, stats
+    assert feed.bars.count <= queue_size or stats.loc['slow', 'dropped'] > 0, stats
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candles', type=int, default=100000)
+    parser.add_argument('--granularity', type=int, default=300)
+    parser.add_argument('--speed', type=float, default=3600.0, help='speed of the paced replay')
+    parser.add_argument('--paced-candles', type=int, default=600)
+    args = parser.parse_args()
+
+    df = candles(args.candles)
+    for granularity in sorted({60, args.granularity}):
+        feed, rsi = replay(df, granularity, speed=None, with_slow=False)
+        check(df, granularity, feed, rsi)
+        print(f'{granularity}s bars, unpaced: {feed.ticks} ticks -> {feed.bars.count} bars in {feed.elapsed:.2f}s, '
+              f'{feed.ticks / feed.elapsed / 1e3:.0f}k ticks/s')
+        print(feed.latency().to_string(float_format='{:.3f}'.format))
+
+    stats = failing(df.iloc[:args.paced_candles], args.granularity)
+    print(f'raising subscriber: {stats.loc["flaky", "errors"]} error counted, feed finished')
+    stats = dropping(df.iloc[:args.paced_candles], 60)
+    print(f'slow subscriber, queue of 2: {stats.loc["slow", "bars"]} bars handled, '
+          f'{stats.loc["slow", "dropped"]} dropped, feed finished')
+
+    paced = df.iloc[:args.paced_candles]
+    span = paced['time'].iloc[-1] - paced['time'].iloc[0] + 60
+    t0 = time.perf_counter()
+    feed, rsi = replay(paced, args.granularity, speed=args.speed)
+    wall = time.perf_counter() - t0
+    check(paced, args.granularity, feed, rsi)
+    print(f'{args.granularity}s bars at {args.speed:g}x: {span}s of candles replayed in {wall:.2f}s '
+          f'(target {span / args.speed:.2f}s)')
+    print(feed.latency().to_string(float_format='{:.3f}'.format))
+
+
+if __name__ == '__main__':
+    main()
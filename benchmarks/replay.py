@@ -0,0 +1,94 @@
+'''
+Accelerated replay of AlgoBot trading sessions: sessions per hour and the
+per-step latency of fetching data, updating technicals, predicting and
+ordering, over hourly candles of a PaperExchange on a virtual clock. The
+traces of the scheduled replay are checked against the former sleep loop
+of runSim, and against the session history spilled to disk. The same
+scheduler is also run on the real clock to measure its timing jitter.
+
+    python -m benchmarks.replay --sessions 1000
+'''
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.paper_exchange import RandomBot
+from davidplayground.realtime.notif import Notifier, MemorySink
+from jacobplayground.Clock import VirtualClock, RealClock
+from jacobplayground.PaperExchange import PaperExchange, toEpoch
+from jacobplayground.Replay import Replay
+from jacobplayground.Scheduler import Scheduler
+
+START = '2021-01-01'
+
+
+def make_bot(sessions, seed=0, spillDir=None):
+    clock = VirtualClock(toEpoch(START) + 181 * 86400)
+    exchange = PaperExchange.fromWiener(hours=181 * 24 + sessions * 16 * 24 + 48, start=START, clock=clock,
+                                        cash=1000.0, seed=seed, granularity=3600, nsigma=20.0)
+    return RandomBot('BTC-USD', 1000.0, client=exchange, clock=clock, spillDir=spillDir,
+                     notifier=Notifier([MemorySink()], rate=None).start(), seed=seed)
+
+
+def sleep_loop(bot, sessions):
+    '''
+    The former runSim: a step, then a 12 hour sleep.
+    '''
+    for _ in range(sessions):
+        for i in range(bot.MAX_TRADING_SESSION // 6):
+            bot.step()
+            bot.clock.sleep(12 * 60 * 60)
+        bot.reset()
+    return bot.session.netWorth.history()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--check-sessions', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as spillDir:
+        bot = make_bot(args.sessions, spillDir=spillDir)
+        replay = Replay(bot).run(args.sessions)
+        bot.notifier.close()
+        assert np.array_equal(replay.netWorth().ravel(), bot.session.netWorth.history())
+        assert np.array_equal(np.concatenate([t['transactions'] for t in replay.traces]),
+                              bot.session.transactions.history())
+        bot.session.close()
+
+    n = min(args.check_sessions, args.sessions)
+    with tempfile.TemporaryDirectory() as spillDir:
+        reference = make_bot(n, spillDir=spillDir)
+        expected = sleep_loop(reference, n)
+        reference.notifier.close()
+        reference.session.close()
+    assert np.array_equal(replay.netWorth()[:n].ravel(), expected)
+    assert reference.clock.time() == replay.traces[n - 1]['end']
+
+    report = replay.report()
+    print(f'{report["sessions"]} sessions, {report["steps"]} steps, {report["simulated_days"]:.0f} simulated days '
+          f'in {report["wall_seconds"]:.2f}s: {report["sessions_per_hour"]:,.0f} sessions/hour, '
+          f'{report["speedup"]:,.0f}x real time')
+    for phase, stats in report['phases'].items():
+        print(f'  {phase:>10}: mean {stats["mean_ms"]:.3f}ms  p50 {stats["p50_ms"]:.3f}ms  '
+              f'p99 {stats["p99_ms"]:.3f}ms  {stats["share"]:6.1%} of step time')
+    summary = replay.summary()
+    print(f'  final net worth: median {summary["netWorth"].median():.2f}, '
+          f'{summary["trades"].sum()} trades over all sessions')
+
+    clock, due, late = RealClock(), [], []
+    scheduler = Scheduler(clock)
+    start = clock.time() + 0.01
+    scheduler.every(0.02, lambda: late.append(clock.time() - start - 0.02 * len(late)), count=25, start=start)
+    t0 = time.perf_counter()
+    scheduler.run()
+    elapsed = time.perf_counter() - t0
+    print(f'real clock: 25 events every 20ms in {elapsed:.3f}s, lateness p50 {np.median(late) * 1e3:.2f}ms '
+          f'max {max(late) * 1e3:.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
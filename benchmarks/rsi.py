@@ -0,0 +1,71 @@
+'''
+Benchmark of the vectorized add_rsi against the per-row loop it replaced,
+checking both give identical columns.
+
+    python -m benchmarks.rsi [--legacy-max 20000]
+'''
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.ema import legacy_add_ema
+from davidplayground.datasets import WienerDataset
+from davidplayground.kernels import rsi
+from davidplayground.utils import add_rsi, add_sma
+
+
+def legacy_add_rsi(df, dt=2, middle='ema'):
+    U = []
+    D = []
+    for i in range(len(df)):
+        if i == 0:
+            U.append(0)
+            D.append(0)
+            continue
+        p0 = df.loc[i - 1]['close']
+        p1 = df.loc[i]['close']
+        U.append(max(p1 - p0, 0))
+        D.append(max(p0 - p1, 0))
+    dfc = df.copy()
+    dfc['U'] = U
+    dfc['D'] = D
+    if middle == 'sma':
+        dfc = add_sma(dfc, dt=dt, cols=['U', 'D'])
+    elif middle == 'ema':
+        dfc = legacy_add_ema(dfc, dt=dt, cols=['U', 'D'], smoothing=2.0)
+    RS = dfc[f'U_{middle}{dt}'] / dfc[f'D_{middle}{dt}']
+    df[f'rsi{dt}'] = 100.0 - 100.0/(1.0 + RS)
+    return df
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main(sizes=(10**4, 10**5, 10**6), legacy_max=2 * 10**4):
+    W = WienerDataset(s0=1.0, nsigma=0.1)
+    rsi(np.ones(100), [14]) # warm up the scipy import
+    for n in sizes:
+        df = W.generate(hours=n // 60, seed=0, raw=True)
+        for middle in ('sma', 'ema'):
+            new, t_new = timed(add_rsi, df.copy(), dt=14, middle=middle)
+            line = f'{len(df):>8} rows  {middle}  add_rsi {t_new * 1e3:9.2f}ms'
+            if n <= legacy_max:
+                old, t_old = timed(legacy_add_rsi, df.copy(), dt=14, middle=middle)
+                assert np.array_equal(old['rsi14'].to_numpy(dtype=np.float64),
+                                      new['rsi14'].to_numpy(), equal_nan=True)
+                line += f'  loop {t_old * 1e3:10.2f}ms  speedup {t_old / t_new:8.1f}x'
+            print(line)
+        _, t_many = timed(add_rsi, df.copy(), dt=[7, 14, 28], middle='wilder')
+        print(f'{"":>8}       wilder dt=[7, 14, 28] {t_many * 1e3:9.2f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--legacy-max', type=int, default=2 * 10**4,
+                        help='largest size to also run the per-row RSI at')
+    args = parser.parse_args()
+    main(legacy_max=args.legacy_max)
@@ -0,0 +1,125 @@
+'''
+Memory and step time of a long AlgoBot trading session: the former state
+(a DataFrame growing one .loc row per step, float16 net worth, an object
+array of order dicts scanned backwards for the last buy) against
+TradingSession's preallocated ring buffers spilling to disk. Memory is
+sampled with tracemalloc as the run goes; the spilled plus buffered
+history is checked to be every record that was logged.
+
+    python -m benchmarks.session --steps 50400 --capacity 1024
+'''
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from jacobplayground.Session import TradingSession, CANDLE_FIELDS
+from jacobplayground.WalkForward import FEATURES
+
+
+def steps(n, seed=0):
+    '''
+    `n` minute candles, feature rows, orders and net worths of a random walk.
+    '''
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    candles = np.column_stack([1609459200 + 60.0 * np.arange(n), close * 0.999, close * 1.001,
+                               np.roll(close, 1), close, rng.exponential(5.0, n)])
+    features = rng.normal(size=(n, len(FEATURES)))
+    features[:, FEATURES.index('close')] = close
+    sides = rng.choice(['buy', 'sell', 'hold'], size=n, p=[0.1, 0.1, 0.8])
+    worth = 10000 + np.cumsum(rng.normal(0, 5, n))
+    return candles, features, sides, worth
+
+
+def order(side, price):
+    return {'side': side, 'filled_size': '0.01', 'executed_value': str(price * 0.01),
+            'fill_fees': str(price * 0.01 * 0.005)}
+
+
+def legacy(candles, features, sides, worth, sample):
+    data = pd.DataFrame(columns=CANDLE_FIELDS + FEATURES, dtype=np.float64)
+    net = np.zeros(len(worth), dtype=np.float16)
+    transactions = np.zeros(len(worth), dtype=object)
+    memory = []
+    for i in range(len(worth)):
+        data.loc[len(data)] = list(candles[i]) + list(features[i])
+        o = order(sides[i], candles[i, 4])
+        o['price'] = candles[i, 4]
+        transactions[i] = o
+        net[i] = worth[i]
+        for x in reversed(transactions[:i + 1]):
+            if x['side'] == 'buy':
+                break
+        if (i + 1) % sample == 0:
+            memory.append(tracemalloc.get_traced_memory()[0])
+    return net, memory
+
+
+def ring(candles, features, sides, worth, sample, capacity, spillDir):
+    session = TradingSession(capacity=capacity, spillDir=spillDir)
+    memory = []
+    for i in range(len(worth)):
+        session.addCandle(candles[i], features[i])
+        if sides[i] != 'hold':
+            session.recordTransaction(order(sides[i], candles[i, 4]), candles[i, 4], t=candles[i, 0])
+        session.recordNetWorth(worth[i])
+        session.getLastBuy()
+        if (i + 1) % sample == 0:
+            memory.append(tracemalloc.get_traced_memory()[0])
+    return session, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=50400, help='default: five weeks of minute steps')
+    parser.add_argument('--legacy-steps', type=int, default=5000)
+    parser.add_argument('--capacity', type=int, default=1024)
+    parser.add_argument('--samples', type=int, default=10)
+    args = parser.parse_args()
+
+    candles, features, sides, worth = steps(args.steps)
+    with tempfile.TemporaryDirectory() as spillDir:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        session, memory = ring(candles, features, sides, worth, args.steps // args.samples, args.capacity, spillDir)
+        elapsed = time.perf_counter() - t0
+        tracemalloc.stop()
+
+        history = session.candles.history()
+        assert len(history) == args.steps
+        for k, f in enumerate(CANDLE_FIELDS):
+            assert np.array_equal(history[f], candles[:, k]), f
+        for k, f in enumerate(FEATURES):
+            assert np.array_equal(history[f], features[:, k]), f
+        assert np.array_equal(session.netWorth.history(), worth)
+        traded = sides != 'hold'
+        log = session.transactions.history()
+        assert np.array_equal(log['price'], candles[traded, 4])
+        last = np.flatnonzero(sides == 'buy')[-1]
+        assert session.getLastBuy()['time'] == candles[last, 0]
+        session.close()
+
+    growth = max(memory[1:]) - memory[1]
+    print(f'ring buffers: {args.steps} steps in {elapsed:.2f}s ({elapsed / args.steps * 1e6:.1f}us/step), '
+          f'{session.nbytes() / 1e3:.0f}kB preallocated, traced memory '
+          + ' '.join(f'{m / 1e3:.0f}' for m in memory) + f' kB (growth after warm-up {growth / 1e3:.1f}kB)')
+    assert growth < 64e3, growth
+
+    n = min(args.legacy_steps, args.steps)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    net, memory = legacy(candles[:n], features[:n], sides[:n], worth[:n], n // args.samples)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.stop()
+    print(f'former state: {n} steps in {elapsed:.2f}s ({elapsed / n * 1e6:.1f}us/step), traced memory '
+          + ' '.join(f'{m / 1e3:.0f}' for m in memory) + ' kB')
+    error = np.abs(net.astype(np.float64) - worth[:n]).max()
+    print(f'float16 net worth of ~{worth[:n].mean():.0f} USD off by up to {error:.2f} USD; float64 exact')
+
+
+if __name__ == '__main__':
+    main()
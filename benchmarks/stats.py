@@ -0,0 +1,125 @@
+'''
+Trade statistics online and in batch. TradeStats updates per closed trade
+and per bar are timed against rescanning the whole trade history on every
+trade, and `equity_stats`/`trade_stats` over the backtest curves of many
+EMACross runs at once against a TradeStats per run. Online and batch are
+checked to agree, and the drawdowns against sweep.max_drawdown.
+
+    python -m benchmarks.stats --runs 2000 --bars 5000
+'''
+import argparse
+import math
+import time
+
+import numpy as np
+
+from benchmarks.backtest import EMACross
+from davidplayground.datasets import WienerDataset
+from davidplayground.stats import TradeStats, closed_trades, equity_stats, pad, trade_stats
+from davidplayground.sweep import max_drawdown
+from davidplayground.utils import add_ema
+
+WINDOWS = [(5, 20), (10, 40), (20, 80), (30, 120)]
+
+
+def rescan(pnl):
+    '''
+    Win rate and payoff from the whole history, the way scanning the
+    transactions every step would.
+    '''
+    wins = [p for p in pnl if p > 0]
+    losses = [-p for p in pnl if p < 0]
+    win_rate = len(wins) / len(pnl)
+    payoff = (sum(wins) / len(wins)) / (sum(losses) / len(losses)) if wins and losses else math.nan
+    return win_rate, payoff
+
+
+def close(a, b):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return np.allclose(a, b, rtol=1e-9, atol=1e-12, equal_nan=True)
+
+
+def online(trades):
+    rng = np.random.default_rng(0)
+    pnl = rng.normal(0.1, 1.0, trades).tolist()
+    t0 = time.perf_counter()
+    stats = TradeStats()
+    for p in pnl:
+        stats.add_trade(p)
+        stats.kelly()
+    t_online = time.perf_counter() - t0
+    assert close([stats.win_rate(), stats.payoff()], rescan(pnl))
+
+    scanned = min(trades, 5000)
+    t0 = time.perf_counter()
+    for i in range(1, scanned + 1):
+        rescan(pnl[:i])
+    t_rescan = time.perf_counter() - t0
+    print(f'{trades} closed trades:')
+    print(f'  online  {trades / t_online:12,.0f} trades/s')
+    print(f'  rescan  {scanned / t_rescan:12,.0f} trades/s  (over the first {scanned})')
+
+
+def curves(runs, bars):
+    '''
+    Portfolio values and closed-trade profits of `runs` EMACross backtests,
+    over the WINDOWS on as many paths as it takes.
+    '''
+    values, pnl = [], []
+    for seed in range(-(-runs // len(WINDOWS))):
+        W = WienerDataset(s0=100.0, nsigma=0.5)
+        W.add_treatment(add_ema, {'dt': sorted({w for pair in WINDOWS for w in pair})})
+        df = W.generate(hours=-(-bars // 60), seed=seed).iloc[:bars]
+        for fast, slow in WINDOWS[:runs - len(values)]:
+            bot = EMACross(fast=fast, slow=slow, initial_capital=1000.0)
+            # runs end at different bars, as they would over different datasets
+            curve = bot.backtest(df.iloc[:bars - len(values) % 100], 'BTC')
+            values.append(curve['value'].to_numpy())
+            pnl.append(closed_trades(bot.trades, bot.fee))
+    return values, pnl
+
+
+def batch(runs, bars):
+    values, pnl = curves(runs, bars)
+    t0 = time.perf_counter()
+    per_run = []
+    for v, p in zip(values, pnl):
+        stats = TradeStats(periods_per_year=365 * 24 * 60)
+        for x in v.tolist():
+            stats.add_value(x)
+        for x in p.tolist():
+            stats.add_trade(x)
+        per_run.append(stats.summary())
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    equity = equity_stats(pad(values), periods_per_year=365 * 24 * 60)
+    trades = trade_stats(pad(pnl))
+    t_batch = time.perf_counter() - t0
+
+    for key in equity:
+        assert close(equity[key], [s[key] for s in per_run]), key
+    for key in trades:
+        assert close(trades[key], [s[key] for s in per_run]), key
+    assert close(equity['max_drawdown'], [max_drawdown(v) for v in values])
+    n = sum(len(v) for v in values)
+    print(f'{len(values)} backtests, {n} bars, {int(trades["trades"].sum())} closed trades:')
+    print(f'  TradeStats per run  {n / t_loop:12,.0f} bars/s')
+    print(f'  equity_stats batch  {n / t_batch:12,.0f} bars/s')
+    print(f'  median sharpe {np.nanmedian(equity["sharpe"]):.2f}, '
+          f'median max drawdown {np.median(equity["max_drawdown"]):.1%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trades', type=int, default=200000)
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--bars', type=int, default=5000)
+    args = parser.parse_args()
+
+    online(args.trades)
+    batch(args.runs, args.bars)
+
+
+if __name__ == '__main__':
+    main()
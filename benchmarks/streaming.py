@@ -0,0 +1,86 @@
+'''
+Checks the streaming indicators against the batch treatments and shows
+that their per-bar update cost does not grow with the history, unlike
+recomputing the treatments over the whole frame for every new bar.
+
+    python -m benchmarks.streaming
+'''
+import time
+
+import numpy as np
+
+from davidplayground import streaming
+from davidplayground.datasets import WienerDataset
+from davidplayground.utils import add_ema, add_sma, add_bollinger, add_rsi, add_macd
+
+
+def ohlc(n, seed=0):
+    df = WienerDataset(s0=10.0, nsigma=0.3).generate(hours=n // 60, seed=seed, raw=True)
+    rng = np.random.default_rng(seed)
+    close = df['close'].to_numpy()
+    df['open'] = np.r_[close[0], close[:-1]]
+    df['high'] = np.fmax(df['open'], df['close']) + rng.random(len(df))
+    df['low'] = np.fmin(df['open'], df['close']) - rng.random(len(df))
+    return df
+
+
+def indicators():
+    return {
+        'ema26': streaming.EMA(dt=26),
+        'sma20': streaming.SMA(dt=20),
+        'bollinger20': streaming.Bollinger(dt=20, middle='ema'),
+        'rsi14': streaming.RSI(dt=14, middle='ema'),
+        'macd': streaming.MACD(),
+        'williams14': streaming.WilliamsR(lookback=14),
+        'bop12': streaming.BOP(period=12),
+        'atr14': streaming.ATR(period=14),
+    }
+
+
+def check_equivalence(df):
+    batch = add_macd(add_rsi(add_bollinger(add_sma(add_ema(df.copy(), dt=26), dt=20),
+                                           dt=20, middle='ema'), dt=14), a=12, b=26, c=9)
+    hh, ll = df['high'].rolling(14).max(), df['low'].rolling(14).min()
+    expected = {
+        'ema26': batch['close_ema26'],
+        'sma20': batch['close_sma20'],
+        'bollinger20': batch['bb_upper'],
+        'rsi14': batch['rsi14'],
+        'macd': batch['macd_hist'],
+        'williams14': -100 * ((hh - df['close']) / (hh - ll)),
+        'bop12': ((df['close'] - df['open']) / (df['high'] - df['low'])).rolling(12).mean(),
+    }
+    inds = indicators()
+    rows = df.to_dict('records')
+    for name, expect in expected.items():
+        ind = inds[name]
+        got = []
+        for row in rows:
+            v = ind.update(row)
+            got.append(v['bb_upper'] if name == 'bollinger20' else v['macd_hist'] if name == 'macd' else v)
+        assert np.allclose(got, expect.to_numpy(dtype=np.float64), rtol=1e-9, atol=1e-9, equal_nan=True), name
+    print(f'streaming == batch for {", ".join(expected)} over {len(df)} bars')
+
+
+def main(histories=(10**3, 10**4, 10**5), steps=500):
+    df = ohlc(max(histories) + steps)
+    check_equivalence(df.iloc[:5000].reset_index(drop=True))
+    for n in histories:
+        history, rows = df.iloc[:n], df.iloc[n:n + steps].to_dict('records')
+        inds = {name: ind.seed(history) for name, ind in indicators().items()}
+        t0 = time.perf_counter()
+        for row in rows:
+            for ind in inds.values():
+                ind.update(row)
+        t_stream = (time.perf_counter() - t0) / steps
+        t0 = time.perf_counter()
+        for i in range(5):
+            frame = df.iloc[:n + i + 1].copy()
+            add_macd(add_rsi(add_bollinger(add_sma(add_ema(frame, dt=26), dt=20), dt=20, middle='ema'), dt=14))
+        t_batch = (time.perf_counter() - t0) / 5
+        print(f'{n:>7} bars of history  streaming {t_stream * 1e6:8.1f}us/bar (8 indicators)  '
+              f'batch recompute {t_batch * 1e6:10.1f}us/bar (5 treatments)')
+
+
+if __name__ == '__main__':
+    main()
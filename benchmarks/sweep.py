@@ -0,0 +1,98 @@
+'''
+Combinations per second of ParameterSweep over a grid of EMA crossover
+windows on a batch of Wiener paths, against the loop it replaces: treating
+the dataset again and backtesting it for every grid point. A sweep over a
+generator of paths is checked to hold at most `max_datasets` of them in
+shared memory at once, and to unlink every block.
+
+    python -m benchmarks.sweep --paths 8 --days 30
+'''
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.backtest import EMACross
+from davidplayground.datasets import WienerDataset
+from davidplayground.sweep import ParameterSweep, evaluate
+from davidplayground.utils import add_ema
+
+GRID = [dict(fast=f, slow=s) for f in (5, 10, 20, 30, 60) for s in (60, 120, 240, 480) if f < s]
+
+
+def rerun_per_point(paths, points):
+    '''
+    Reference: every grid point treats the raw path with its own EMAs.
+    '''
+    rows = []
+    for path_id, path in paths.groupby('path_id', sort=False):
+        path = path.reset_index(drop=True)
+        for params in points:
+            df = add_ema(path.copy(), dt=[params['fast'], params['slow']])
+            rows.append(dict(dataset=int(path_id), **params,
+                             **evaluate(EMACross, params, df, 'BTC', dict(initial_capital=1000.0))))
+    return rows
+
+
+def bounded(W, n_paths, days, workers, max_datasets, expected):
+    '''
+    Sweeps a generator of single-path batches, checking that a path is only
+    pulled from it once all but `max_datasets` of the earlier ones finished.
+    '''
+    rows, pulled = [], []
+
+    def source():
+        for batch in W.iter_paths(n_paths, hours=24 * days, seed=0, raw=True, chunk_paths=1):
+            pulled.append(len(rows))
+            yield batch
+
+    before = set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+    sweep = ParameterSweep(EMACross, GRID, workers=workers, max_datasets=max_datasets, initial_capital=1000.0)
+    for row in sweep.iter_run(source()):
+        rows.append(row)
+    for k, seen in enumerate(pulled):
+        assert seen >= (k - max_datasets) * len(GRID), (k, seen)
+    if os.path.isdir('/dev/shm'):
+        assert set(os.listdir('/dev/shm')) <= before, 'shared memory left behind'
+    key = lambda row: (row['dataset'], row['fast'], row['slow'])
+    assert sorted(rows, key=key) == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paths', type=int, default=8)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    W = WienerDataset(s0=100.0, nsigma=0.5)
+    paths = next(W.iter_paths(args.paths, hours=24 * args.days, seed=0, raw=True, chunk_paths=args.paths)).frame()
+    combos = args.paths * len(GRID)
+    print(f'{args.paths} paths x {len(paths) // args.paths} bars, {len(GRID)} grid points')
+
+    t0 = time.perf_counter()
+    expected = rerun_per_point(paths, GRID)
+    t_ref = time.perf_counter() - t0
+    print(f'  treat per grid point   {combos / t_ref:8.1f} combos/s')
+
+    key = lambda row: (row['dataset'], row['fast'], row['slow'])
+    expected = sorted(expected, key=key)
+    for workers in [0] + sorted({1, 2, 4, 8, args.max_workers} & set(range(1, args.max_workers + 1))):
+        sweep = ParameterSweep(EMACross, GRID, workers=workers, initial_capital=1000.0)
+        t0 = time.perf_counter()
+        table = sweep.run(paths)
+        elapsed = time.perf_counter() - t0
+        got = sorted(table.to_dict('records'), key=key)
+        assert len(got) == len(expected)
+        for a, b in zip(got, expected):
+            assert a == b, (a, b)
+        print(f'  sweep, {workers} workers{" (inline)" if not workers else ""}  '
+              f'{combos / elapsed:8.1f} combos/s  best final value {table["final_value"].max():.2f}')
+
+    bounded(W, args.paths, args.days, min(2, args.max_workers), 2, expected)
+    print(f'  generator of {args.paths} paths, at most 2 in shared memory at once')
+
+
+if __name__ == '__main__':
+    main()
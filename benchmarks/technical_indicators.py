@@ -0,0 +1,106 @@
+'''
+Times TechnicalIndicators over a million bars against the same indicators
+written as pandas column operations that add one column to the frame at a
+time, and checks the Wilder-smoothed indicators against their streaming
+versions.
+
+    python -m benchmarks.technical_indicators --bars 1000000
+'''
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.streaming import ohlc
+from davidplayground import streaming
+from jacobplayground.TechnicalIndicators import TechnicalIndicators
+
+GROUPS = dict(trend=['macd', 'trix'], momentum=['rsi', 'williams', 'bop', 'gc'],
+              volatility=['bbands', 'atr'], price_transform=['a', 'typical'], sma=[20, 50])
+
+
+def pandas_indicators(df):
+    '''
+    Reference implementation, one pandas expression and one new frame
+    column per indicator.
+    '''
+    C, O, H, L = df.close, df.open, df.high, df.low
+    df['ap'] = (O + H + L + C) / 4
+    df['tp'] = (H + L + C) / 3
+    for x in [20, 50]:
+        df['sma_' + str(x)] = C.rolling(x).mean()
+    df['MACD'] = C.ewm(span=12, adjust=False).mean() - C.ewm(span=26, adjust=False).mean()
+    df['MACDsignal'] = df['MACD'].ewm(span=9, adjust=False).mean()
+    df['MACDdiff'] = df['MACD'] - df['MACDsignal']
+    ema3 = C.ewm(span=15, adjust=False).mean().ewm(span=15, adjust=False).mean().ewm(span=15, adjust=False).mean()
+    df['trix'] = 100 * ema3.pct_change()
+    hh, ll = H.rolling(14).max(), L.rolling(14).min()
+    df['Williams %R'] = -100 * ((hh - C) / (hh - ll))
+    df['BOP'] = ((C - O) / (H - L)).rolling(12).mean()
+    mid, sd = C.rolling(20).mean(), df['tp'].rolling(20).std()
+    for k in (1, 2):
+        df[f'bolu_sd{k}'] = mid + k * sd
+        df[f'boll_sd{k}'] = mid - k * sd
+    diff = C.diff().fillna(0.0)
+    gain = wilder(diff.clip(lower=0), 14, start=1)
+    loss = wilder((-diff).clip(lower=0), 14, start=1)
+    df['RSI'] = 100 - 100 / (1 + gain / loss)
+    prev = C.shift(1)
+    tr = pd.concat([H - L, (H - prev).abs(), (L - prev).abs()], axis=1).max(axis=1)
+    df['ATR'] = wilder(tr, 14)
+    above = np.sign(C.rolling(50).mean() - C.rolling(200).mean())
+    df['GC'] = np.sign(above.diff()).fillna(0.0)
+    return df
+
+
+def wilder(s, period, start=0):
+    first = start + period - 1
+    seeded = s.iloc[first:].copy()
+    seeded.iloc[0] = s.iloc[start:first + 1].mean()
+    return seeded.ewm(alpha=1.0 / period, adjust=False).mean().reindex(s.index)
+
+
+def check_streaming(df):
+    TI = TechnicalIndicators(df.copy(), momentum=['rsi'], volatility=['atr'], params={'rsi': {'period': 14}})
+    rsi = streaming.RSI(dt=14, middle='wilder')
+    atr = streaming.ATR(period=14)
+    rows = df.to_dict('records')
+    got_rsi = [rsi.update(row) for row in rows]
+    got_atr = [atr.update(row) for row in rows]
+    assert np.allclose(TI.df['RSI'], got_rsi, rtol=1e-9, atol=1e-9, equal_nan=True)
+    assert np.allclose(TI.df['ATR'], got_atr, rtol=1e-9, atol=1e-9, equal_nan=True)
+    print(f'RSI and ATR == streaming over {len(df)} bars')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, default=10**6)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = ohlc(args.bars)
+    check_streaming(df.iloc[:5000].reset_index(drop=True))
+
+    TI = TechnicalIndicators(df.copy(), **GROUPS)
+    expected = pandas_indicators(df.copy())
+    for col in expected.columns.difference(df.columns):
+        assert np.allclose(TI.df[col], expected[col], rtol=1e-9, atol=1e-9, equal_nan=True), col
+
+    t_engine, t_pandas = [], []
+    for _ in range(args.repeat):
+        frame = df.copy()
+        t0 = time.perf_counter()
+        TechnicalIndicators(frame, **GROUPS)
+        t_engine.append(time.perf_counter() - t0)
+        frame = df.copy()
+        t0 = time.perf_counter()
+        pandas_indicators(frame)
+        t_pandas.append(time.perf_counter() - t0)
+    print(f'{len(df)} bars, {len(TI.features)} indicator columns')
+    print(f'  TechnicalIndicators     {min(t_engine) * 1e3:9.1f}ms  {len(df) / min(t_engine) / 1e6:6.2f}M bars/s')
+    print(f'  pandas column-by-column {min(t_pandas) * 1e3:9.1f}ms  ({len(expected.columns) - len(df.columns)} columns)')
+
+
+if __name__ == '__main__':
+    main()
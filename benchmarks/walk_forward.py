@@ -0,0 +1,64 @@
+'''
+Walk-forward training of the AlgoBot model on Wiener data, on CPU: the
+features AlgoBot trains on are computed with TechnicalIndicators, windowed
+with WalkForward, and the model is retrained fold by fold. Reports the
+memory the window views save and per-fold metrics with samples/sec.
+
+    python -m benchmarks.walk_forward --hours 8760 --epochs 2
+'''
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from davidplayground.datasets import WienerDataset
+from jacobplayground.TechnicalIndicators import TechnicalIndicators
+from jacobplayground.WalkForward import WalkForward, FEATURES, build_model, make_target
+
+
+def hourly_candles(hours, seed=0):
+    '''
+    Hourly OHLC bars aggregated from a minute-level Wiener path.
+    '''
+    close = WienerDataset(s0=100.0, nsigma=0.3).generate(hours=hours, seed=seed, raw=True)['close'].to_numpy()
+    bars = close[:hours * 60].reshape(hours, 60)
+    return pd.DataFrame({'open': bars[:, 0], 'high': bars.max(axis=1), 'low': bars.min(axis=1), 'close': bars[:, -1]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=int, default=24 * 365)
+    parser.add_argument('--lookback', type=int, default=96)
+    parser.add_argument('--train-size', type=int, default=2000)
+    parser.add_argument('--test-size', type=int, default=500)
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+    df = TechnicalIndicators(hourly_candles(args.hours), trend=['macd', 'trix'], momentum=['rsi'],
+                             volatility=['bbands']).df
+    target = make_target(df['close'], horizon=12, threshold=0.02)
+    wf = WalkForward(df[FEATURES].to_numpy(dtype=np.float32), target, lookback=args.lookback,
+                     train_size=args.train_size, test_size=args.test_size, gap=12)
+    folds = wf.folds()
+    if not folds:
+        parser.error(f'--hours {args.hours} leaves {len(wf.valid)} windows, too few for a fold of '
+                     f'{args.train_size} training and {args.test_size} test windows: raise --hours '
+                     f'or lower --train-size/--test-size')
+    materialized = len(wf.valid) * args.lookback * len(FEATURES) * 4
+    print(f'{len(df)} hourly bars, {len(wf.valid)} windows, {len(folds)} folds')
+    print(f'  windows as views {wf.X.nbytes / 2**20:8.1f} MiB  (materialized {materialized / 2**20:8.1f} MiB)')
+
+    t0 = time.perf_counter()
+    n = sum(len(yb) for xb, yb in wf.batches(wf.valid, args.batch_size, scale=wf.scaling(folds[0][0]), shuffle=True))
+    print(f'  batch generator  {n / (time.perf_counter() - t0):12,.0f} samples/s')
+
+    metrics = wf.run(build_model, epochs=args.epochs, batch_size=args.batch_size)
+    print(metrics.to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+
+
+if __name__ == '__main__':
+    main()
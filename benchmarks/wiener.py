@@ -0,0 +1,42 @@
+'''
+Benchmark of WienerDataset.generate, python loop vs vectorized engine.
+
+    python -m benchmarks.wiener [--loop-max 1000000]
+'''
+import argparse
+import time
+
+import numpy as np
+
+from davidplayground.datasets import WienerDataset
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main(sizes=(10**6, 10**7), loop_max=10**6, seed=42):
+    W = WienerDataset(s0=1.0, nsigma=0.1)
+    for n in sizes:
+        hours = n // 60
+        vec, t_vec = timed(W.generate, hours=hours, seed=seed, raw=True)
+        line = f'{len(vec):>10} bars  vectorized {t_vec:8.3f}s'
+        if n <= loop_max:
+            loop, t_loop = timed(W.generate, hours=hours, seed=seed, raw=True, vectorized=False)
+            assert np.array_equal(loop['close'].to_numpy(), vec['close'].to_numpy())
+            line += f'  loop {t_loop:8.3f}s  speedup {t_loop / t_vec:7.1f}x'
+        else:
+            line += '  loop (skipped)'
+        print(line)
+        _, t_gen = timed(W.generate, hours=hours, raw=True, rng=np.random.default_rng(seed))
+        print(f'{"":>10}       Generator  {t_gen:8.3f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--loop-max', type=int, default=10**6,
+                        help='largest size to also run the python loop at')
+    args = parser.parse_args()
+    main(loop_max=args.loop_max)
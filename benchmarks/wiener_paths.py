@@ -0,0 +1,48 @@
+'''
+Benchmark of batched Monte Carlo generation with WienerDataset.iter_paths.
+
+    python -m benchmarks.wiener_paths [--paths 10000] [--hours 168] [--chunk 250]
+'''
+import argparse
+import time
+import tracemalloc
+
+from davidplayground.datasets import WienerDataset
+from davidplayground.utils import add_sma, add_bollinger
+
+
+def main(n_paths=10000, hours=168, chunk_paths=250, seed=42):
+    W = WienerDataset(s0=1.0, nsigma=0.05)
+    W.add_treatment(add_sma, kwargs={'dt': 30, 'cols': ['close']})
+    W.add_treatment(add_bollinger, kwargs={'dt': 20, 'middle': 'sma'})
+
+    # per-path loop on a small sample, for reference
+    sample = min(n_paths, 50)
+    t0 = time.perf_counter()
+    for i in range(sample):
+        W.generate(hours=hours, rng=W.path_rng(seed, i))
+    t_loop = (time.perf_counter() - t0) / sample
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    bars = 0
+    for batch in W.iter_paths(n_paths, hours=hours, seed=seed, chunk_paths=chunk_paths):
+        bars += batch.close.size
+    t_batch = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{n_paths} paths x {hours * 60} bars, {chunk_paths} paths/chunk')
+    print(f'  per-path generate   {t_loop * 1e3:9.2f} ms/path  (est. {t_loop * n_paths:8.1f}s total)')
+    print(f'  iter_paths          {t_batch / n_paths * 1e3:9.2f} ms/path  ({t_batch:8.1f}s total, '
+          f'{bars / t_batch / 1e6:.1f}M bars/s)')
+    print(f'  peak traced memory  {peak / 2**20:9.1f} MiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paths', type=int, default=10000)
+    parser.add_argument('--hours', type=int, default=168)
+    parser.add_argument('--chunk', type=int, default=250)
+    args = parser.parse_args()
+    main(n_paths=args.paths, hours=args.hours, chunk_paths=args.chunk)
@@ -0,0 +1,149 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+HEADER = 'header.json'
+
+
+def to_epoch_ns(t):
+    '''
+    Epoch nanoseconds of a datetime, ISO-8601 string or Timestamp. Naive
+    times are taken as UTC.
+    :param t: time to convert
+    :return: int epoch nanoseconds
+    '''
+    t = pd.Timestamp(t)
+    if t.tzinfo is not None:
+        t = t.tz_convert('UTC').tz_localize(None)
+    return int(t.value)
+
+
+class ArchiveSlice:
+    '''
+    A time range of a CandleArchive. Columns are read-only memmap views into
+    the archive files; nothing is copied until `to_frame` is called.
+    '''
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def to_frame(self, unit=None):
+        '''
+        Copies the slice into a DataFrame.
+        :param unit: None for a datetime `time` column, or an epoch unit such
+        as 's' to keep integer epoch times in that unit (raw cbpro candles)
+        :return: DataFrame dataset
+        '''
+        data = {name: np.array(col) for name, col in self.columns.items()}
+        if unit is None:
+            data['time'] = data['time'].view('datetime64[ns]')
+        else:
+            data['time'] = data['time'] // pd.Timedelta(1, unit=unit).value
+        return pd.DataFrame(data)
+
+
+class CandleArchive:
+    '''
+    Append-only columnar archive of one series of candles. Every column is a
+    flat binary file of fixed-width values: int64 epoch nanoseconds for
+    `time` and float32 or float64 for the rest. A small json header holds
+    the row count, column names and dtypes.
+
+    Reads memory-map the columns and binary search the time column, so
+    slicing years of minute data touches only the pages that are returned.
+    '''
+    def __init__(self, root, dtype='float64'):
+        '''
+        :param root: directory of the archive
+        :param dtype: dtype of the value columns when the archive is created
+        '''
+        self.root = root
+        self.dtype = np.dtype(dtype).name
+        path = os.path.join(root, HEADER)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.header = json.load(f)
+        else:
+            self.header = {'count': 0, 'columns': None, 'dtype': self.dtype}
+
+    def __len__(self):
+        return self.header['count']
+
+    def _path(self, name):
+        return os.path.join(self.root, name + '.bin')
+
+    def _column(self, name):
+        dtype = np.int64 if name == 'time' else np.dtype(self.header['dtype'])
+        if not self.header['count']:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode='r', shape=(self.header['count'],))
+
+    def write(self, df):
+        '''
+        Appends the rows of a dataset that are newer than the last archived
+        time. Numeric `time` columns are epoch seconds as returned by cbpro,
+        datetime columns are converted as they are.
+        :param df: DataFrame dataset with a `time` column
+        :return: number of rows appended
+        '''
+        df = df.sort_values('time')
+        if pd.api.types.is_numeric_dtype(df['time']):
+            times = df['time'].to_numpy(dtype=np.int64) * 10**9
+        else:
+            times = pd.to_datetime(df['time']).to_numpy().astype('datetime64[ns]').view(np.int64)
+        columns = self.header['columns']
+        if columns is None:
+            columns = [c for c in df.columns if c not in ('time', 'path_id')
+                       and pd.api.types.is_numeric_dtype(df[c])]
+        elif not set(columns) <= set(df.columns):
+            raise Exception(f'Dataset is missing archive columns {sorted(set(columns) - set(df.columns))}')
+        if self.header['count']:
+            keep = times > self._column('time')[-1]
+        else:
+            keep = np.ones(len(times), dtype=bool)
+        keep[1:] &= times[1:] != times[:-1]
+        if not keep.any():
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        # a write that died before its header leaves rows past `count`: cut
+        # them off so every column lines up with the header again
+        count = self.header['count']
+        with open(self._path('time'), 'ab') as f:
+            f.truncate(count * 8)
+            f.write(times[keep].tobytes())
+        for name in columns:
+            values = df[name].to_numpy(dtype=self.header['dtype'], na_value=np.nan)
+            with open(self._path(name), 'ab') as f:
+                f.truncate(count * values.itemsize)
+                f.write(values[keep].tobytes())
+        # header last, readers never see a count beyond the written rows
+        self.header['columns'] = columns
+        self.header['count'] += int(keep.sum())
+        tmp = os.path.join(self.root, HEADER + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.header, f)
+        os.replace(tmp, os.path.join(self.root, HEADER))
+        return int(keep.sum())
+
+    def slice(self, start=None, end=None):
+        '''
+        Rows with times in [start, end], found by binary search on the
+        memory-mapped time column.
+        :param start: datetime, ISO-8601 string or None for the first row
+        :param end: datetime, ISO-8601 string or None for the last row
+        :return: ArchiveSlice of memmap views
+        '''
+        times = self._column('time')
+        lo = 0 if start is None else int(np.searchsorted(times, to_epoch_ns(start), side='left'))
+        hi = len(times) if end is None else int(np.searchsorted(times, to_epoch_ns(end), side='right'))
+        columns = {'time': times[lo:hi]}
+        for name in self.header['columns'] or []:
+            columns[name] = self._column(name)[lo:hi]
+        return ArchiveSlice(columns)
@@ -0,0 +1,242 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from davidplayground.utils import ingest_candles
+from davidplayground.datasets import TreatedDataset, CoinDataset, apply_treatments
+from davidplayground.pipeline import plan_treatments
+
+
+def to_shared(df):
+    '''
+    Copies the columns of a dataset into one shared memory block.
+    :param df: DataFrame dataset with numeric or datetime columns
+    :return: (SharedMemory, spec) where spec describes the layout for
+    `from_shared`
+    '''
+    columns, offset = [], 0
+    for name in df.columns:
+        col = df[name]
+        tz = None
+        if isinstance(col.dtype, pd.DatetimeTZDtype):
+            tz = str(col.dt.tz)
+            col = col.dt.tz_convert(None)
+        values = col.to_numpy()
+        if values.dtype.kind not in 'biufmM':
+            raise Exception(f'Column {name} of dtype {values.dtype} cannot be shared')
+        columns.append((name, values, tz, offset))
+        offset += -(-values.nbytes // 8) * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    spec = {'rows': len(df), 'columns': []}
+    for name, values, tz, offset in columns:
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=offset)[:] = values
+        spec['columns'].append((name, values.dtype.str, tz, offset))
+    return shm, spec
+
+
+def from_shared(name, spec):
+    '''
+    Copies a dataset out of a shared memory block written by `to_shared`.
+    :param name: name of the shared memory block
+    :param spec: layout returned by `to_shared`
+    :return: DataFrame dataset
+    '''
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        data = {}
+        for col, dtype, tz, offset in spec['columns']:
+            values = np.ndarray(spec['rows'], dtype=dtype, buffer=shm.buf, offset=offset).copy()
+            data[col] = values if tz is None else pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(tz)
+        return pd.DataFrame(data)
+    finally:
+        shm.close()
+
+
+def _treat_chunk(tasks, treatments, treatment_args):
+    '''
+    Worker side of SymbolBatch: treats every dataset of a chunk and hands
+    the results back in new shared memory blocks.
+    :param tasks: list of (job index, shared memory name, spec)
+    :return: list of (job index, shared memory name, spec, seconds spent treating)
+    '''
+    results = []
+    for key, name, spec in tasks:
+        df = from_shared(name, spec)
+        t0 = time.perf_counter()
+        df = apply_treatments(df, treatments, treatment_args)
+        elapsed = time.perf_counter() - t0
+        shm, out_spec = to_shared(df)
+        results.append((key, shm.name, out_spec, elapsed))
+        # the parent unlinks the block once it has copied the result
+        shm.close()
+    return results
+
+
+class CoinLoader:
+    '''
+    Default loader of SymbolBatch, raw candles of a product from cbpro.
+    '''
+    def __init__(self, client=None, workers=4, rate=3.0, cache=None):
+        self.datasets = {}
+        self.kwargs = dict(client=client, workers=workers, rate=rate, cache=cache)
+
+    def __call__(self, product, granularity, start, end):
+        if product not in self.datasets:
+            self.datasets[product] = CoinDataset(name=product, **self.kwargs)
+        return self.datasets[product].get(start, end, granularity=granularity, raw=True)
+
+
+class SymbolBatch(TreatedDataset):
+    '''
+    Runs one treatment chain over many symbols on a process pool. Datasets
+    travel to and from the workers through shared memory instead of being
+    pickled, and are loaded in this process while earlier chunks are being
+    treated.
+
+        B = SymbolBatch(workers=8)
+        B.add_treatment(add_macd)
+        B.add_treatment(add_rsi, {'dt': 14, 'middle': 'wilder'})
+        result = B.run([('BTC', 60, '2021-01-01', '2021-01-08'),
+                        ('ETH', 300, '2021-01-01', '2021-02-01')])
+        result['BTC', 60]   # treated DataFrame, or result['BTC', 60, '2021-01-01', '2021-01-08']
+        result.to_frame()   # all of them under a (product, granularity, start, end) MultiIndex
+        result.timings      # per-symbol seconds and rows
+    '''
+    def __init__(self, loader=None, workers=4, chunk_size=1):
+        '''
+        :param loader: callable (product, granularity, start, end) returning a
+        raw dataset; defaults to cbpro candles through CoinDataset
+        :param workers: number of worker processes, 0 to treat in this process
+        :param chunk_size: number of symbols sent to a worker at once
+        '''
+        if loader is None:
+            self.loader = CoinLoader()
+            self.treatments = [ingest_candles]
+            self.treatment_args = [None]
+        else:
+            self.loader = loader
+            self.treatments = []
+            self.treatment_args = []
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def run(self, jobs):
+        '''
+        Loads and treats the datasets of every job.
+        :param jobs: list of (product, granularity, start, end)
+        :return: BatchResult keyed by (product, granularity, start, end)
+        '''
+        jobs = [tuple(job) for job in jobs]
+        if not self.planned:
+            treatments, treatment_args = self.treatments, self.treatment_args
+        else:
+            if self._plan is None:
+                self._plan = plan_treatments(self.treatments, self.treatment_args)
+            treatments, treatment_args = self._plan
+        result = BatchResult()
+        t_start = time.perf_counter()
+        if not self.workers:
+            for job in jobs:
+                t0 = time.perf_counter()
+                df = self.loader(*job)
+                t1 = time.perf_counter()
+                df = apply_treatments(df, treatments, treatment_args)
+                result.add(job, df, load=t1 - t0, treat=time.perf_counter() - t1)
+            result.elapsed = time.perf_counter() - t_start
+            return result
+
+        shared = {} # shared memory blocks in flight, by job index
+        pending = set()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                chunk = []
+                for i, job in enumerate(jobs):
+                    t0 = time.perf_counter()
+                    df = self.loader(*job)
+                    t1 = time.perf_counter()
+                    shm, spec = to_shared(df)
+                    shared[i] = shm
+                    result.timings[job] = {'rows': len(df), 'load': t1 - t0, 'transfer': time.perf_counter() - t1}
+                    chunk.append((i, shm.name, spec))
+                    if len(chunk) == self.chunk_size or i == len(jobs) - 1:
+                        pending.add(pool.submit(_treat_chunk, chunk, treatments, treatment_args))
+                        chunk = []
+                    # collect what is done while loading the rest
+                    done = [f for f in pending if f.done()]
+                    for future in done:
+                        pending.discard(future)
+                        self._collect(future, jobs, shared, result)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._collect(future, jobs, shared, result)
+            finally:
+                for shm in shared.values():
+                    shm.close()
+                    shm.unlink()
+        # chunks finish in any order, list the datasets in job order
+        result.frames = {job: result.frames[job] for job in jobs}
+        result.elapsed = time.perf_counter() - t_start
+        return result
+
+    def _collect(self, future, jobs, shared, result):
+        '''
+        Copies the results of a finished chunk out of shared memory and
+        releases its blocks.
+        '''
+        for i, name, spec, elapsed in future.result():
+            t0 = time.perf_counter()
+            df = from_shared(name, spec)
+            out = shared_memory.SharedMemory(name=name)
+            out.close()
+            out.unlink()
+            shm = shared.pop(i)
+            shm.close()
+            shm.unlink()
+            timing = result.timings.get(jobs[i], {})
+            result.add(jobs[i], df, treat=elapsed, transfer=timing.get('transfer', 0.0) + time.perf_counter() - t0)
+
+
+class BatchResult:
+    '''
+    Treated datasets of a SymbolBatch run, keyed by their job
+    (product, granularity, start, end), with per-job timings in seconds.
+    A (product, granularity) key picks the only job of that symbol.
+    '''
+    def __init__(self):
+        self.frames = {}
+        self.timings = {}
+        self.elapsed = 0.0
+
+    def add(self, key, df, **timing):
+        self.frames[key] = df
+        self.timings.setdefault(key, {}).update(rows=len(df), **timing)
+
+    def __getitem__(self, key):
+        if key in self.frames:
+            return self.frames[key]
+        matches = [job for job in self.frames if job[:len(key)] == tuple(key)]
+        if len(matches) != 1:
+            raise Exception(f'{key} matches {len(matches)} jobs, give (product, granularity, start, end)')
+        return self.frames[matches[0]]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def to_frame(self):
+        '''
+        :return: every dataset in one DataFrame indexed by
+        (product, granularity, start, end, row)
+        '''
+        return pd.concat(self.frames, names=['product', 'granularity', 'start', 'end', 'row'])
+
+    def timing_table(self):
+        '''
+        :return: DataFrame of the per-job timings
+        '''
+        table = pd.DataFrame.from_dict(self.timings, orient='index')
+        table.index.names = ['product', 'granularity', 'start', 'end']
+        return table
@@ -0,0 +1,204 @@
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+CANDLE_COLUMNS = ['time', 'low', 'high', 'open', 'close', 'volume']
+DAY = 24 * 60 * 60
+
+
+def to_epoch(dt):
+    '''
+    Epoch seconds of a datetime, naive datetimes being UTC as cbpro reads them.
+    :param dt: datetime
+    :return: int epoch seconds
+    '''
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def from_epoch(ts):
+    '''
+    Inverse of `to_epoch`, returns a naive UTC datetime.
+    :param ts: epoch seconds
+    :return: datetime
+    '''
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+class CandleCache:
+    '''
+    Persistent store of raw candles keyed by (product, granularity), one npz
+    file per UTC day. Besides the candles every file records the spans of
+    time that have been fetched, so quiet periods without candles are not
+    refetched and the gaps of a request can be worked out exactly.
+
+    The candle that is still open when a span is fetched is never stored, so
+    it is fetched again once it has closed.
+    '''
+    def __init__(self, root, max_bytes=None):
+        '''
+        :param root: directory of the cache
+        :param max_bytes: size cap of the cache, least recently used days are
+        evicted beyond it. None for no cap.
+        '''
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'fetched_spans': 0, 'evictions': 0}
+
+    def _day_path(self, product, granularity, day):
+        name = datetime.fromtimestamp(day * DAY, timezone.utc).strftime('%Y-%m-%d')
+        return os.path.join(self.root, product, str(granularity), name + '.npz')
+
+    def _read_day(self, path):
+        if not os.path.exists(path):
+            return np.empty(0, dtype=np.int64), np.empty((0, 5)), np.empty((0, 2), dtype=np.int64)
+        with np.load(path) as f:
+            return f['time'], f['values'], f['covered']
+
+    def _write_day(self, path, times, values, covered):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, time=times, values=values, covered=covered)
+        os.replace(tmp, path)
+
+    def missing(self, product, granularity, start, end):
+        '''
+        Spans of candle times in [start, end) that are not in the cache.
+        :param product: cbpro product id
+        :param granularity: data granularity in seconds
+        :param start: epoch seconds, inclusive
+        :param end: epoch seconds, exclusive
+        :return: list of (start, end) epoch second pairs
+        '''
+        gaps = []
+        for day in range(start // DAY, (end - 1) // DAY + 1):
+            lo, hi = max(start, day * DAY), min(end, (day + 1) * DAY)
+            _, _, covered = self._read_day(self._day_path(product, granularity, day))
+            day_gaps = _subtract(lo, hi, covered)
+            self.stats['misses' if day_gaps else 'hits'] += 1
+            for a, b in day_gaps:
+                if gaps and gaps[-1][1] == a:
+                    gaps[-1] = (gaps[-1][0], b)
+                else:
+                    gaps.append((a, b))
+        return gaps
+
+    def store(self, product, granularity, start, end, candles, now=None):
+        '''
+        Merges freshly fetched candles for the span [start, end) into the cache.
+        :param product: cbpro product id
+        :param granularity: data granularity in seconds
+        :param start: epoch seconds, inclusive
+        :param end: epoch seconds, exclusive
+        :param candles: raw cbpro candles
+        :param now: current epoch seconds, defaults to the wall clock
+        '''
+        now = int(time.time()) if now is None else now
+        end = min(end, now // granularity * granularity)
+        if end <= start:
+            return
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS))
+        times = candles[:, 0].astype(np.int64)
+        keep = (times >= start) & (times < end)
+        times, values = times[keep], candles[keep, 1:]
+        self.stats['fetched_spans'] += 1
+        for day in range(start // DAY, (end - 1) // DAY + 1):
+            lo, hi = max(start, day * DAY), min(end, (day + 1) * DAY)
+            path = self._day_path(product, granularity, day)
+            old_times, old_values, covered = self._read_day(path)
+            sel = (times >= lo) & (times < hi)
+            # fresh candles win over cached ones with the same time
+            all_times = np.concatenate([times[sel], old_times])
+            all_values = np.concatenate([values[sel], old_values])
+            all_times, first = np.unique(all_times, return_index=True)
+            covered = _union(np.vstack([covered, [[lo, hi]]]))
+            self._write_day(path, all_times, all_values[first], covered)
+
+    def load(self, product, granularity, start, end):
+        '''
+        Cached candles with times in [start, end), in raw cbpro column order.
+        :param product: cbpro product id
+        :param granularity: data granularity in seconds
+        :param start: epoch seconds, inclusive
+        :param end: epoch seconds, exclusive
+        :return: DataFrame with cbpro candle columns, sorted by time
+        '''
+        times, values = [], []
+        for day in range(start // DAY, (end - 1) // DAY + 1):
+            path = self._day_path(product, granularity, day)
+            t, v, _ = self._read_day(path)
+            if not len(t):
+                continue
+            os.utime(path)
+            sel = (t >= start) & (t < end)
+            times.append(t[sel])
+            values.append(v[sel])
+        if not times:
+            return pd.DataFrame(columns=CANDLE_COLUMNS)
+        values = np.concatenate(values)
+        df = pd.DataFrame(values, columns=CANDLE_COLUMNS[1:])
+        df.insert(0, 'time', np.concatenate(times))
+        return df
+
+    def size(self):
+        '''
+        :return: total bytes of the cached files
+        '''
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self):
+        '''
+        Deletes least recently used day files until the cache fits `max_bytes`.
+        '''
+        if self.max_bytes is None:
+            return
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.stats['evictions'] += 1
+
+    def _files(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.npz'):
+                    st = os.stat(os.path.join(dirpath, name))
+                    yield os.path.join(dirpath, name), st.st_size, st.st_mtime
+
+
+def _union(spans):
+    '''
+    Merges overlapping or touching [start, end) spans.
+    '''
+    spans = spans[np.argsort(spans[:, 0], kind='stable')]
+    merged = []
+    for a, b in spans:
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return np.array(merged, dtype=np.int64).reshape(-1, 2)
+
+
+def _subtract(lo, hi, covered):
+    '''
+    Parts of [lo, hi) not covered by the sorted, disjoint spans `covered`.
+    '''
+    gaps = []
+    for a, b in covered:
+        if b <= lo or a >= hi:
+            continue
+        if a > lo:
+            gaps.append((lo, int(a)))
+        lo = max(lo, int(b))
+    if lo < hi:
+        gaps.append((lo, hi))
+    return gaps
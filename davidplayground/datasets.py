@@ -1,9 +1,199 @@
 import numpy as np
 import pandas as pd
-from cbpro import PublicClient
 from davidplayground.utils import *
+from davidplayground.fetching import CandleFetcher
+from davidplayground.cache import CandleCache, to_epoch, from_epoch
+from davidplayground.archive import CandleArchive
+from davidplayground.pipeline import IndicatorPipeline, plan_treatments
+from davidplayground import instrument
 
-class WienerDataset:
+WIENER_FLOOR = 0.0001
+
+def wiener_walk(s0, steps, floor=WIENER_FLOOR):
+    '''
+    Accumulates increments into a price path starting at `s0`. Whenever the
+    path drops to or below zero it is reset to `floor` and continues from
+    there, exactly as the step-by-step generator does.
+    :param s0: Initial value of the path
+    :param steps: 1d array of increments, one per step after the first
+    :param floor: value the path restarts at after hitting zero
+    :return: float64 array of length len(steps) + 1
+    '''
+    steps = np.asarray(steps, dtype=np.float64)
+    path = np.empty(len(steps) + 1, dtype=np.float64)
+    path[0] = s0
+    path[1:] = steps
+    # add.accumulate is sequential, so this rounds exactly like `st += step`
+    np.add.accumulate(path, out=path)
+    hits = np.flatnonzero(path[1:] <= 0.0)
+    if hits.size:
+        _restart_at_floor(path, steps, hits[0] + 1, floor)
+    return path
+
+def apply_treatments(df, treatments, treatment_args):
+    '''
+    Runs a dataset through a chain of treatment functions in order.
+    :param df: DataFrame dataset
+    :param treatments: list of treatment functions
+    :param treatment_args: list of kwargs dicts (or None) for the treatments
+    :return: treated dataset
+    '''
+    for t in range(len(treatments)):
+        treatment = treatments[t]
+        args = treatment_args[t]
+        try:
+            with instrument.section('treatment', treatment_name(treatment), rows=len(df)):
+                if args:
+                    df = treatment(df, **args)
+                else:
+                    df = treatment(df)
+        except Exception as err:
+            print(f"FAILED TO APPLY TREATMENT: {treatment_name(treatment)} with {args or {}} on {len(df)} rows")
+            raise err
+    return df
+
+def treatment_name(treatment):
+    '''
+    Name of a treatment function, or of the indicators a planned
+    IndicatorPipeline fuses.
+    '''
+    if isinstance(treatment, IndicatorPipeline):
+        return f"IndicatorPipeline({'+'.join(name for name, _ in treatment.steps)})"
+    return getattr(treatment, '__name__', repr(treatment))
+
+def _restart_at_floor(path, steps, i, floor):
+    '''
+    Recomputes `path` in place from index `i` on, restarting at `floor` at
+    every non-positive value. Each restart only rescans up to the next hit in
+    doubling windows, so the total cost stays linear in the path length.
+    '''
+    n = len(path)
+    while i < n:
+        path[i] = floor
+        j = i + 1
+        w = 64
+        i = n
+        while j < n:
+            stop = min(j + w, n)
+            seg = np.empty(stop - j + 1, dtype=np.float64)
+            seg[0] = path[j - 1]
+            seg[1:] = steps[j - 1:stop - 1]
+            np.add.accumulate(seg, out=seg)
+            seg = seg[1:]
+            hits = np.flatnonzero(seg <= 0.0)
+            if hits.size:
+                path[j:j + hits[0]] = seg[:hits[0]]
+                i = j + hits[0]
+                break
+            path[j:stop] = seg
+            j = stop
+            w *= 2
+
+class WienerPaths:
+    '''
+    Batch of equal-length paths produced by WienerDataset.iter_paths.
+
+    `close` holds the raw paths as an (n_paths x n_steps) array. Unless the
+    batch was generated raw, `df` is the treated long-format frame, paths back
+    to back and tagged by a `path_id` column.
+    '''
+    def __init__(self, time, close, path_ids, seed, df=None):
+        self.time = time
+        self.close = close
+        self.path_ids = path_ids
+        self.seed = seed
+        self.df = df
+
+    def __len__(self):
+        return len(self.path_ids)
+
+    def column(self, name):
+        '''
+        A column of the treated frame as an (n_paths x n_steps) array.
+        :param name: column name
+        :return: 2d array, one row per path
+        '''
+        if name == 'close' or self.df is None:
+            return self.close
+        return self.df[name].to_numpy().reshape(len(self.path_ids), -1)
+
+    def frame(self):
+        '''
+        The batch as a long-format frame, the treated one unless the batch
+        was generated raw.
+        :return: DataFrame with the paths back to back, tagged by `path_id`
+        '''
+        if self.df is not None:
+            return self.df
+        return pd.DataFrame({
+            'time': np.tile(self.time.to_numpy(), len(self.path_ids)),
+            'close': self.close.ravel(),
+            'path_id': np.repeat(self.path_ids, len(self.time)),
+        })
+
+    def path(self, path_id):
+        '''
+        The rows of a single path as its own DataFrame.
+        :param path_id: id of the path within the batch
+        :return: DataFrame dataset
+        '''
+        i = int(np.searchsorted(self.path_ids, path_id))
+        if i >= len(self.path_ids) or self.path_ids[i] != path_id:
+            raise Exception(f'Path {path_id} is not part of this batch')
+        if self.df is None:
+            return pd.DataFrame({'time': self.time, 'close': self.close[i]})
+        n = len(self.time)
+        return self.df.iloc[i * n:(i + 1) * n].drop(columns='path_id').reset_index(drop=True)
+
+class TreatedDataset:
+    '''
+    Post-processing shared by the dataset providers. Treatments are applied
+    in the order they were added, with consecutive indicator treatments
+    fused into an IndicatorPipeline so shared series are computed once.
+    '''
+    planned = True # set False to run the treatments one by one as added
+    _plan = None
+
+    def add_treatment(self, treatment, kwargs=None):
+        '''
+        Append a new treatment function to the post-processor for the dataset
+        :param treatment: treatment function with first argument dataframe and
+        return value dataframe.
+        :param args: additional arguments to the treatment function
+        '''
+        self.treatment_args.append(kwargs)
+        self.treatments.append(treatment)
+        self._plan = None
+
+    def treat(self, df):
+        '''
+        Runs a dataset through the treatment chain.
+        :param df: DataFrame dataset
+        :return: treated dataset
+        '''
+        if not self.planned:
+            return apply_treatments(df, self.treatments, self.treatment_args)
+        if self._plan is None:
+            self._plan = plan_treatments(self.treatments, self.treatment_args)
+        return apply_treatments(df, *self._plan)
+
+    def explain(self):
+        '''
+        Plan view of the treatment chain, with per-node timings of the last
+        treated dataset.
+        :return: multi-line string
+        '''
+        if self._plan is None:
+            self._plan = plan_treatments(self.treatments, self.treatment_args)
+        lines = []
+        for treatment in self._plan[0]:
+            if isinstance(treatment, IndicatorPipeline):
+                lines.append(treatment.explain())
+            else:
+                lines.append(getattr(treatment, '__name__', repr(treatment)))
+        return '\n'.join(lines)
+
+class WienerDataset(TreatedDataset):
     def __init__(self, s0=1.0, nmu=0.0, nsigma=1.0):
         '''
         Initializes a Wiener process generator to use as a toy dataset for
@@ -19,25 +209,119 @@ class WienerDataset:
         self.treatments = []
         self.treatment_args = []
 
-    def add_treatment(self, treatment, kwargs=None):
+    def generate(self, hours=1, seed=None, raw=False, vectorized=True, rng=None):
         '''
-        Append a new treatment function to the post-processor for the dataset
-        :param treatment: treatment function with first argument dataframe and
-        return value dataframe.
-        :param args: additional arguments to the treatment function
+        Generates a Wiener process with the specified seed. Returns a DataFrame.
+
+        :param hours: Hours of minute-level datapoints to generate
+        :param seed: Seed for random generation
+        :param raw: whether or not to skip treatments on the dataset
+        :param vectorized: draw all increments at once instead of stepping
+        through a python loop (same output for the same seed)
+        :param rng: numpy Generator/RandomState to draw from instead of the
+        global state; only used when vectorized
+        :return: DataFrame of data points.
         '''
-        if kwargs:
-            self.treatment_args.append(kwargs)
-        self.treatments.append(treatment)
+        with instrument.section('dataset', 'WienerDataset.generate', rows=hours * 60):
+            if vectorized:
+                df = self._generate_vectorized(hours=hours, seed=seed, rng=rng)
+            else:
+                df = self._generate_loop(hours=hours, seed=seed)
+        if not raw:
+            df = self.treat(df)
+        return df
 
-    def generate(self, hours=1, seed=None, raw=False):
+    def write_archive(self, archive, hours=1, seed=None, rng=None):
         '''
-        Generates a Wiener process with the specified seed. Returns a DataFrame.
+        Generates a raw Wiener process and appends it to a CandleArchive.
+        :param archive: CandleArchive or archive directory
+        :return: number of rows appended
+        '''
+        if isinstance(archive, str):
+            archive = CandleArchive(archive)
+        return archive.write(self.generate(hours=hours, seed=seed, raw=True, rng=rng))
 
-        :param n: Amount of datapoints to generate
-        :param seed: Seed for random generation
+    def read_archive(self, archive, start=None, end=None, raw=False):
+        '''
+        Reads the archived rows between `start` and `end` and treats them like
+        freshly generated data.
+        :param archive: CandleArchive or archive directory
+        :param start: start date-time, None for the first archived row
+        :param end: end date-time, None for the last archived row
+        :param raw: whether or not to skip treatments on the dataset
         :return: DataFrame of data points.
         '''
+        if isinstance(archive, str):
+            archive = CandleArchive(archive)
+        df = archive.slice(start, end).to_frame()
+        if not raw:
+            df = self.treat(df)
+        return df
+
+    def path_rng(self, seed, path_id):
+        '''
+        Random generator for a single path of a batch. Path `i` of
+        `iter_paths(..., seed=seed)` can be regenerated on its own with
+        `generate(hours, rng=W.path_rng(seed, i))`.
+        :param seed: batch seed
+        :param path_id: id of the path within the batch
+        :return: numpy Generator
+        '''
+        return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(path_id,)))
+
+    def generate_paths(self, n_paths, hours=1, seed=None, raw=False):
+        '''
+        Generates `n_paths` independent paths at once, see `iter_paths`.
+        :return: WienerPaths batch
+        '''
+        if n_paths <= 0:
+            raise Exception(f'n_paths must be positive, got {n_paths}')
+        return next(self.iter_paths(n_paths, hours=hours, seed=seed, raw=raw, chunk_paths=n_paths))
+
+    def iter_paths(self, n_paths, hours=1, seed=None, raw=False, chunk_paths=250):
+        '''
+        Generates `n_paths` independent Wiener processes sharing the same
+        parameters and time axis, `chunk_paths` paths at a time so memory
+        stays bounded by the chunk size. Each chunk is treated once as a
+        long-format frame rather than once per path.
+
+        :param n_paths: Number of paths to generate
+        :param hours: Hours of minute-level datapoints per path
+        :param seed: Batch seed; path i is seeded by (seed, i) so it can be
+        regenerated on its own with `path_rng`
+        :param raw: whether or not to skip treatments on the dataset
+        :param chunk_paths: Maximum number of paths per yielded batch
+        :return: generator of WienerPaths
+        '''
+        if n_paths <= 0:
+            raise Exception(f'n_paths must be positive, got {n_paths}')
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        n = hours * 60
+        t0 = datetime.now() - timedelta(hours=hours)
+        time = pd.date_range(start=t0, periods=n, freq='60s')
+        for first in range(0, n_paths, chunk_paths):
+            path_ids = np.arange(first, min(first + chunk_paths, n_paths))
+            close = np.empty((len(path_ids), n), dtype=np.float64)
+            for row, path_id in enumerate(path_ids):
+                steps = self.path_rng(seed, path_id).normal(self.nmu, self.nsigma ** 2, size=n)
+                close[row, 0] = self.s0
+                close[row, 1:] = steps[:n - 1]
+            np.add.accumulate(close, axis=1, out=close)
+            # the few paths that touch zero are redrawn and restarted at the floor
+            for row in np.flatnonzero((close[:, 1:] <= 0.0).any(axis=1)):
+                steps = self.path_rng(seed, path_ids[row]).normal(self.nmu, self.nsigma ** 2, size=n)
+                hit = np.flatnonzero(close[row, 1:] <= 0.0)[0] + 1
+                _restart_at_floor(close[row], steps, hit, WIENER_FLOOR)
+            batch = WienerPaths(time, close, path_ids, seed)
+            if not raw:
+                batch.df = self.treat(batch.frame())
+            yield batch
+
+    def _generate_loop(self, hours=1, seed=None):
+        '''
+        Reference implementation of `generate`, one bar per python iteration.
+        '''
         if seed is not None:
             np.random.seed(seed)
         st = self.s0
@@ -49,46 +333,48 @@ class WienerDataset:
             st += np.random.normal(self.nmu, self.nsigma ** 2)
             t += timedelta(seconds=60)
             if st <= 0.0:
-                st = 0.0001
+                st = WIENER_FLOOR
             rows.append(newrow)
-        df = pd.DataFrame(rows)
-        if not raw:
-            for t in range(len(self.treatments)):
-                treatment = self.treatments[t]
-                try:
-                    args = self.treatment_args[t]
-                    if args:
-                        df = treatment(df, **args)
-                    else:
-                        df = treatment(df)
-                except Exception as err:
-                    print(f"FAILED TO APPLY TREATMENT: {treatment.__name__}")
-                    raise err
-        return df
+        return pd.DataFrame(rows)
+
+    def _generate_vectorized(self, hours=1, seed=None, rng=None):
+        '''
+        Array implementation of `generate`. Increments are drawn in one call
+        in the same order the loop draws them, so a seeded legacy stream gives
+        bit-identical closes.
+        '''
+        n = hours * 60
+        if rng is None:
+            if seed is not None:
+                np.random.seed(seed)
+            rng = np.random
+        steps = rng.normal(self.nmu, self.nsigma ** 2, size=n)
+        close = wiener_walk(self.s0, steps[:n - 1]) if n > 0 else np.empty(0)
+        t0 = datetime.now() - timedelta(hours=hours)
+        time = pd.date_range(start=t0, periods=n, freq='60s')
+        return pd.DataFrame({'time': time, 'close': close})
 
-class CoinDataset:
-    def __init__(self, name='BTC'):
+class CoinDataset(TreatedDataset):
+    def __init__(self, name='BTC', client=None, workers=4, rate=3.0, cache=None):
         '''
         Creates a dataset provider for the cryptocurrency with ticker `name`
 
         :param name: Crypto ticker
+        :param client: cbpro.PublicClient or a stand-in with the same API
+        :param workers: number of concurrent historic rates queries
+        :param rate: query budget in requests per second
+        :param cache: CandleCache or cache directory to keep fetched candles in
         '''
+        if client is None:
+            from cbpro import PublicClient
+            client = PublicClient()
         self.name = name
-        self.client = PublicClient()
-        self.treatments = [convert_timestamps]
+        self.client = client
+        self.fetcher = CandleFetcher(self.client, workers=workers, rate=rate)
+        self.cache = CandleCache(cache) if isinstance(cache, str) else cache
+        self.treatments = [ingest_candles]
         self.treatment_args = [None]
 
-    def add_treatment(self, treatment, kwargs=None):
-        '''
-        Append a new treatment function to the post-processor for the dataset
-        :param treatment: treatment function with first argument dataframe and
-        return value dataframe.
-        :param args: additional arguments to the treatment function
-        '''
-        if kwargs:
-            self.treatment_args.append(kwargs)
-        self.treatments.append(treatment)
-
     def get(self, start, end, granularity=60, raw=False):
         '''
         Queries historical price data from cbpro api between ISO-format times
@@ -100,32 +386,63 @@ class CoinDataset:
         :param raw: whether or not to skip treatments on the dataset
         :return: dataframe containing the requested data
         '''
-        df = pd.DataFrame(columns=['time', 'open', 'close', 'high', 'low', 'volume'])
-        max_queries = 200
-        curtime = datetime.fromisoformat(start)
-        nexttime = curtime + timedelta(seconds=granularity*max_queries)
-        endtime = datetime.fromisoformat(end)
-        while curtime < endtime:
-            if nexttime > endtime:
-                nexttime = endtime
-            query = self.client.get_product_historic_rates(f'{self.name}-USD', start=curtime.isoformat(),
-                                                   end=nexttime.isoformat(), granularity=granularity)
-            df = df.append(cbquery2df(query), sort=True)
-            curtime = nexttime
-            nexttime += timedelta(seconds=granularity*max_queries)
+        with instrument.section('dataset', 'CoinDataset.get') as sec:
+            if self.cache is not None:
+                df = self._get_cached(datetime.fromisoformat(start), datetime.fromisoformat(end), granularity)
+            else:
+                query = self.fetcher.fetch(f'{self.name}-USD', datetime.fromisoformat(start),
+                                           datetime.fromisoformat(end), granularity=granularity)
+                df = cbquery2df(query)
+            df = df.reindex(columns=['close', 'high', 'low', 'open', 'time', 'volume'])
+            sec.rows(len(df))
 
         if not raw:
-            for t in range(len(self.treatments)):
-                treatment = self.treatments[t]
-                try:
-                    args = self.treatment_args[t]
-                    if args:
-                        df = treatment(df, **args)
-                    else:
-                        df = treatment(df)
-                except Exception as err:
-                    print(f"FAILED TO APPLY TREATMENT: {treatment.__name__}")
-                    raise err
+            df = self.treat(df)
+        return df
+
+    def write_archive(self, archive, start, end, granularity=60):
+        '''
+        Queries raw candles between `start` and `end` and appends them to a
+        CandleArchive.
+        :param archive: CandleArchive or archive directory
+        :param start: start date-time in ISO-8601
+        :param end: end date-time in ISO-8601
+        :param granularity: data granularity in seconds
+        :return: number of rows appended
+        '''
+        if isinstance(archive, str):
+            archive = CandleArchive(archive)
+        return archive.write(self.get(start, end, granularity=granularity, raw=True))
+
+    def read_archive(self, archive, start=None, end=None, raw=False):
+        '''
+        Reads archived candles between `start` and `end` in place of querying
+        them, then applies the treatments.
+        :param archive: CandleArchive or archive directory
+        :param start: start date-time, None for the first archived candle
+        :param end: end date-time, None for the last archived candle
+        :param raw: whether or not to skip treatments on the dataset
+        :return: dataframe containing the requested data
+        '''
+        if isinstance(archive, str):
+            archive = CandleArchive(archive)
+        df = archive.slice(start, end).to_frame(unit='s')
+        if not raw:
+            df = self.treat(df)
+        return df
+
+    def _get_cached(self, start, end, granularity):
+        '''
+        Reads the candles between `start` and `end` from the cache, fetching
+        and storing only the spans that are missing from it first.
+        '''
+        product = f'{self.name}-USD'
+        lo, hi = to_epoch(start), to_epoch(end) + 1
+        for a, b in self.cache.missing(product, granularity, lo, hi):
+            query = self.fetcher.fetch(product, from_epoch(a), from_epoch(b - 1), granularity=granularity)
+            self.cache.store(product, granularity, a, b, query)
+        df = self.cache.load(product, granularity, lo, hi)
+        self.cache.evict()
         return df
 
     def sample_between(self, start, end, days=0, hours=0, granularity=60):
@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from davidplayground import instrument
+
+MAX_CANDLES = 200 # most candles cbpro returns for a single historic rates query
+
+
+def plan_windows(start, end, granularity=60, max_candles=MAX_CANDLES):
+    '''
+    Splits the span between `start` and `end` into consecutive query windows
+    of at most `max_candles` candles each.
+    :param start: start datetime
+    :param end: end datetime
+    :param granularity: data granularity in seconds
+    :param max_candles: candles per window
+    :return: list of (start, end) datetime pairs
+    '''
+    step = timedelta(seconds=granularity * max_candles)
+    windows = []
+    curtime = start
+    while curtime < end:
+        nexttime = min(curtime + step, end)
+        windows.append((curtime, nexttime))
+        curtime = nexttime
+    return windows
+
+
+class RateLimiter:
+    '''
+    Thread-safe limiter spacing calls at most `rate` per second apart.
+    '''
+    def __init__(self, rate=None):
+        '''
+        :param rate: allowed calls per second, None for no limit
+        '''
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Blocks until the caller may make its next call.
+        '''
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ThrottledError(Exception):
+    '''
+    A window was still throttled after every retry.
+    '''
+    pass
+
+
+class CandleFetcher:
+    '''
+    Fetches historic candles for a time range by planning every query window
+    up front and sending them through a bounded thread pool, within a
+    requests-per-second budget. Throttled windows are retried with
+    exponential backoff. Any object with cbpro's `get_product_historic_rates`
+    signature can be used as the client.
+    '''
+    def __init__(self, client, workers=4, rate=3.0, retries=5, backoff=0.5, max_candles=MAX_CANDLES):
+        '''
+        :param client: cbpro.PublicClient or a stand-in with the same API
+        :param workers: number of concurrent requests
+        :param rate: request budget in requests per second, None for no limit
+        :param retries: retries per window when throttled
+        :param backoff: initial backoff in seconds, doubled on every retry
+        :param max_candles: candles per query window
+        '''
+        self.client = client
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_candles = max_candles
+        self.stats = {'windows': 0, 'requests': 0, 'throttled': 0, 'elapsed': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def fetch(self, product, start, end, granularity=60):
+        '''
+        Queries every candle of `product` between `start` and `end`.
+        :param product: cbpro product id, e.g. 'BTC-USD'
+        :param start: start datetime
+        :param end: end datetime
+        :param granularity: data granularity in seconds
+        :return: list of raw candles, in window order
+        '''
+        t0 = time.perf_counter()
+        windows = plan_windows(start, end, granularity, self.max_candles)
+        if self.workers > 1 and len(windows) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                queries = list(pool.map(lambda w: self._fetch_window(product, w, granularity), windows))
+        else:
+            queries = [self._fetch_window(product, w, granularity) for w in windows]
+        candles = [candle for query in queries for candle in query]
+        with self._stats_lock:
+            self.stats['windows'] += len(windows)
+            self.stats['elapsed'] += time.perf_counter() - t0
+        return candles
+
+    def _fetch_window(self, product, window, granularity):
+        '''
+        Fetches a single window, backing off while the exchange throttles.
+        '''
+        with instrument.section('fetch', product) as sec:
+            query = self._query_window(product, window, granularity)
+            sec.rows(len(query))
+        return query
+
+    def _query_window(self, product, window, granularity):
+        '''
+        Queries a window, retrying it with exponential backoff.
+        '''
+        start, end = window
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                query = self.client.get_product_historic_rates(product, start=start.isoformat(),
+                                                               end=end.isoformat(), granularity=granularity)
+                throttled = _is_throttled(query)
+            except OSError:
+                # dropped connections are retried like throttled windows
+                throttled = True
+            with self._stats_lock:
+                self.stats['requests'] += 1
+                self.stats['throttled'] += int(throttled)
+            if not throttled:
+                if isinstance(query, dict):
+                    raise Exception(f"Query for {product} {start}-{end} failed: {query.get('message')}")
+                return query
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        raise ThrottledError(f'Query for {product} {start}-{end} throttled {self.retries + 1} times')
+
+
+def _is_throttled(query):
+    '''
+    cbpro hands back the error body instead of raising when rate limited.
+    '''
+    return isinstance(query, dict) and 'rate limit' in str(query.get('message', '')).lower()
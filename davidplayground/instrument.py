@@ -0,0 +1,227 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+_active = None # the enabled Instrumentation, None when instrumentation is off
+
+
+def current():
+    '''
+    :return: the enabled Instrumentation, or None. Hot loops check this once
+    and only take the instrumented path when it is not None.
+    '''
+    return _active
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def rows(self, n):
+        pass
+
+_NULL = _NullSection()
+
+
+def section(kind, name, rows=None):
+    '''
+    Times the enclosed block under (kind, name) of the enabled
+    Instrumentation; a shared no-op when instrumentation is off.
+    :param kind: group of the section, e.g. 'treatment', 'fetch', 'step'
+    :param name: name of the section within its kind
+    :param rows: rows the block processes, or set later with `.rows(n)`
+    '''
+    if _active is None:
+        return _NULL
+    return _active.section(kind, name, rows)
+
+
+class _Section:
+    def __init__(self, owner, kind, name, rows):
+        self.owner = owner
+        self.kind = kind
+        self.name = name
+        self.n = rows
+
+    def rows(self, n):
+        self.n = n
+
+    def __enter__(self):
+        owner = self.owner
+        self.memory = owner.memory and threading.get_ident() == owner.thread
+        if self.memory:
+            # peaks of the enclosing sections survive the reset of this one
+            stack = owner.stack
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self.frame = [current, current]
+            stack.append(self.frame)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.t0
+        net = peak = None
+        if self.memory:
+            stack = self.owner.stack
+            current, traced_peak = tracemalloc.get_traced_memory()
+            stack.pop()
+            start, frame_peak = self.frame
+            peak = max(frame_peak, traced_peak) - start
+            net = current - start
+            if stack:
+                stack[-1][1] = max(stack[-1][1], traced_peak)
+            tracemalloc.reset_peak()
+        self.owner.record(self.kind, self.name, wall, self.n, net, peak)
+        return False
+
+
+class Instrumentation:
+    '''
+    Opt-in record of wall time, rows processed and memory allocated
+    (tracemalloc) per treatment, fetch window and strategy step:
+
+        with Instrumentation(profile='cprofile') as instr:
+            df = W.generate(hours=24 * 30)
+            EMACross().act_on(df, 'BTC')
+        instr.report()          # dict of every section, plus the profile
+        instr.to_json('run.json')
+
+    Sections are recorded only while an Instrumentation is enabled; with
+    none enabled the instrumented code runs its plain path. Memory is
+    measured on the thread that enabled the instrumentation: sections on
+    other threads, such as concurrent fetch windows, record time and rows
+    only, since tracemalloc counts the allocations of every thread.
+    '''
+    def __init__(self, memory=True, profile=None, keep=100000):
+        '''
+        :param memory: whether or not to trace allocations, which slows
+        Python code down a few times while enabled
+        :param profile: None, 'cprofile' or 'pyinstrument' to profile the whole
+        enabled span
+        :param keep: most wall times kept per section for its percentiles
+        '''
+        if profile not in (None, 'cprofile', 'pyinstrument'):
+            raise Exception(f"Unknown profiler {profile}, must be 'cprofile' or 'pyinstrument'")
+        self.memory = memory
+        self.profile = profile
+        self.keep = keep
+        self.sections = {} # (kind, name) -> [calls, wall, rows, net bytes, peak bytes, wall times]
+        self.stack = [] # [start bytes, peak bytes] of the open memory-traced sections
+        self.thread = None
+        self.wall = 0.0
+        self.profiler = None
+        self.profile_stats = None
+        self._lock = threading.Lock()
+        self._tracing = False
+
+    def section(self, kind, name, rows=None):
+        return _Section(self, kind, name, rows)
+
+    def record(self, kind, name, wall, rows=None, net=None, peak=None):
+        '''
+        Adds one run of a section; thread-safe.
+        '''
+        with self._lock:
+            entry = self.sections.get((kind, name))
+            if entry is None:
+                entry = self.sections[(kind, name)] = [0, 0.0, 0, None, None, []]
+            entry[0] += 1
+            entry[1] += wall
+            entry[2] += rows or 0
+            if net is not None:
+                entry[3] = (entry[3] or 0) + net
+                entry[4] = max(entry[4] or 0, peak)
+            if len(entry[5]) < self.keep:
+                entry[5].append(wall)
+
+    def enable(self):
+        '''
+        :return: self
+        '''
+        global _active
+        if _active is not None:
+            raise Exception('Another Instrumentation is already enabled')
+        self.thread = threading.get_ident()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        if self.profile == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profile == 'pyinstrument':
+            from pyinstrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.start()
+        self.t0 = time.perf_counter()
+        _active = self
+        return self
+
+    def disable(self):
+        global _active
+        if _active is not self:
+            return
+        _active = None
+        self.wall += time.perf_counter() - self.t0
+        if self.profile == 'cprofile':
+            self.profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(30)
+            self.profile_stats = out.getvalue()
+        elif self.profile == 'pyinstrument':
+            self.profiler.stop()
+            self.profile_stats = self.profiler.output_text()
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        self.stack = []
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc):
+        self.disable()
+        return False
+
+    def report(self):
+        '''
+        :return: JSON-serializable dict: the enabled wall time, and per kind
+        and name the calls, wall time (total, mean, p50, p99, max in ms),
+        rows, rows per second, net and peak bytes allocated (None when not
+        traced), and the profile text when one was captured
+        '''
+        kinds = {}
+        with self._lock:
+            sections = {key: list(entry) for key, entry in self.sections.items()}
+        for (kind, name), (calls, wall, rows, net, peak, walls) in sections.items():
+            ms = np.array(walls) * 1e3
+            kinds.setdefault(kind, {})[name] = {
+                'calls': calls, 'wall_seconds': wall, 'mean_ms': wall / calls * 1e3,
+                'p50_ms': float(np.percentile(ms, 50)), 'p99_ms': float(np.percentile(ms, 99)),
+                'max_ms': float(ms.max()), 'rows': rows, 'rows_per_second': rows / wall if wall else None,
+                'net_bytes': net, 'peak_bytes': peak,
+            }
+        return {'wall_seconds': self.wall, 'memory': self.memory, 'sections': kinds,
+                'profile': self.profile_stats}
+
+    def to_json(self, path=None):
+        '''
+        :param path: file to write the report to
+        :return: the report as a JSON string
+        '''
+        text = json.dumps(self.report(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
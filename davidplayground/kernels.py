@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+
+def _as_columns(values):
+    '''
+    Views 1d input as a single column so kernels only deal with 2d arrays.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    return values[:, None] if values.ndim == 1 else values
+
+
+def sma(values, dt=2):
+    '''
+    Simple moving average along the first axis, NaN until the window is full.
+    :param values: 1d array or 2d array with one series per column
+    :param dt: Size of window for SMA
+    :return: float64 array of the same shape as `values`
+    '''
+    out = pd.DataFrame(_as_columns(values)).rolling(window=dt).mean().to_numpy()
+    return out[:, 0] if np.ndim(values) == 1 else out
+
+
+def rolling_std(values, dt=2):
+    '''
+    Rolling sample standard deviation along the first axis.
+    :param values: 1d array or 2d array with one series per column
+    :param dt: Size of window
+    :return: float64 array of the same shape as `values`
+    '''
+    out = pd.DataFrame(_as_columns(values)).rolling(window=dt).std().to_numpy()
+    return out[:, 0] if np.ndim(values) == 1 else out
+
+
+def ema(values, dt=2, smoothing=2.0, alpha=None):
+    '''
+    Exponential moving average along the first axis, with the semantics of
+    the treatment function `add_ema`: the average is seeded with the mean of
+    the first `dt` values, the first `dt` outputs are NaN, and NaN inputs
+    yield NaN without advancing the average.
+
+    The recurrence runs as a first order IIR filter (scipy.signal.lfilter),
+    which rounds exactly like the step-by-step loop.
+    :param values: 1d array or 2d array with one series per column
+    :param dt: Size of window for EMA
+    :param smoothing: EMA smoothing factor, alpha = smoothing / (1 + dt)
+    :param alpha: weight of the newest value, overrides `smoothing`
+    :return: float64 array of the same shape as `values`
+    '''
+    from scipy.signal import lfilter
+
+    x = _as_columns(values)
+    out = np.full(x.shape, np.nan)
+    if len(x) > dt:
+        if alpha is None:
+            alpha = smoothing / (1.0 + dt)
+        b, a = [alpha], [1.0, -(1 - alpha)]
+        head = x[:dt]
+        valid = ~np.isnan(head)
+        counts = valid.sum(axis=0)
+        sums = np.where(valid, head, 0.0).sum(axis=0)
+        seed = np.divide(sums, counts, out=np.zeros(x.shape[1]), where=counts > 0)
+        zi = seed * (1 - alpha)
+        tail = x[dt:]
+        gaps = np.isnan(tail).any(axis=0)
+        if not gaps.all():
+            cols = np.flatnonzero(~gaps)
+            out[dt:, cols] = lfilter(b, a, tail[:, cols], axis=0, zi=zi[cols][None, :])[0]
+        # NaNs do not advance the average, so filter only the valid values
+        for col in np.flatnonzero(gaps):
+            valid = ~np.isnan(tail[:, col])
+            out[dt:, col][valid] = lfilter(b, a, tail[valid, col], zi=zi[col:col + 1])[0]
+    return out[:, 0] if np.ndim(values) == 1 else out
+
+
+def emas(values, dts, smoothing=2.0):
+    '''
+    Exponential moving averages of the same series for several window sizes.
+    :param values: 1d array or 2d array with one series per column
+    :param dts: Sizes of window for EMA
+    :param smoothing: EMA smoothing factor
+    :return: dict of window size to float64 array shaped like `values`
+    '''
+    x = np.asarray(values, dtype=np.float64)
+    return {dt: ema(x, dt=dt, smoothing=smoothing) for dt in dts}
+
+
+def rsi(values, dts, middle='ema'):
+    '''
+    Relative strength index along the first axis for several periods,
+    sharing one diff of the series.
+    :param values: 1d array or 2d array of closes with one series per column
+    :param dts: Periods of the RSI
+    :param middle: averaging of gains and losses, "sma", "ema" (smoothing 2)
+    or "wilder" (alpha 1/dt, seeded with the mean of the first dt changes)
+    :return: dict of period to float64 array shaped like `values`
+    '''
+    up, down = gains_losses(values)
+    result = {}
+    for dt in dts:
+        if middle == 'sma':
+            avg_up = sma(up, dt)
+            avg_down = sma(down, dt)
+        elif middle == 'ema':
+            avg_up = ema(up, dt=dt, smoothing=2.0)
+            avg_down = ema(down, dt=dt, smoothing=2.0)
+        elif middle == 'wilder':
+            avg_up = wilder(up, dt)
+            avg_down = wilder(down, dt)
+        else:
+            raise Exception('RSI mean method must be one of "sma", "ema" or "wilder"')
+        out = rsi_from_averages(avg_up, avg_down)
+        result[dt] = out[:, 0] if np.ndim(values) == 1 else out
+    return result
+
+
+def gains_losses(values):
+    '''
+    Upward and downward moves between consecutive values along the first
+    axis; the first row has none.
+    :param values: 1d array or 2d array with one series per column
+    :return: (gains, losses) 2d float64 arrays
+    '''
+    x = _as_columns(values)
+    diff = np.zeros(x.shape)
+    np.subtract(x[1:], x[:-1], out=diff[1:])
+    return np.maximum(diff, 0.0), np.maximum(-diff, 0.0)
+
+
+def rsi_from_averages(avg_up, avg_down):
+    '''
+    RSI = 100 - 100 / (1 + RS) from averaged gains and losses.
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 - 100.0 / (1.0 + avg_up / avg_down)
+
+
+def wilder(values, dt):
+    '''
+    Wilder's smoothing of gains or losses. The first value is the padding
+    of the diff, so the average starts from the mean of the next `dt`.
+    '''
+    out = np.full(values.shape, np.nan)
+    if len(values) > dt:
+        out[1:] = ema(values[1:], dt=dt, alpha=1.0 / dt)
+        with np.errstate(invalid='ignore'):
+            out[dt] = np.nanmean(values[1:dt + 1], axis=0)
+    return out
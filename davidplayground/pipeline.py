@@ -0,0 +1,255 @@
+import time
+
+import numpy as np
+
+from davidplayground import kernels
+from davidplayground import utils
+
+
+class IndicatorPipeline:
+    '''
+    Planner for indicator treatments. Every indicator added declares the
+    intermediate series it needs (EMA(close, 26), rolling std(close, 20),
+    ...) as nodes of a graph keyed by what they compute, so a series shared
+    by several indicators is computed once. Calling the pipeline on a
+    dataset evaluates each node in topological order and writes only the
+    requested output columns, which makes it a treatment function itself:
+
+        pipe = IndicatorPipeline()
+        pipe.add(add_macd, a=12, b=26)
+        pipe.add(add_bollinger, dt=26, middle='ema')
+        W.add_treatment(pipe)
+
+    Supported treatments are the ones in INDICATORS.
+    '''
+    def __init__(self):
+        self.nodes = {} # key -> (kind, input keys, params), in topological order
+        self.outputs = [] # (column name, key), later entries win
+        self.producers = {} # column name -> key of the node that writes it
+        self.steps = [] # (treatment name, kwargs) in the order they were added
+        self.timings = {}
+        self.__name__ = 'IndicatorPipeline'
+
+    def add(self, treatment, **kwargs):
+        '''
+        Adds an indicator to the plan.
+        :param treatment: treatment function (e.g. add_macd) or its name
+        :param kwargs: arguments of the treatment function
+        :return: self, so calls can be chained
+        '''
+        name = treatment if isinstance(treatment, str) else treatment.__name__
+        if name not in INDICATORS:
+            raise Exception(f'Treatment {name} cannot be planned, must be one of {sorted(INDICATORS)}')
+        INDICATORS[name](self, **kwargs)
+        self.steps.append((name, kwargs))
+        return self
+
+    def source(self, col):
+        '''
+        Node of a dataset column, or of the node planned to write it.
+        '''
+        if col in self.producers:
+            return self.producers[col]
+        return self.node('col', col)
+
+    def node(self, kind, *args):
+        '''
+        Returns the key of the node computing `kind` over `args`, planning it
+        if no identical node exists yet. Arguments that are keys of other
+        nodes are its inputs.
+        '''
+        key = (kind,) + args
+        if key not in self.nodes:
+            inputs = [a for a in args if isinstance(a, tuple) and a in self.nodes]
+            params = [a for a in args if not (isinstance(a, tuple) and a in self.nodes)]
+            self.nodes[key] = (kind, inputs, params)
+        return key
+
+    def output(self, col, key):
+        '''
+        Requests node `key` be written to the dataset as column `col`.
+        '''
+        self.outputs.append((col, key))
+        self.producers[col] = key
+
+    def __call__(self, df):
+        '''
+        Treatment function computing every planned node once and writing the
+        requested columns.
+        :param df: DataFrame dataset
+        :return: treated dataset
+        '''
+        columns = self.columns()
+        needed = self._needed(columns.values())
+        values = {}
+        self.timings = {}
+        for key, (kind, inputs, params) in self.nodes.items():
+            if key not in needed:
+                continue
+            t0 = time.perf_counter()
+            if kind == 'col':
+                values[key] = utils._path_columns(df, params[0])
+            else:
+                values[key] = NODE_KERNELS[kind](*[values[k] for k in inputs], *params)
+            self.timings[key] = time.perf_counter() - t0
+        for col, key in columns.items():
+            df[col] = utils._flatten_paths(values[key])
+        return df
+
+    def columns(self):
+        '''
+        :return: dict of output column to the key of the node written to it
+        '''
+        columns = {}
+        for col, key in self.outputs:
+            columns[col] = key
+        return columns
+
+    def _needed(self, keys):
+        '''
+        Nodes the given nodes depend on, themselves included.
+        '''
+        needed = set()
+        stack = list(keys)
+        while stack:
+            key = stack.pop()
+            if key not in needed:
+                needed.add(key)
+                stack.extend(self.nodes[key][1])
+        return needed
+
+    def explain(self):
+        '''
+        Plan view: every node in evaluation order with its inputs, how many
+        nodes/outputs use it and its time in the last run. Nodes only feeding
+        columns that a later indicator overwrites are pruned.
+        :return: multi-line string
+        '''
+        columns = self.columns()
+        needed = self._needed(columns.values())
+        nodes = [key for key in self.nodes if key in needed]
+        labels = {key: f'n{i}' for i, key in enumerate(nodes)}
+        users = {key: 0 for key in nodes}
+        for key in nodes:
+            for k in self.nodes[key][1]:
+                users[k] += 1
+        written = {}
+        for col, key in columns.items():
+            written.setdefault(key, []).append(col)
+            users[key] += 1
+        lines = [f'{len(self.steps)} treatments -> {len(nodes)} nodes, {len(columns)} outputs']
+        for key in nodes:
+            kind, inputs, params = self.nodes[key]
+            args = ', '.join([labels[k] for k in inputs] + [repr(p) for p in params])
+            line = f'  {labels[key]:>4} = {kind}({args})'
+            line = f'{line:<40} used {users[key]}x'
+            if key in self.timings:
+                line += f'  {self.timings[key] * 1e3:9.3f}ms'
+            if key in written:
+                line += '  -> ' + ', '.join(written[key])
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def _band(mid, sd, K):
+    return sd * K + mid
+
+NODE_KERNELS = {
+    'sma': kernels.sma,
+    'ema': lambda x, dt, smoothing: kernels.ema(x, dt=dt, smoothing=smoothing),
+    'std': kernels.rolling_std,
+    'sub': np.subtract,
+    'band': _band,
+    'gains': lambda x: kernels.gains_losses(x)[0],
+    'losses': lambda x: kernels.gains_losses(x)[1],
+    'wilder': kernels.wilder,
+    'rsi': kernels.rsi_from_averages,
+}
+
+
+def _average(pipe, src, dt, middle):
+    if middle == 'sma':
+        return pipe.node('sma', src, dt)
+    return pipe.node('ema', src, dt, 2.0)
+
+
+def _plan_sma(pipe, dt=2, cols=['close']):
+    for col in cols:
+        pipe.output(col + '_sma' + str(dt), pipe.node('sma', pipe.source(col), dt))
+
+
+def _plan_ema(pipe, dt=2, smoothing=2.0, cols=['close']):
+    dts = dt if isinstance(dt, (list, tuple)) else [dt]
+    for col in cols:
+        for w in dts:
+            pipe.output(col + '_ema' + str(w), pipe.node('ema', pipe.source(col), w, smoothing))
+
+
+def _plan_bollinger(pipe, dt=2, K=2.0, middle='sma'):
+    if middle not in ['sma', 'ema']:
+        raise Exception('Bollinger Bands require middle method to be in ["sma", "ema"]')
+    close = pipe.source('close')
+    mid = _average(pipe, close, dt, middle)
+    sd = pipe.node('std', close, dt)
+    pipe.output(f'close_{middle}{dt}', mid)
+    pipe.output('bb_upper', pipe.node('band', mid, sd, K))
+    pipe.output('bb_lower', pipe.node('band', mid, sd, -K))
+
+
+def _plan_rsi(pipe, dt=2, middle='ema'):
+    if middle not in ['sma', 'ema', 'wilder']:
+        raise Exception('RSI mean method must be either "sma", "ema" or "wilder"')
+    close = pipe.source('close')
+    up, down = pipe.node('gains', close), pipe.node('losses', close)
+    for w in (dt if isinstance(dt, (list, tuple)) else [dt]):
+        if middle == 'wilder':
+            avg_up, avg_down = pipe.node('wilder', up, w), pipe.node('wilder', down, w)
+        else:
+            avg_up, avg_down = _average(pipe, up, w, middle), _average(pipe, down, w, middle)
+        pipe.output(f'rsi{w}', pipe.node('rsi', avg_up, avg_down))
+
+
+def _plan_macd(pipe, a=12, b=26, c=9, middle='ema'):
+    if middle not in ['ema', 'sma']:
+        raise Exception("MA method 'middle' must be in ['sma', 'ema']")
+    close = pipe.source('close')
+    fast, slow = _average(pipe, close, a, middle), _average(pipe, close, b, middle)
+    pipe.output(f'close_{middle}{a}', fast)
+    pipe.output(f'close_{middle}{b}', slow)
+    macd = pipe.node('sub', fast, slow)
+    pipe.output('macd', macd)
+    signal = _average(pipe, macd, c, middle)
+    pipe.output(f'macd_{middle}{c}', signal)
+    pipe.output('macd_signal', signal)
+    pipe.output('macd_hist', pipe.node('sub', macd, signal))
+
+
+INDICATORS = {
+    'add_sma': _plan_sma,
+    'add_ema': _plan_ema,
+    'add_bollinger': _plan_bollinger,
+    'add_rsi': _plan_rsi,
+    'add_macd': _plan_macd,
+}
+
+
+def plan_treatments(treatments, treatment_args):
+    '''
+    Fuses every run of consecutive indicator treatments into a single
+    IndicatorPipeline, leaving other treatments in place.
+    :param treatments: list of treatment functions
+    :param treatment_args: list of kwargs dicts (or None) for the treatments
+    :return: (treatments, treatment_args) lists of the planned chain
+    '''
+    planned, planned_args = [], []
+    for treatment, args in zip(treatments, treatment_args):
+        name = getattr(treatment, '__name__', None)
+        if name in INDICATORS and getattr(utils, name, None) is treatment:
+            if not planned or not isinstance(planned[-1], IndicatorPipeline):
+                planned.append(IndicatorPipeline())
+                planned_args.append(None)
+            planned[-1].add(treatment, **(args or {}))
+        else:
+            planned.append(treatment)
+            planned_args.append(args)
+    return planned, planned_args
@@ -1,36 +1,131 @@
+import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
-from matplotlib.collections import PatchCollection
-from matplotlib.patches import Rectangle
-from matplotlib.lines import Line2D
-from datetime import timedelta, datetime
+import matplotlib.dates as mdates
+from matplotlib.collections import PolyCollection, LineCollection
+from matplotlib.colors import to_rgba
 
 DEFAULT_STYLE = {
     'downcolor': 'r',
-    'upcolor': 'g'
+    'upcolor': 'g',
+    'alpha': 0.5,
+    'width': 0.75,          # body width as a fraction of the candle spacing
+    'pixels_per_candle': 3, # level of detail: candles are merged below this width on screen
 }
 
-def candlestick(ohlc, ax=None, style={}):
+
+def aggregate_ohlc(t, o, h, l, c, k):
+    '''
+    Merges every `k` consecutive candles into one.
+    :return: (t, o, h, l, c) arrays of the merged candles; t is the time of
+    the first candle of each group
+    '''
+    if k <= 1:
+        return t, o, h, l, c
+    first = np.arange(0, len(t), k)
+    last = np.append(first[1:], len(t)) - 1
+    return t[first], o[first], np.maximum.reduceat(h, first), np.minimum.reduceat(l, first), c[last]
+
+
+def candle_geometry(t, o, h, l, c, dt, width=0.75):
+    '''
+    :return: (bodies, wicks, up) where bodies are the (n, 4, 2) vertices of
+    the body rectangles, wicks the (n, 2, 2) segments from low to high, and
+    up a boolean array of the candles closing at or above their open
+    '''
+    half = dt * width * 0.5
+    bodies = np.empty((len(t), 4, 2))
+    bodies[:, [0, 3], 0] = (t - half)[:, None]
+    bodies[:, [1, 2], 0] = (t + half)[:, None]
+    bodies[:, [0, 1], 1] = c[:, None]
+    bodies[:, [2, 3], 1] = o[:, None]
+    wicks = np.empty((len(t), 2, 2))
+    wicks[:, :, 0] = t[:, None]
+    wicks[:, 0, 1] = l
+    wicks[:, 1, 1] = h
+    return bodies, wicks, c >= o
+
+
+class Candlestick:
+    '''
+    Candlestick chart drawn as one PolyCollection of bodies and one
+    LineCollection of wicks. When more candles are in view than the axes
+    has room for at `pixels_per_candle`, consecutive candles are merged
+    into OHLC groups; this is redone whenever the x limits change, so
+    zooming in brings back the full detail.
+    '''
+    def __init__(self, ohlc, ax=None, style={}, lod=True):
+        '''
+        :param ohlc: Dataset with time and OHLC columns, sorted by time
+        :param ax: Matplotlib axes
+        :param style: Style modifications to DEFAULT_STYLE
+        :param lod: merge candles to the resolution of the axes
+        '''
+        if not all([n in ohlc.columns for n in ['open', 'high', 'low', 'close']]):
+            raise Exception("OHLC argument must have OHLC columns.")
+        self.ax = ax if ax else plt.gca()
+        self.style = {**DEFAULT_STYLE, **style}
+        self.lod = lod
+
+        time = ohlc['time']
+        self.dates = not pd.api.types.is_numeric_dtype(time)
+        self.t = mdates.date2num(pd.to_datetime(time).to_numpy()) if self.dates else time.to_numpy(dtype=np.float64)
+        self.o, self.h, self.l, self.c = [ohlc[f].to_numpy(dtype=np.float64) for f in ['open', 'high', 'low', 'close']]
+        self.dt = self.t[1] - self.t[0] if len(self.t) > 1 else 1.0
+        self.k = 1  # candles merged into each drawn one
+
+        alpha = self.style['alpha']
+        self.colors = np.array([to_rgba(self.style['downcolor'], alpha), to_rgba(self.style['upcolor'], alpha)])
+        self.bodies = PolyCollection([], edgecolors='none')
+        self.wicks = LineCollection([])
+        self.ax.add_collection(self.bodies)
+        self.ax.add_collection(self.wicks)
+        if self.dates:
+            self.ax.xaxis_date()
+
+        if len(self.t):
+            self.update(self.t[0] - self.dt, self.t[-1] + self.dt)
+            self.ax.update_datalim([(self.t[0] - self.dt, np.nanmin(self.l)), (self.t[-1] + self.dt, np.nanmax(self.h))])
+            self.ax.autoscale_view()
+        self._cid = self.ax.callbacks.connect('xlim_changed', lambda ax: self.update(*ax.get_xlim()))
+
+    def update(self, x0, x1):
+        '''
+        Redraws the candles between x0 and x1 (plus one either side).
+        '''
+        i0 = max(np.searchsorted(self.t, x0) - 1, 0)
+        i1 = min(np.searchsorted(self.t, x1, side='right') + 1, len(self.t))
+        k = 1
+        if self.lod:
+            pixels = self.ax.get_window_extent().width
+            room = max(int(pixels / self.style['pixels_per_candle']), 1)
+            k = max(-(-(i1 - i0) // room), 1)
+        if k > 1:
+            # align the groups globally so panning does not reshuffle them
+            i0 -= i0 % k
+        t, o, h, l, c = aggregate_ohlc(*[x[i0:i1] for x in [self.t, self.o, self.h, self.l, self.c]], k)
+        self.k = k
+        # a merged candle is centred on the span of the candles it stands for
+        bodies, wicks, up = candle_geometry(t + (k - 1) * self.dt * 0.5, o, h, l, c, self.dt * k, self.style['width'])
+        colors = self.colors[up.astype(np.intp)]
+        self.bodies.set_verts(bodies)
+        self.bodies.set_facecolor(colors)
+        self.wicks.set_segments(wicks)
+        self.wicks.set_color(colors)
+
+    def remove(self):
+        self.ax.callbacks.disconnect(self._cid)
+        self.bodies.remove()
+        self.wicks.remove()
+
+
+def candlestick(ohlc, ax=None, style={}, lod=True):
     '''
     Create a candlestick plot from the provided dataset
     :param ohlc: Dataset with OHLC columns
     :param ax: Matplotlib axes
     :param style: Style modifications
+    :param lod: merge candles down to the resolution of the axes, again on every zoom
+    :return: Candlestick
     '''
-    if not ax:
-        ax = plt.gca()
-    if not all([n in ohlc.columns for n in ['open', 'high', 'low', 'close']]):
-        raise Exception("OHLC argument must have OHLC columns.")
-    for s in style:
-        DEFAULT_STYLE[s] = style[s]
-    dt = ohlc.loc[1,'time'] - ohlc.loc[0,'time']
-    w, sw = (0.75, 0.125)
-    for i in range(len(ohlc)):
-        o, h, l, c = ohlc.loc[i,'open'], ohlc.loc[i,'high'], ohlc.loc[i,'low'], ohlc.loc[i,'close']
-        t = ohlc.loc[i,'time']
-        down = c < o
-        color = DEFAULT_STYLE['upcolor'] if not down else DEFAULT_STYLE['downcolor']
-        candle = Rectangle((t - dt*w*0.5, c), w*dt, o-c, facecolor=color, alpha=0.5, edgecolor='None')
-        wick = Line2D([t, t], [l, h], marker='None', color=color, alpha=0.5)
-
-        ax.add_patch(candle)
-        ax.add_line(wick)
+    return Candlestick(ohlc, ax=ax, style=style, lod=lod)
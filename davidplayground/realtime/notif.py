@@ -0,0 +1,307 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import namedtuple, deque
+
+import numpy as np
+
+from davidplayground import streaming
+
+# `created` is the perf_counter time of `Notifier.notify`, for latency accounting
+Notification = namedtuple('Notification', ['channel', 'kind', 'message', 'payload', 'time', 'created'])
+
+
+class Sink:
+    '''
+    Superclass of the notification sinks. `send` gets the notifications a
+    channel coalesced into one delivery, oldest first. Sinks doing blocking
+    IO implement `deliver` instead, which runs on a thread.
+    '''
+    async def send(self, channel, batch):
+        await asyncio.to_thread(self.deliver, channel, batch)
+
+    def deliver(self, channel, batch):
+        '''
+        Blocking delivery of a batch; sinks that do not override `send`
+        must implement it.
+        '''
+        raise Exception(f'{type(self).__name__} must implement send() or deliver()')
+
+    def close(self):
+        pass
+
+
+def format_batch(channel, batch):
+    '''
+    One line per delivery: the latest message, and how many it stands for.
+    '''
+    line = f'[{channel}] {batch[-1].message}'
+    return line if len(batch) == 1 else f'{line} (+{len(batch) - 1} more)'
+
+
+class StdoutSink(Sink):
+    async def send(self, channel, batch):
+        print(format_batch(channel, batch), file=sys.stdout, flush=True)
+
+
+class FileSink(Sink):
+    '''
+    Appends every notification to a file as a json line.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a')
+
+    def deliver(self, channel, batch):
+        for n in batch:
+            self.file.write(json.dumps({'channel': n.channel, 'kind': n.kind, 'message': n.message,
+                                        'time': n.time, **n.payload}, default=str) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class WebhookSink(Sink):
+    '''
+    Posts one json body per delivery to a webhook. Without a `post`
+    callable (url, body) the bodies are only kept in `posted`, so nothing
+    leaves the machine.
+    '''
+    def __init__(self, url, post=None):
+        self.url = url
+        self.post = post
+        self.posted = []
+
+    def deliver(self, channel, batch):
+        body = {'channel': channel, 'text': format_batch(channel, batch), 'count': len(batch),
+                'notifications': [dict(n.payload, kind=n.kind, message=n.message, time=n.time) for n in batch]}
+        if self.post is None:
+            self.posted.append(body)
+        else:
+            self.post(self.url, body)
+
+
+class MemorySink(Sink):
+    '''
+    Local stand-in sink keeping every delivery in `deliveries`, with an
+    optional artificial `delay` in seconds to play a slow sink.
+    '''
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.deliveries = []
+
+    async def send(self, channel, batch):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.deliveries.append((channel, list(batch)))
+
+
+class Notifier:
+    '''
+    Non-blocking fan-out of trade signals, fills and alerts to sinks.
+
+    `notify` only hands the notification to an event loop running on a
+    background thread, so it is safe to call from the trading loop or any
+    thread. There, notifications are grouped by channel: the ones arriving
+    within `coalesce` seconds of each other go out as one delivery, and each
+    channel delivers at most `rate` times per second (bursts of `burst`)
+    and one delivery at a time, with whatever arrives meanwhile coalesced
+    into the next one. A pool of `workers` tasks sends the deliveries to
+    every sink.
+
+        notifier = Notifier([StdoutSink(), FileSink('notifications.jsonl')]).start()
+        notifier.notify('BTC-USD', 'RSI crossed above 70', kind='alert', rsi=71.2)
+        notifier.stats()    # queue depth, delivery latency, drops
+        notifier.close()
+    '''
+    def __init__(self, sinks, workers=2, maxsize=10000, coalesce=0.05, rate=1.0, burst=3):
+        '''
+        :param sinks: list of Sink
+        :param workers: number of delivery tasks
+        :param maxsize: most notifications waiting, newer ones are dropped past it
+        :param coalesce: seconds a channel waits for more notifications before delivering
+        :param rate: deliveries per second per channel, None for no limit
+        :param burst: deliveries a channel may make back to back
+        '''
+        self.sinks = sinks
+        self.workers = workers
+        self.maxsize = maxsize
+        self.coalesce = coalesce
+        self.rate = rate
+        self.burst = burst
+
+        self.loop = None
+        self.thread = None
+        self.pending = {}   # notifications waiting to be delivered, by channel
+        self.tokens = {}    # channel -> (tokens, perf_counter time they were counted)
+        self.sending = set()    # channels with a delivery in flight
+        self.deliveries = None
+        self.waiting = 0    # notified but not delivered yet
+        self.dropped = 0
+        self.delivered = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=100000)   # seconds from notify to the last sink done
+        self._lock = threading.Lock()
+
+    def start(self):
+        '''
+        Starts the event loop thread.
+        :return: self
+        '''
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), name='notifier', daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.deliveries = asyncio.Queue()
+        tasks = [self.loop.create_task(self._worker()) for _ in range(self.workers)]
+        ready.set()
+        self.loop.run_forever()
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+
+    def notify(self, channel, message, kind='alert', **payload):
+        '''
+        Queues a notification and returns at once.
+        :param channel: coalescing and rate limiting key, such as a product
+        :param kind: 'signal', 'fill' or 'alert'
+        :return: False if the notification was dropped
+        '''
+        with self._lock:
+            if self.loop is None or self.waiting >= self.maxsize:
+                self.dropped += 1
+                return False
+            self.waiting += 1
+        n = Notification(channel, kind, message, payload, time.time(), time.perf_counter())
+        self.loop.call_soon_threadsafe(self._add, n)
+        return True
+
+    def _add(self, n):
+        batch = self.pending.get(n.channel)
+        if batch is not None:
+            batch.append(n)
+            return
+        self.pending[n.channel] = [n]
+        self.loop.call_later(self.coalesce, self._flush, n.channel)
+
+    def _flush(self, channel):
+        if channel in self.sending:
+            # one delivery per channel at a time keeps them in order
+            self.loop.call_later(self.coalesce, self._flush, channel)
+            return
+        if self.rate is not None:
+            now = time.perf_counter()
+            tokens, then = self.tokens.get(channel, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - then) * self.rate)
+            if tokens < 1.0:
+                # keep coalescing until the channel may deliver again
+                self.tokens[channel] = (tokens, now)
+                self.loop.call_later((1.0 - tokens) / self.rate, self._flush, channel)
+                return
+            self.tokens[channel] = (tokens - 1.0, now)
+        self.sending.add(channel)
+        self.deliveries.put_nowait((channel, self.pending.pop(channel)))
+
+    async def _worker(self):
+        while True:
+            channel, batch = await self.deliveries.get()
+            results = await asyncio.gather(*[sink.send(channel, batch) for sink in self.sinks],
+                                           return_exceptions=True)
+            done = time.perf_counter()
+            self.sending.discard(channel)
+            with self._lock:
+                self.errors += sum(isinstance(r, Exception) for r in results)
+                self.latencies.extend(done - n.created for n in batch)
+                self.batches += 1
+                self.delivered += len(batch)
+                self.waiting -= len(batch)
+
+    def depth(self):
+        '''
+        :return: number of notifications waiting to be delivered
+        '''
+        return self.waiting
+
+    def stats(self):
+        '''
+        :return: dict of queue depth, counts and delivery latency
+        percentiles in ms
+        '''
+        with self._lock:
+            lat = np.array(self.latencies) * 1e3
+        p50, p99, worst = np.percentile(lat, [50, 99, 100]) if len(lat) else (np.nan, np.nan, np.nan)
+        return dict(depth=self.waiting, delivered=self.delivered, batches=self.batches, dropped=self.dropped,
+                    errors=self.errors, p50_ms=p50, p99_ms=p99, max_ms=worst)
+
+    def flush(self, timeout=None):
+        '''
+        Waits until everything notified so far is delivered.
+        :return: True if it was before the timeout
+        '''
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.waiting:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def close(self, timeout=10.0):
+        '''
+        Delivers what is waiting, then stops the thread and closes the sinks.
+        '''
+        if self.loop is None:
+            return
+        self.flush(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop = None
+        for sink in self.sinks:
+            sink.close()
+
+
+class ThresholdAlerts:
+    '''
+    RealtimeFeed subscriber raising alerts when the RSI crosses below
+    `oversold` or above `overbought`, and when the close breaks out of the
+    Bollinger bands. Alerts fire on the crossing only, not on every bar
+    beyond it.
+    '''
+    def __init__(self, notifier, channel, rsi=14, oversold=30.0, overbought=70.0, dt=20, K=2.0):
+        self.notifier = notifier
+        self.channel = channel
+        self.rsi = streaming.RSI(dt=rsi, middle='wilder')
+        self.bands = streaming.Bollinger(dt=dt, K=K)
+        self.oversold = oversold
+        self.overbought = overbought
+        self.zone = 0   # -1 oversold, 1 overbought
+        self.band = 0   # -1 below the lower band, 1 above the upper band
+
+    def __call__(self, bar):
+        rsi = self.rsi.update(bar)
+        bands = self.bands.update(bar)
+        close = bar['close']
+        zone = -1 if rsi < self.oversold else (1 if rsi > self.overbought else 0)
+        if zone != self.zone and zone != 0:
+            level = self.oversold if zone < 0 else self.overbought
+            self.notifier.notify(self.channel, f'RSI crossed {"below" if zone < 0 else "above"} {level:g}: {rsi:.1f}',
+                                 kind='alert', indicator='rsi', value=rsi, close=close, bar_time=bar['time'])
+        self.zone = zone
+        band = -1 if close < bands['bb_lower'] else (1 if close > bands['bb_upper'] else 0)
+        if band != self.band and band != 0:
+            edge = bands['bb_lower'] if band < 0 else bands['bb_upper']
+            self.notifier.notify(self.channel,
+                                 f'close {close:.2f} broke {"below the lower" if band < 0 else "above the upper"} '
+                                 f'Bollinger band {edge:.2f}',
+                                 kind='alert', indicator='bollinger', value=edge, close=close, bar_time=bar['time'])
+        self.band = band
+        return zone or band or None
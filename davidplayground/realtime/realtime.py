@@ -0,0 +1,297 @@
+import asyncio
+import math
+import time
+from collections import namedtuple, deque
+
+import numpy as np
+import pandas as pd
+
+BAR_FIELDS = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+# a trade (or ticker update) of the stream; `received` is the perf_counter
+# time it reached this process, for latency accounting
+Tick = namedtuple('Tick', ['time', 'price', 'size', 'received'])
+
+
+class BarBuffer:
+    '''
+    Ring buffer of the last `capacity` OHLCV bars in preallocated arrays:
+    int64 epoch seconds for time and float64 for the rest.
+    '''
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.columns = {f: np.zeros(capacity, dtype=np.int64 if f == 'time' else np.float64) for f in BAR_FIELDS}
+        self.count = 0 # bars appended so far, including overwritten ones
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, bar):
+        i = self.count % self.capacity
+        for f in BAR_FIELDS:
+            self.columns[f][i] = bar[f]
+        self.count += 1
+
+    def last(self, n=None):
+        '''
+        The last `n` bars (all that are buffered by default), oldest first.
+        :return: DataFrame with the bar fields as columns
+        '''
+        n = len(self) if n is None else min(n, len(self))
+        idx = np.arange(self.count - n, self.count) % self.capacity
+        return pd.DataFrame({f: col[idx] for f, col in self.columns.items()})
+
+
+class BarAggregator:
+    '''
+    Aggregates ticks into OHLCV bars of `granularity` seconds, aligned to
+    multiples of the granularity. A bar is complete once a tick of a later
+    bar arrives (or on `flush`).
+    '''
+    def __init__(self, granularity=60):
+        self.granularity = granularity
+        self.bar = None
+
+    def add(self, tick):
+        '''
+        :param tick: Tick
+        :return: the bar completed by this tick, or None
+        '''
+        start = int(tick.time) // self.granularity * self.granularity
+        done = None
+        if self.bar is not None and start != self.bar['time']:
+            if start < self.bar['time']:
+                return None # late tick of an already closed bar
+            done = self.bar
+            self.bar = None
+        if self.bar is None:
+            self.bar = dict(time=start, open=tick.price, high=tick.price, low=tick.price,
+                            close=tick.price, volume=tick.size)
+        else:
+            bar = self.bar
+            bar['high'] = max(bar['high'], tick.price)
+            bar['low'] = min(bar['low'], tick.price)
+            bar['close'] = tick.price
+            bar['volume'] += tick.size
+        return done
+
+    def flush(self):
+        '''
+        :return: the bar in progress, or None
+        '''
+        done, self.bar = self.bar, None
+        return done
+
+
+class ReplayTransport:
+    '''
+    Local transport playing back archived candles as ticks, `speed` times
+    faster than real time (None for as fast as possible). Each candle
+    becomes open, high and low (in the order a candle moving that way
+    would visit them) and close ticks spread over its span, with the volume
+    split evenly between them.
+    '''
+    def __init__(self, candles, speed=60.0, granularity=None):
+        '''
+        :param candles: DataFrame with time, open, high, low, close and volume
+        columns, such as CandleArchive.slice(...).to_frame(unit='s'); time in
+        epoch seconds or datetimes
+        :param speed: replay speed relative to real time, None for no waiting
+        :param granularity: seconds per candle, inferred from the times if None
+        '''
+        t = candles['time']
+        if not pd.api.types.is_numeric_dtype(t):
+            t = pd.to_datetime(t).astype('datetime64[ns]').astype(np.int64) // 10**9
+        order = np.argsort(t.to_numpy(), kind='stable')
+        self.time = t.to_numpy(dtype=np.int64)[order]
+        self.ohlcv = np.column_stack([candles[f].to_numpy(dtype=np.float64)[order]
+                                      for f in ['open', 'high', 'low', 'close', 'volume']])
+        if granularity is None:
+            granularity = int(np.median(np.diff(self.time))) if len(self.time) > 1 else 60
+        self.granularity = granularity
+        self.speed = speed
+
+    async def __aiter__(self):
+        step = self.granularity / 4
+        wall0, t0 = time.perf_counter(), (self.time[0] if len(self.time) else 0)
+        for t, (o, h, l, c, v) in zip(self.time.tolist(), self.ohlcv.tolist()):
+            prices = (o, l, h, c) if c >= o else (o, h, l, c)
+            for k, price in enumerate(prices):
+                at = t + k * step
+                if self.speed:
+                    delay = wall0 + (at - t0) / self.speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                yield Tick(at, price, v / 4, time.perf_counter())
+            if not self.speed:
+                await asyncio.sleep(0) # let the subscribers run
+
+
+class CbproTransport:
+    '''
+    Live transport: matches of a product from the cbpro websocket feed. The
+    websocket client runs on its own thread and hands the ticks to the event
+    loop.
+    '''
+    def __init__(self, product='BTC-USD', url='wss://ws-feed.pro.coinbase.com'):
+        self.product = product
+        self.url = url
+
+    async def __aiter__(self):
+        import cbpro
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        class Client(cbpro.WebsocketClient):
+            def on_message(client, msg):
+                if msg.get('type') == 'match':
+                    t = pd.Timestamp(msg['time']).value / 1e9
+                    tick = Tick(t, float(msg['price']), float(msg['size']), time.perf_counter())
+                    loop.call_soon_threadsafe(queue.put_nowait, tick)
+
+        client = Client(url=self.url, products=[self.product], channels=['matches'])
+        client.start()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            client.close()
+
+
+class IndicatorSubscriber:
+    '''
+    Subscriber keeping streaming indicators (davidplayground.streaming) up
+    to date with the completed bars.
+    '''
+    def __init__(self, indicators):
+        '''
+        :param indicators: dict of name to StreamingIndicator
+        '''
+        self.indicators = indicators
+        self.values = {name: None for name in indicators}
+
+    def __call__(self, bar):
+        for name, indicator in self.indicators.items():
+            self.values[name] = indicator.update(bar)
+        return self.values
+
+
+class Subscription:
+    '''
+    A subscriber with its own queue and task, so a slow one never holds up
+    the feed or the other subscribers. When its queue is full the oldest
+    bar is dropped. A callback raising on a bar is counted in `errors`, with
+    the last exception kept, and the subscriber moves on to the next bar.
+    '''
+    def __init__(self, callback, name, maxsize):
+        self.callback = callback
+        self.name = name
+        self.queue = asyncio.Queue(maxsize)
+        self.latencies = deque(maxlen=100000) # seconds from the tick completing a bar to the callback returning
+        self.handled = 0
+        self.results = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+
+    def put(self, bar, received):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.dropped += 1
+        self.queue.put_nowait((bar, received))
+
+    async def run(self):
+        while True:
+            bar, received = await self.queue.get()
+            try:
+                result = self.callback(bar)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                self.latencies.append(time.perf_counter() - received)
+                self.handled += 1
+                if result is not None:
+                    self.results += 1
+            except Exception as err:
+                self.errors += 1
+                self.last_error = err
+            finally:
+                self.queue.task_done()
+
+
+class RealtimeFeed:
+    '''
+    Consumes a tick stream from a transport, aggregates it into OHLCV bars
+    kept in a ring buffer and pushes every completed bar to the subscribed
+    strategies and indicator updaters:
+
+        feed = RealtimeFeed(ReplayTransport(archive.slice().to_frame(unit='s'), speed=600), granularity=300)
+        feed.subscribe(IndicatorSubscriber({'rsi14': streaming.RSI(dt=14)}), name='rsi')
+        feed.subscribe(strategy.on_bar, name='strategy')
+        asyncio.run(feed.run())
+        feed.latency()     # tick -> signal p50/p99 per subscriber
+
+    Subscribers are callables (or coroutine functions) of the bar dict.
+    '''
+    def __init__(self, transport, granularity=60, capacity=10000, queue_size=1000):
+        self.transport = transport
+        self.aggregator = BarAggregator(granularity)
+        self.bars = BarBuffer(capacity)
+        self.queue_size = queue_size
+        self.subscriptions = []
+        self.ticks = 0
+        self.elapsed = 0.0
+
+    def subscribe(self, callback, name=None):
+        subscription = Subscription(callback, name or getattr(callback, '__name__', repr(callback)), self.queue_size)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def _publish(self, bar, received):
+        self.bars.append(bar)
+        for subscription in self.subscriptions:
+            subscription.put(bar, received)
+
+    async def run(self, max_ticks=None):
+        '''
+        Runs the feed until the transport ends (or `max_ticks` ticks), then
+        publishes the bar in progress and waits for the subscribers to catch
+        up.
+        '''
+        tasks = [asyncio.create_task(s.run()) for s in self.subscriptions]
+        t0 = time.perf_counter()
+        try:
+            last = None
+            async for tick in self.transport:
+                self.ticks += 1
+                last = tick
+                bar = self.aggregator.add(tick)
+                if bar is not None:
+                    self._publish(bar, tick.received)
+                if max_ticks is not None and self.ticks >= max_ticks:
+                    break
+            bar = self.aggregator.flush()
+            if bar is not None:
+                self._publish(bar, last.received)
+            await asyncio.gather(*[s.queue.join() for s in self.subscriptions])
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.elapsed = time.perf_counter() - t0
+
+    def latency(self):
+        '''
+        :return: DataFrame of tick -> subscriber latency percentiles in ms
+        (over the last 100000 bars), bars handled, bars dropped, and failed callbacks with the last error
+        per subscriber
+        '''
+        rows = {}
+        for s in self.subscriptions:
+            lat = np.array(s.latencies) * 1e3
+            p50, p99 = np.percentile(lat, [50, 99]) if len(lat) else (math.nan, math.nan)
+            rows[s.name] = dict(bars=s.handled, dropped=s.dropped, errors=s.errors,
+                                last_error=repr(s.last_error) if s.last_error is not None else None,
+                                p50_ms=p50, p99_ms=p99)
+        return pd.DataFrame.from_dict(rows, orient='index')
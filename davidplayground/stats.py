@@ -0,0 +1,229 @@
+import math
+
+import numpy as np
+
+
+class TradeStats:
+    '''
+    Online trade statistics, O(1) per update whatever the history:
+
+        stats = TradeStats(periods_per_year=365 * 24, prior_win_rate=0.3, prior_payoff=3.0)
+        stats.add_value(portfolio_value)    # every bar: Sharpe, Sortino, drawdown
+        stats.add_trade(pnl)                # every closed trade: win rate, payoff, Kelly
+        stats.kelly()
+
+    Sharpe and Sortino are of the per-bar returns of the values (Sortino
+    against a target return of 0), annualized when `periods_per_year` is
+    given. With priors, the win rate and payoff ratio start at them and move
+    to the observed ones as trades add up, as if `prior_trades` trades had
+    been seen already.
+    '''
+    def __init__(self, periods_per_year=None, prior_win_rate=None, prior_payoff=None, prior_trades=10):
+        '''
+        :param periods_per_year: bars per year, to annualize Sharpe and Sortino
+        :param prior_win_rate: win rate to assume before any trade
+        :param prior_payoff: average win over average loss to assume before any trade
+        :param prior_trades: weight of the priors, in trades
+        '''
+        self.periods_per_year = periods_per_year
+        self.prior_win_rate = prior_win_rate
+        self.prior_payoff = prior_payoff
+        self.prior_trades = prior_trades if prior_win_rate is not None or prior_payoff is not None else 0
+
+        self.trades = 0
+        self.wins = 0
+        self.losses = 0
+        self.sum_win = 0.0
+        self.sum_loss = 0.0
+
+        self.last = None    # last value
+        self.first = None
+        self.n = 0          # returns seen
+        self.mean = 0.0     # Welford mean and sum of squared deviations of the returns
+        self.m2 = 0.0
+        self.downside = 0.0 # sum of squared negative returns
+        self.peak = -math.inf
+        self.max_dd = 0.0
+
+    def add_trade(self, pnl):
+        '''
+        :param pnl: profit of a closed trade, fees included
+        '''
+        self.trades += 1
+        if pnl > 0:
+            self.wins += 1
+            self.sum_win += pnl
+        elif pnl < 0:
+            self.losses += 1
+            self.sum_loss -= pnl
+
+    def add_value(self, value):
+        '''
+        :param value: portfolio value at the next bar
+        '''
+        if self.last is not None and self.last != 0:
+            r = value / self.last - 1.0
+            self.n += 1
+            delta = r - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (r - self.mean)
+            if r < 0:
+                self.downside += r * r
+        if self.first is None:
+            self.first = value
+        self.last = value
+        if value > self.peak:
+            self.peak = value
+        elif self.peak > 0:
+            self.max_dd = max(self.max_dd, 1.0 - value / self.peak)
+
+    def win_rate(self):
+        k = self.prior_trades if self.prior_win_rate is not None else 0
+        if self.trades + k == 0:
+            return math.nan
+        return (self.wins + k * (self.prior_win_rate or 0.0)) / (self.trades + k)
+
+    def avg_win(self):
+        return self.sum_win / self.wins if self.wins else math.nan
+
+    def avg_loss(self):
+        return self.sum_loss / self.losses if self.losses else math.nan
+
+    def payoff(self):
+        '''
+        Average win over average loss.
+        '''
+        observed = self.avg_win() / self.avg_loss() if self.wins and self.losses else math.nan
+        if self.prior_payoff is None:
+            return observed
+        if observed != observed:
+            return self.prior_payoff
+        k = self.prior_trades
+        return (observed * self.trades + self.prior_payoff * k) / (self.trades + k)
+
+    def kelly(self):
+        '''
+        Kelly fraction W - (1 - W) / R of the win rate W and payoff ratio R.
+        '''
+        return kelly(self.win_rate(), self.payoff())
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else math.nan
+
+    def sharpe(self):
+        sd = self.std()
+        if not sd == sd or sd == 0:
+            return math.nan
+        return self.mean / sd * math.sqrt(self.periods_per_year or 1)
+
+    def sortino(self):
+        if not self.n or self.downside == 0:
+            return math.nan
+        return self.mean / math.sqrt(self.downside / self.n) * math.sqrt(self.periods_per_year or 1)
+
+    def max_drawdown(self):
+        return self.max_dd
+
+    def summary(self):
+        '''
+        :return: dict of every statistic
+        '''
+        return dict(trades=self.trades, win_rate=self.win_rate(), avg_win=self.avg_win(), avg_loss=self.avg_loss(),
+                    payoff=self.payoff(), kelly=self.kelly(),
+                    total_return=self.last / self.first - 1.0 if self.first else math.nan,
+                    sharpe=self.sharpe(), sortino=self.sortino(), max_drawdown=self.max_dd)
+
+
+def kelly(win_rate, payoff):
+    '''
+    Kelly fraction of a win rate and a payoff ratio, element-wise on arrays.
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return win_rate - (1.0 - win_rate) / payoff
+
+
+def _rows(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[None, :] if values.ndim == 1 else values
+
+
+def equity_stats(values, periods_per_year=None):
+    '''
+    Vectorized statistics of many equity curves at once, matching
+    TradeStats.add_value over each curve.
+    :param values: (runs, bars) array of portfolio values, NaN-padded at the
+    end for shorter runs; a single curve may be 1-d
+    :param periods_per_year: bars per year, to annualize Sharpe and Sortino
+    :return: dict of arrays with one entry per run: total_return, sharpe,
+    sortino and max_drawdown
+    '''
+    values = _rows(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = values[:, 1:] / values[:, :-1] - 1.0
+        n = np.sum(~np.isnan(r), axis=1)
+        mean = np.nansum(r, axis=1) / n
+        sd = np.sqrt(np.nansum((r - mean[:, None]) ** 2, axis=1) / (n - 1))
+        downside = np.sqrt(np.nansum(np.minimum(r, 0.0) ** 2, axis=1) / n)
+        scale = math.sqrt(periods_per_year or 1)
+        sharpe = np.where(sd > 0, mean / sd * scale, np.nan)
+        sortino = np.where(downside > 0, mean / downside * scale, np.nan)
+        peaks = np.fmax.accumulate(values, axis=1)
+        drawdown = np.nanmax(np.concatenate([np.zeros((len(values), 1)), 1.0 - values / peaks], axis=1), axis=1)
+        last = values[np.arange(len(values)), np.maximum(np.sum(~np.isnan(values), axis=1) - 1, 0)]
+        total = last / values[:, 0] - 1.0
+    return dict(total_return=total, sharpe=sharpe, sortino=sortino, max_drawdown=drawdown)
+
+
+def trade_stats(pnl, prior_win_rate=None, prior_payoff=None, prior_trades=10):
+    '''
+    Vectorized counterpart of TradeStats.add_trade over many runs.
+    :param pnl: (runs, trades) array of closed-trade profits, NaN-padded
+    :return: dict of arrays with one entry per run: trades, win_rate,
+    avg_win, avg_loss, payoff and kelly
+    '''
+    pnl = _rows(pnl)
+    trades = np.sum(~np.isnan(pnl), axis=1)
+    wins = np.sum(pnl > 0, axis=1)
+    losses = np.sum(pnl < 0, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_win = np.where(wins > 0, np.nansum(np.where(pnl > 0, pnl, 0.0), axis=1) / wins, np.nan)
+        avg_loss = np.where(losses > 0, -np.nansum(np.where(pnl < 0, pnl, 0.0), axis=1) / losses, np.nan)
+        k = prior_trades if prior_win_rate is not None else 0
+        win_rate = (wins + k * (prior_win_rate or 0.0)) / (trades + k)
+        payoff = avg_win / avg_loss
+        if prior_payoff is not None:
+            payoff = np.where(np.isnan(payoff), prior_payoff,
+                              (payoff * trades + prior_payoff * prior_trades) / (trades + prior_trades))
+    return dict(trades=trades, win_rate=win_rate, avg_win=avg_win, avg_loss=avg_loss, payoff=payoff,
+                kelly=kelly(win_rate, payoff))
+
+
+def closed_trades(trades, fee):
+    '''
+    Profits of the sells in a TradeHandler trade list, against the average
+    cost of the holdings; fees of both sides are included.
+    :param trades: list of trade dicts with action, amt and price
+    :param fee: trade fee of the handler
+    :return: float array with one profit per sell
+    '''
+    held, cost, pnl = 0.0, 0.0, []
+    for trade in trades:
+        if trade['action'] == 'buy':
+            held += trade['amt']
+            cost += trade['price'] * trade['amt'] * (1.0 + fee)
+        elif held > 0:
+            basis = cost * trade['amt'] / held
+            pnl.append(trade['price'] * trade['amt'] * (1.0 - fee) - basis)
+            held -= trade['amt']
+            cost -= basis
+    return np.array(pnl, dtype=np.float64)
+
+
+def pad(rows):
+    '''
+    Stacks 1-d arrays of different lengths into one NaN-padded 2-d array.
+    '''
+    out = np.full((len(rows), max((len(r) for r in rows), default=0)), np.nan)
+    for i, row in enumerate(rows):
+        out[i, :len(row)] = row
+    return out
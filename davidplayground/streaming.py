@@ -0,0 +1,335 @@
+import copy
+import math
+from collections import deque
+
+import numpy as np
+
+NAN = float('nan')
+
+
+def _div(a, b):
+    '''
+    Float division with numpy's IEEE results instead of ZeroDivisionError.
+    '''
+    if b == 0.0:
+        if a == 0.0 or a != a:
+            return NAN
+        return math.copysign(math.inf, a)
+    return a / b
+
+
+class StreamingIndicator:
+    '''
+    Superclass of the streaming indicators. Each keeps O(1) or O(window)
+    state so the cost of `update` does not depend on how much history came
+    before. A bar is a mapping with the fields of the indicator (a dict, a
+    DataFrame row, ...) or just the value for single-field indicators.
+    '''
+    fields = ('close',)
+
+    def update(self, bar):
+        '''
+        Feed in the next bar.
+        :param bar: mapping of field name to value, or a float
+        :return: the new value of the indicator
+        '''
+        if isinstance(bar, (int, float)):
+            return self._update(float(bar))
+        return self._update(*[float(bar[f]) for f in self.fields])
+
+    def seed(self, df):
+        '''
+        Brings the indicator up to date with a historical dataset.
+        :param df: DataFrame dataset with the fields of the indicator
+        :return: self
+        '''
+        columns = [df[f].to_numpy(dtype=np.float64, na_value=np.nan).tolist() for f in self.fields]
+        for values in zip(*columns):
+            self._update(*values)
+        return self
+
+    def checkpoint(self):
+        '''
+        :return: a copy of the state that `restore` can resume from
+        '''
+        return copy.deepcopy(self.__dict__)
+
+    def restore(self, state):
+        '''
+        Resumes from a checkpoint.
+        :param state: dict returned by `checkpoint`
+        :return: self
+        '''
+        self.__dict__.update(copy.deepcopy(state))
+        return self
+
+    def _update(self, *values):
+        '''
+        Adds one bar's values and returns the new indicator value;
+        subclasses must implement it.
+        '''
+        raise Exception(f'{type(self).__name__} must implement _update()')
+
+
+class EMA(StreamingIndicator):
+    '''
+    Exponential moving average with the semantics of `add_ema`: seeded with
+    the mean of the first `dt` values, NaN for the first `dt` bars, and NaN
+    inputs give NaN without advancing the average.
+    '''
+    def __init__(self, dt=2, smoothing=2.0, alpha=None, col='close'):
+        self.dt = dt
+        self.alpha = smoothing / (1.0 + dt) if alpha is None else alpha
+        self.fields = (col,)
+        self.n = 0
+        self.head = []
+        self.ema = None
+        self.value = NAN
+
+    def _update(self, x):
+        self.n += 1
+        if self.n <= self.dt:
+            self.head.append(x)
+            if self.n == self.dt:
+                valid = [v for v in self.head if v == v]
+                self.ema = sum(valid) / len(valid) if valid else 0.0
+                self.head = None
+            self.value = NAN
+        elif x != x:
+            self.value = NAN
+        else:
+            self.ema = x*self.alpha + self.ema*(1 - self.alpha)
+            self.value = self.ema
+        return self.value
+
+
+class Wilder(StreamingIndicator):
+    '''
+    Wilder's smoothing of a diff-padded series (the first value is skipped),
+    seeded with the mean of the next `dt` values, as in kernels.wilder.
+    '''
+    def __init__(self, dt=14, col='close'):
+        self.fields = (col,)
+        self.started = False
+        self.ema = EMA(dt=dt, alpha=1.0 / dt)
+        self.value = NAN
+
+    def _update(self, x):
+        if not self.started:
+            self.started = True
+            self.value = NAN
+            return self.value
+        self.value = self.ema._update(x)
+        if self.ema.n == self.ema.dt:
+            self.value = self.ema.ema
+        return self.value
+
+
+class SMA(StreamingIndicator):
+    '''
+    Simple moving average, NaN until the window is full or while it holds a
+    NaN. Keeps a compensated running sum, O(1) per bar.
+    '''
+    def __init__(self, dt=2, col='close'):
+        self.dt = dt
+        self.fields = (col,)
+        self.window = deque()
+        self.nans = 0
+        self.total = 0.0
+        self.comp = 0.0
+        self.value = NAN
+
+    def _add(self, x):
+        y = x - self.comp
+        t = self.total + y
+        self.comp = (t - self.total) - y
+        self.total = t
+
+    def _update(self, x):
+        self.window.append(x)
+        if x != x:
+            self.nans += 1
+        else:
+            self._add(x)
+        if len(self.window) > self.dt:
+            old = self.window.popleft()
+            if old != old:
+                self.nans -= 1
+            else:
+                self._add(-old)
+        if len(self.window) < self.dt or self.nans:
+            self.value = NAN
+        else:
+            self.value = self.total / self.dt
+        return self.value
+
+
+class RollingStd(StreamingIndicator):
+    '''
+    Rolling sample standard deviation over a ring buffer, O(window) per bar.
+    '''
+    def __init__(self, dt=2, col='close'):
+        self.dt = dt
+        self.fields = (col,)
+        self.buffer = np.full(dt, np.nan)
+        self.n = 0
+        self.value = NAN
+
+    def _update(self, x):
+        self.buffer[self.n % self.dt] = x
+        self.n += 1
+        if self.n < self.dt:
+            self.value = NAN
+        else:
+            self.value = float(self.buffer.std(ddof=1))
+        return self.value
+
+
+class Bollinger(StreamingIndicator):
+    '''
+    Bollinger bands around an SMA or EMA of the close, as `add_bollinger`.
+    `value` is a dict keyed by the column names the treatment writes.
+    '''
+    def __init__(self, dt=2, K=2.0, middle='sma'):
+        if middle not in ['sma', 'ema']:
+            raise Exception('Bollinger Bands require middle method to be in ["sma", "ema"]')
+        self.K = K
+        self.mid_name = f'close_{middle}{dt}'
+        self.middle = SMA(dt=dt) if middle == 'sma' else EMA(dt=dt, smoothing=2.0)
+        self.std = RollingStd(dt=dt)
+        self.value = {self.mid_name: NAN, 'bb_upper': NAN, 'bb_lower': NAN}
+
+    def _update(self, close):
+        mid = self.middle._update(close)
+        sd = self.std._update(close)
+        self.value = {self.mid_name: mid, 'bb_upper': sd * self.K + mid, 'bb_lower': -sd * self.K + mid}
+        return self.value
+
+
+class RSI(StreamingIndicator):
+    '''
+    Relative strength index with "sma", "ema" or "wilder" averaging of
+    gains and losses, as `add_rsi`.
+    '''
+    def __init__(self, dt=14, middle='ema'):
+        if middle not in ['sma', 'ema', 'wilder']:
+            raise Exception('RSI mean method must be either "sma", "ema" or "wilder"')
+        averages = {'sma': lambda: SMA(dt=dt), 'ema': lambda: EMA(dt=dt, smoothing=2.0),
+                    'wilder': lambda: Wilder(dt=dt)}
+        self.up = averages[middle]()
+        self.down = averages[middle]()
+        self.prev = None
+        self.value = NAN
+
+    def _update(self, close):
+        diff = 0.0 if self.prev is None else close - self.prev
+        self.prev = close
+        up = self.up._update(max(diff, 0.0) if diff == diff else NAN)
+        down = self.down._update(max(-diff, 0.0) if diff == diff else NAN)
+        rs = _div(up, down)
+        self.value = 100.0 - _div(100.0, 1.0 + rs) if rs == rs else NAN
+        return self.value
+
+
+class MACD(StreamingIndicator):
+    '''
+    Moving-average-convergence-divergence, as `add_macd`. `value` is a dict
+    with the macd, macd_signal and macd_hist columns.
+    '''
+    def __init__(self, a=12, b=26, c=9, middle='ema'):
+        if middle not in ['ema', 'sma']:
+            raise Exception("MA method 'middle' must be in ['sma', 'ema']")
+        average = (lambda dt: SMA(dt=dt)) if middle == 'sma' else (lambda dt: EMA(dt=dt, smoothing=2.0))
+        self.fast = average(a)
+        self.slow = average(b)
+        self.signal = average(c)
+        self.value = {'macd': NAN, 'macd_signal': NAN, 'macd_hist': NAN}
+
+    def _update(self, close):
+        macd = self.fast._update(close) - self.slow._update(close)
+        signal = self.signal._update(macd)
+        self.value = {'macd': macd, 'macd_signal': signal, 'macd_hist': macd - signal}
+        return self.value
+
+
+class WilliamsR(StreamingIndicator):
+    '''
+    Williams %R over the last `lookback` bars, with monotonic queues for the
+    rolling highest high and lowest low (amortized O(1) per bar).
+    '''
+    fields = ('high', 'low', 'close')
+
+    def __init__(self, lookback=14):
+        self.lookback = lookback
+        self.n = 0
+        self.highs = deque() # (index, high), highs decreasing
+        self.lows = deque() # (index, low), lows increasing
+        self.value = NAN
+
+    def _update(self, high, low, close):
+        i = self.n
+        self.n += 1
+        while self.highs and self.highs[-1][1] <= high:
+            self.highs.pop()
+        self.highs.append((i, high))
+        while self.lows and self.lows[-1][1] >= low:
+            self.lows.pop()
+        self.lows.append((i, low))
+        while self.highs[0][0] <= i - self.lookback:
+            self.highs.popleft()
+        while self.lows[0][0] <= i - self.lookback:
+            self.lows.popleft()
+        if self.n < self.lookback:
+            self.value = NAN
+        else:
+            hh, ll = self.highs[0][1], self.lows[0][1]
+            self.value = -100 * _div(hh - close, hh - ll)
+        return self.value
+
+
+class BOP(StreamingIndicator):
+    '''
+    Balance of power, the SMA of (close - open) / (high - low).
+    '''
+    fields = ('open', 'high', 'low', 'close')
+
+    def __init__(self, period=12):
+        self.sma = SMA(dt=period)
+        self.value = NAN
+
+    def _update(self, open, high, low, close):
+        self.value = self.sma._update(_div(close - open, high - low))
+        return self.value
+
+
+class ATR(StreamingIndicator):
+    '''
+    Average true range: Wilder's smoothing (alpha 1/period) of the true
+    range, seeded with the mean of the first `period` true ranges.
+    '''
+    fields = ('high', 'low', 'close')
+
+    def __init__(self, period=14):
+        self.period = period
+        self.alpha = 1.0 / period
+        self.prev_close = None
+        self.n = 0
+        self.total = 0.0
+        self.atr = NAN
+        self.value = NAN
+
+    def _update(self, high, low, close):
+        if self.prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.n += 1
+        if self.n < self.period:
+            self.total += tr
+        elif self.n == self.period:
+            self.atr = (self.total + tr) / self.period
+        else:
+            self.atr = tr*self.alpha + self.atr*(1 - self.alpha)
+        self.value = self.atr
+        return self.value
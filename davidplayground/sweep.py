@@ -0,0 +1,241 @@
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+from davidplayground.batch import to_shared, from_shared
+from davidplayground.datasets import WienerPaths, apply_treatments
+from davidplayground.pipeline import plan_treatments
+
+_WORKER_FRAMES = {} # datasets a worker has already copied out of shared memory
+
+
+def expand_grid(grid):
+    '''
+    Grid points of a parameter grid.
+    :param grid: dict of parameter name to list of values, or a list of
+    parameter dicts (taken as they are)
+    :return: list of parameter dicts
+    '''
+    if isinstance(grid, dict):
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    return [dict(params) for params in grid]
+
+
+def max_drawdown(values):
+    '''
+    Largest relative drop of a portfolio value curve from its running peak.
+    :param values: float array of portfolio values
+    :return: drawdown as a fraction, 0.0 for a curve that never drops
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return 0.0
+    peaks = np.maximum.accumulate(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.nanmax(np.r_[0.0, 1.0 - values / peaks]))
+
+
+def evaluate(strategy_cls, params, df, name, handler_kwargs):
+    '''
+    Backtests one grid point and keeps only its summary.
+    :return: dict of final_value, max_drawdown and trades
+    '''
+    strategy = strategy_cls(**params, **handler_kwargs)
+    curve = strategy.backtest(df, name)['value'].to_numpy()
+    return dict(final_value=float(curve[-1]) if len(curve) else strategy.portfolio_value(),
+                max_drawdown=max_drawdown(curve), trades=len(strategy.trades))
+
+
+def _run_chunk(key, shm_name, spec, strategy_cls, points, name, handler_kwargs):
+    '''
+    Worker side of ParameterSweep: evaluates a chunk of grid points on one
+    dataset, copying the dataset out of shared memory once per worker.
+    '''
+    if shm_name not in _WORKER_FRAMES:
+        _WORKER_FRAMES.clear()
+        _WORKER_FRAMES[shm_name] = from_shared(shm_name, spec)
+    df = _WORKER_FRAMES[shm_name]
+    return [(key, i, evaluate(strategy_cls, params, df, name, handler_kwargs)) for i, params in points]
+
+
+class ParameterSweep:
+    '''
+    Backtests a TradeHandler strategy over a grid of parameters. The
+    indicator treatments the grid points declare (TradeHandler.indicators)
+    are collected, planned together and computed once per dataset, then
+    every grid point trades against the same treated columns. Datasets are
+    cached, so a later sweep only computes the indicators that are new.
+
+    Grid points are spread over a process pool, and only a summary row per
+    grid point (final value, max drawdown, trade count) is kept:
+
+        sweep = ParameterSweep(EMACross, {'fast': [10, 30, 60], 'slow': [120, 240]}, workers=8)
+        table = sweep.run(W.iter_paths(100, hours=24*30, seed=0, raw=True), out='sweep.csv')
+    '''
+    def __init__(self, strategy_cls, grid, name='BTC', workers=4, chunk_size=8, max_datasets=None,
+                 **handler_kwargs):
+        '''
+        :param strategy_cls: TradeHandler subclass taking the grid parameters
+        as keyword arguments
+        :param grid: dict of parameter name to values, or list of parameter dicts
+        :param name: name of the coin traded
+        :param workers: number of worker processes, 0 to run in this process
+        :param chunk_size: number of grid points sent to a worker at once
+        :param max_datasets: most datasets in shared memory at once, twice the
+        workers if None; the next dataset is only loaded once one finishes
+        :param handler_kwargs: further arguments of every strategy, such as
+        initial_capital or trade_fee
+        '''
+        self.strategy_cls = strategy_cls
+        self.points = expand_grid(grid)
+        self.name = name
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_datasets = max_datasets or 2 * max(workers, 1)
+        self.handler_kwargs = handler_kwargs
+        self.frames = {} # dataset key -> treated dataset
+        self.computed = {} # dataset key -> keys of the indicator treatments applied
+        self.elapsed = {}
+
+    def prepare(self, key, df, cache=True):
+        '''
+        Treats a dataset with every indicator the grid needs that is not in
+        the cache yet.
+        :param key: dataset key
+        :param df: raw DataFrame dataset, used if the key is not cached
+        :param cache: whether to keep the treated dataset for later sweeps
+        :return: treated dataset
+        '''
+        needed = {}
+        for params in self.points:
+            for treatment, kwargs in self.strategy_cls(**params, **self.handler_kwargs).indicators():
+                needed.setdefault((treatment.__name__, repr(sorted((kwargs or {}).items()))), (treatment, kwargs))
+        done = self.computed.get(key, set()) if cache else set()
+        missing = [needed[k] for k in needed if k not in done]
+        if cache:
+            df = self.frames.get(key, df)
+        if missing:
+            df = apply_treatments(df.copy(), *plan_treatments(*zip(*missing)))
+        if cache:
+            self.frames[key] = df
+            self.computed[key] = done | set(needed)
+        return df
+
+    def iter_run(self, datasets):
+        '''
+        Evaluates every grid point on every dataset, yielding the summaries
+        as they finish.
+        :param datasets: DataFrame, iterable of DataFrames, or dict of key to
+        DataFrame (only keyed datasets are cached between sweeps). Path
+        batches (WienerPaths or their long-format frames) are treated as one
+        frame, then split into one dataset per path keyed by path_id (or by
+        (key, path_id) for keyed batches).
+        :return: generator of result dicts with the dataset key, the
+        parameters and the summary
+        '''
+        t0 = time.perf_counter()
+        if not self.workers:
+            for key, df in self._datasets(datasets):
+                for params in self.points:
+                    summary = evaluate(self.strategy_cls, params, df, self.name, self.handler_kwargs)
+                    yield dict(dataset=key, **params, **summary)
+            self.elapsed['run'] = time.perf_counter() - t0
+            return
+
+        shared = {} # shared memory name -> [block, chunks still running on it]
+        pending = {} # future -> shared memory name of its dataset
+        points = list(enumerate(self.points))
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for key, df in self._datasets(datasets):
+                    # stream what is done while the next datasets are prepared, and
+                    # wait for a dataset to finish before holding one more
+                    yield from self._finished([f for f in pending if f.done()], pending, shared)
+                    while len(shared) >= self.max_datasets:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from self._finished(done, pending, shared)
+                    shm, spec = to_shared(df)
+                    chunks = range(0, len(points), self.chunk_size)
+                    shared[shm.name] = [shm, len(chunks)]
+                    for i in chunks:
+                        future = pool.submit(_run_chunk, key, shm.name, spec, self.strategy_cls,
+                                             points[i:i + self.chunk_size], self.name, self.handler_kwargs)
+                        pending[future] = shm.name
+                    if not len(chunks):
+                        self._release(shared, shm.name)
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._finished(done, pending, shared)
+        finally:
+            for shm, _ in shared.values():
+                shm.close()
+                shm.unlink()
+        self.elapsed['run'] = time.perf_counter() - t0
+
+    def _finished(self, done, pending, shared):
+        '''
+        Yields the rows of finished chunks, unlinking the shared memory of
+        every dataset whose chunks have all finished.
+        '''
+        for future in done:
+            name = pending.pop(future)
+            rows = future.result()
+            shared[name][1] -= 1
+            if not shared[name][1]:
+                self._release(shared, name)
+            for key, i, summary in rows:
+                yield dict(dataset=key, **self.points[i], **summary)
+
+    def _release(self, shared, name):
+        shm, _ = shared.pop(name)
+        shm.close()
+        shm.unlink()
+
+    def run(self, datasets, out=None):
+        '''
+        Runs the sweep into a results table.
+        :param datasets: see `iter_run`
+        :param out: optional csv path the rows are appended to as they finish
+        :return: DataFrame with one row per dataset and grid point
+        '''
+        rows = []
+        f = writer = None
+        try:
+            for row in self.iter_run(datasets):
+                rows.append(row)
+                if out is not None:
+                    if writer is None:
+                        new = not os.path.exists(out)
+                        f = open(out, 'a', newline='')
+                        writer = csv.DictWriter(f, fieldnames=list(row))
+                        if new:
+                            writer.writeheader()
+                    writer.writerow(row)
+        finally:
+            if f is not None:
+                f.close()
+        return pd.DataFrame(rows)
+
+    def _datasets(self, datasets):
+        '''
+        Treated datasets of a sweep input, as (key, DataFrame).
+        '''
+        if isinstance(datasets, pd.DataFrame):
+            datasets = [datasets]
+        cache = isinstance(datasets, dict)
+        items = datasets.items() if cache else enumerate(datasets)
+        for key, df in items:
+            if isinstance(df, WienerPaths):
+                df = df.frame()
+            df = self.prepare(key, df, cache=cache)
+            if 'path_id' in df.columns:
+                for path_id, path in df.groupby('path_id', sort=False):
+                    yield ((key, int(path_id)) if cache else int(path_id)), path.reset_index(drop=True)
+            else:
+                yield key, df
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from davidplayground import instrument
+
 
 class TradeHandler:
     '''
@@ -15,6 +17,7 @@ class TradeHandler:
         self.prices = {'USD': 1.0} # "last known prices" used for valuing portfolio
         self.fee = trade_fee
         self.logic = logic
+        self.trades = [] # actions of the successful _buy/_sell calls, in order
 
     def portfolio_value(self):
         total = 0.0
@@ -30,9 +33,94 @@ class TradeHandler:
         :return: trades to be made by timestamp
         '''
         assert isinstance(df, pd.DataFrame)
+        self.wallets.setdefault(name, 0.0)
+
+        instr = instrument.current()
+        if instr is None:
+            for i, row in df.iterrows():
+                self.act(row, name)
+        else:
+            step = type(self).__name__ + '.act'
+            for i, row in df.iterrows():
+                with instr.section('step', step, rows=1):
+                    self.act(row, name)
+        return self.trades
+
+    def indicators(self):
+        '''
+        Indicator treatments the strategy reads, so runners such as
+        ParameterSweep can compute them once for many strategies.
+        :return: list of (treatment function, kwargs dict)
+        '''
+        return []
+
+    def targets(self, df, name):
+        '''
+        Vectorized counterpart of `act`: the amount of the coin to hold after
+        every bar of a dataset, NaN to leave the holdings as they are.
+        Subclasses must override it to use `backtest` without explicit
+        targets or orders.
+        :param df: DataFrame dataset
+        :param name: name of the coin
+        :return: float array with one target per row
+        '''
+        raise Exception(f'{type(self).__name__} must implement targets() to be backtested')
+
+    def backtest(self, df, name, targets=None, orders=None):
+        '''
+        High-throughput counterpart of `act_on`. Trades at the close of each
+        bar toward target holdings, either given or from `targets`, or places
+        the given orders. A bar with target t does what an `act` calling
+        `_buy(close, t - held)` or `_sell(close, held - t)` would do, with the
+        same affordability checks, fees and float arithmetic, so both paths
+        end in the same wallets and trades.
+        :param df: DataFrame dataset
+        :param name: name of the coin
+        :param targets: float array of holdings per bar, NaN to hold
+        :param orders: float array of amounts to buy (> 0) or sell (< 0) per
+        bar, in place of targets; a rejected order is not retried
+        :return: DataFrame of usd, coin holdings and portfolio value per bar
+        '''
+        assert isinstance(df, pd.DataFrame)
+        self.wallets.setdefault(name, 0.0)
+        price = df['close'].to_numpy(dtype=np.float64)
+        with instrument.section('step', type(self).__name__ + '.backtest', rows=len(price)):
+            if orders is None:
+                if targets is None:
+                    targets = self.targets(df, name)
+                fills = fill_targets(price, np.asarray(targets, dtype=np.float64),
+                                     self.wallets['USD'], self.wallets[name], self.fee)
+            else:
+                fills = fill_orders(price, np.asarray(orders, dtype=np.float64),
+                                    self.wallets['USD'], self.wallets[name], self.fee)
 
-        for i, row in df.iterrows():
-            self.act(row, name)
+        usd = np.full(len(price), self.wallets['USD'], dtype=np.float64)
+        held = np.full(len(price), self.wallets[name], dtype=np.float64)
+        if fills:
+            bars, amts, usd_after, held_after = (np.array(x) for x in zip(*fills))
+            # balances change at the fills and carry forward until the next one
+            last = np.full(len(price), -1)
+            last[bars] = np.arange(len(bars))
+            last = np.maximum.accumulate(last)
+            traded = last >= 0
+            usd[traded] = usd_after[last[traded]]
+            held[traded] = held_after[last[traded]]
+            for bar, amt in zip(bars.tolist(), amts.tolist()):
+                action = 'buy' if amt > 0 else 'sell'
+                self.trades.append(dict(action=action, amt=abs(amt), name=name, price=float(price[bar])))
+            self.wallets['USD'], self.wallets[name] = float(usd[-1]), float(held[-1])
+        if len(price):
+            self.prices[name] = float(price[-1])
+        # the sum of portfolio_value, in the same order
+        value = 0.0
+        for wallet in self.wallets:
+            if wallet == 'USD':
+                value = value + self.prices['USD'] * usd
+            elif wallet == name:
+                value = value + price * held
+            else:
+                value = value + self.prices[wallet] * self.wallets[wallet]
+        return pd.DataFrame({'usd': usd, name: held, 'value': value}, index=df.index)
 
     def act(self, row, name):
         '''
@@ -56,7 +144,8 @@ class TradeHandler:
             return False
         self.wallets[name] += amt
         self.wallets['USD'] -= price * amt * (1.0 + self.fee)
-        return dict(action='buy', amt=amt, name=name, price=price)
+        self.trades.append(dict(action='buy', amt=amt, name=name, price=price))
+        return self.trades[-1]
 
     def _sell(self, price, amt, name):
         '''
@@ -70,5 +159,85 @@ class TradeHandler:
             return False
         self.wallets['USD'] += price * amt * (1.0 - self.fee)
         self.wallets[name] -= amt
-        return dict(action='sell', amt=amt, name=name, price=price)
+        self.trades.append(dict(action='sell', amt=amt, name=name, price=price))
+        return self.trades[-1]
+
+
+def fill_orders(price, orders, usd, held, fee):
+    '''
+    Places every nonzero, non-NaN order at its bar with the rules of
+    TradeHandler._buy and _sell. Only bars with an order are visited.
+    :param price: float array of close prices
+    :param orders: float array of amounts to buy (> 0) or sell (< 0)
+    :param usd: USD balance before the first bar
+    :param held: coin holdings before the first bar
+    :param fee: trade fee
+    :return: list of (bar, signed amount, usd after, holdings after) fills
+    '''
+    fills = []
+    for i in np.flatnonzero((orders != 0) & ~np.isnan(orders)).tolist():
+        amt, p = float(orders[i]), float(price[i])
+        if amt > 0:
+            if p * amt * (1.0 + fee) > usd:
+                continue
+            held += amt
+            usd -= p * amt * (1.0 + fee)
+        else:
+            sell = -amt
+            if held < sell:
+                continue
+            usd += p * sell * (1.0 - fee)
+            held -= sell
+        fills.append((i, amt, usd, held))
+    return fills
+
+
+def fill_targets(price, targets, usd, held, fee):
+    '''
+    Trades toward the target holdings of every bar with the rules of
+    TradeHandler._buy and _sell, retrying a rejected trade on the following
+    bars. The loop visits runs of equal targets rather than bars: within a
+    run the first affordable bar of a buy is found with one array compare,
+    and a rejected sell cannot succeed before the target changes.
+    :param price: float array of close prices
+    :param targets: float array of holdings per bar, NaN to hold
+    :param usd: USD balance before the first bar
+    :param held: coin holdings before the first bar
+    :param fee: trade fee
+    :return: list of (bar, signed amount, usd after, holdings after) fills
+    '''
+    n = len(targets)
+    if n == 0:
+        return []
+    same = (targets[1:] == targets[:-1]) | (np.isnan(targets[1:]) & np.isnan(targets[:-1]))
+    starts = np.flatnonzero(np.r_[True, ~same])
+    ends = np.r_[starts[1:], n]
+    fills = []
+    for a, b in zip(starts.tolist(), ends.tolist()):
+        target = float(targets[a])
+        if target != target:
+            continue
+        i = a
+        while i < b and target != held:
+            amt = target - held
+            if amt > 0:
+                # first bar of the run where _buy can afford it
+                ok = np.flatnonzero(~(price[i:b] * amt * (1.0 + fee) > usd))
+                if not ok.size:
+                    break
+                i += int(ok[0])
+                p = float(price[i])
+                held += amt
+                usd -= p * amt * (1.0 + fee)
+                fills.append((i, amt, usd, held))
+            else:
+                amt = held - target
+                if held < amt:
+                    break
+                p = float(price[i])
+                usd += p * amt * (1.0 - fee)
+                held -= amt
+                fills.append((i, -amt, usd, held))
+            i += 1
+    return fills
 
@@ -1,8 +1,74 @@
 import pandas as pd
 from datetime import datetime, date, timedelta
-from sklearn.preprocessing import *
-import sklearn
 import numpy as np
+import time
+from davidplayground import kernels
+
+# sklearn.preprocessing scalers still reachable as attributes, see __getattr__
+SKLEARN_SCALERS = {'MinMaxScaler', 'StandardScaler', 'RobustScaler', 'MaxAbsScaler', 'Normalizer',
+                   'QuantileTransformer', 'PowerTransformer',
+                   'minmax_scale', 'scale', 'robust_scale', 'maxabs_scale', 'quantile_transform', 'power_transform'}
+
+def __getattr__(name):
+    '''
+    sklearn.preprocessing used to be star-imported here. Its scalers still
+    resolve as attributes (utils.MinMaxScaler, or `from davidplayground.utils
+    import MinMaxScaler`), importing sklearn the first time one is used.
+    Star imports of this module no longer bring them in: import them from
+    sklearn.preprocessing directly.
+    '''
+    if name not in SKLEARN_SCALERS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import sklearn.preprocessing
+    return getattr(sklearn.preprocessing, name)
+
+def _path_length(df):
+    '''
+    Length of each path in a dataset. Long-format path batches (see
+    WienerDataset.iter_paths) hold equal-length paths back to back, tagged by
+    a `path_id` column; any other dataset is a single path.
+    :param df: DataFrame dataset
+    :return: number of rows per path
+    '''
+    if 'path_id' not in df.columns or len(df) == 0:
+        return len(df)
+    pid = df['path_id'].to_numpy()
+    return int(np.count_nonzero(pid == pid[0]))
+
+def _path_columns(df, col):
+    '''
+    Column `col` of a dataset as a 2d float array with one column per path.
+    :param df: DataFrame dataset
+    :param col: column name
+    :return: array of shape (path length, number of paths)
+    '''
+    values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    n = _path_length(df)
+    if n == 0:
+        return values[:, None]
+    return values.reshape(-1, n).T
+
+def _flatten_paths(arr):
+    '''
+    Inverse of `_path_columns`, lays the paths back to back.
+    :param arr: array of shape (path length, number of paths)
+    :return: 1d array
+    '''
+    return np.asarray(arr).T.ravel()
+
+CANDLE_COLUMNS = ['time', 'low', 'high', 'open', 'close', 'volume']
+
+def cbquery2arrays(query):
+    '''
+    Converts a list-like query result from cbpro api straight into typed
+    columns: int64 epoch seconds for time and float64 for the rest.
+    :param query: returned query from cbpro api
+    :return: dict of column name to numpy array
+    '''
+    values = np.asarray(query, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS))
+    columns = {name: values[:, i] for i, name in enumerate(CANDLE_COLUMNS)}
+    columns['time'] = columns['time'].astype(np.int64)
+    return columns
 
 def cbquery2df(query):
     '''
@@ -10,12 +76,23 @@ def cbquery2df(query):
     :param query: returned query from cbpro api
     :return: dataframe representation of the query
     '''
-    row_format = ['time', 'low', 'high', 'open', 'close', 'volume']
-    rows = []
-    for qi in query:
-        items = dict(zip(row_format, qi))
-        rows.append(items)
-    return pd.DataFrame(rows)
+    return pd.DataFrame(cbquery2arrays(query))
+
+def _to_datetimes(timestamps, tz=None):
+    '''
+    Converts epoch seconds to datetimes in one call.
+    :param timestamps: array-like of epoch seconds
+    :param tz: timezone name for tz-aware datetimes, or None for naive local
+    time the way datetime.fromtimestamp returns it
+    :return: DatetimeIndex
+    '''
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if tz is not None:
+        return pd.to_datetime(timestamps, unit='s', utc=True).tz_convert(tz)
+    # local utc offsets only change on quarter hours, look them up once per quarter
+    quarters, inverse = np.unique(timestamps // 900, return_inverse=True)
+    offsets = np.array([time.localtime(int(q) * 900).tm_gmtoff for q in quarters], dtype=np.int64)
+    return pd.to_datetime(timestamps + offsets[inverse.ravel()], unit='s')
 
 def convert_timestamps(df):
     '''
@@ -23,15 +100,37 @@ def convert_timestamps(df):
     :param df: DataFrame dataset
     :return: treated dataset
     '''
-    def subfunc(row):
-        timedata = row['time']
-        row['time'] = datetime.fromtimestamp(timedata)
-        return row
-    df = df.apply(subfunc, axis=1)
+    df['time'] = _to_datetimes(df['time'])
     df = df.sort_values('time', ascending=True)
     df = df.reset_index(drop=True)
     return df
 
+def ingest_candles(df, tz=None):
+    '''
+    A treatment function for ingesting raw cbpro candles: casts the columns
+    to typed numpy arrays, converts ordinal timestamps to datetimes and
+    sorts and de-duplicates the candles on time once.
+    :param df: DataFrame dataset with raw cbpro candle columns
+    :param tz: timezone name for tz-aware times, or None for naive local time
+    :return: treated dataset
+    '''
+    times = df['time'].to_numpy(dtype=np.int64)
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+    # overlapping query windows repeat their boundary candles
+    keep = np.ones(len(times), dtype=bool)
+    keep[:-1] = times[1:] != times[:-1]
+    rows = order[keep]
+    data = {}
+    for col in df.columns:
+        if col == 'time':
+            data[col] = _to_datetimes(times[keep], tz=tz)
+        elif col in CANDLE_COLUMNS:
+            data[col] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        else:
+            data[col] = df[col].to_numpy()[rows]
+    return pd.DataFrame(data)
+
 def add_sma(df, dt=2, cols=['close']):
     '''
     A treatment function for adding simple moving average(s) as columns
@@ -43,8 +142,7 @@ def add_sma(df, dt=2, cols=['close']):
     '''
     for col in cols:
         sma_name = col + '_sma' + str(dt)
-        sma_col = df[col].rolling(window=dt).mean()
-        df[sma_name] = sma_col
+        df[sma_name] = _flatten_paths(kernels.sma(_path_columns(df, col), dt))
     return df
 
 def add_ema(df, dt=2, smoothing=2.0,cols=['close']):
@@ -52,26 +150,14 @@ def add_ema(df, dt=2, smoothing=2.0,cols=['close']):
     A treatment function for adding exponential moving average(s) as columns
     to the dataset.
     :param df: Dataframe dataset
-    :param dt: Size of window for EMA
+    :param dt: Size of window for EMA, or list of sizes
     :param cols: Which columns to compute EMA for
     :return: treated dataset
     '''
+    dts = dt if isinstance(dt, (list, tuple)) else [dt]
     for col in cols:
-        ema0 = df[col][:dt].mean()
-        if pd.isna(ema0):
-            ema0 = 0.0
-        ema_col = [None for _ in range(dt)]
-        ema_name = col + '_ema' + str(dt)
-        for index, row in df.iterrows():
-            if index < dt:
-                continue
-            elif pd.isna(row[col]):
-                ema_col.append(None)
-                continue
-            ema1 = row[col]*(smoothing/(1.0 + dt)) + ema0*(1 - smoothing/(1.0 + dt))
-            ema_col.append(ema1)
-            ema0 = ema1
-        df[ema_name] = ema_col
+        for w, ema_col in kernels.emas(_path_columns(df, col), dts, smoothing=smoothing).items():
+            df[col + '_ema' + str(w)] = _flatten_paths(ema_col)
     return df
 
 def add_bollinger(df, dt=2, K=2.0, middle='sma'):
@@ -90,7 +176,7 @@ def add_bollinger(df, dt=2, K=2.0, middle='sma'):
         df = add_ema(df, dt=dt, smoothing=2.0, cols=['close'])
     else:
         raise Exception('Bollinger Bands require middle method to be in ["sma", "ema"]')
-    stdev = df['close'].rolling(window=dt).std()
+    stdev = _flatten_paths(kernels.rolling_std(_path_columns(df, 'close'), dt))
     df['bb_upper'] = stdev * K + df[f'close_{middle}{dt}']
     df['bb_lower'] = -stdev * K + df[f'close_{middle}{dt}']
     return df
@@ -100,33 +186,15 @@ def add_rsi(df, dt=2, middle='ema'):
     A treatment function for adding the relative-strength-index as
     a column to the dataset.
     :param df: Dataframe dataset
-    :param dt: Window size
-    :param middle: MA method
+    :param dt: Window size, or list of window sizes
+    :param middle: MA method, one of "sma", "ema" or "wilder"
     :return: treated dataset
     '''
-    if middle not in ['sma', 'ema']:
-        raise Exception('RSI mean method must be either "sma" or "ema"')
-    U = []
-    D = []
-    for i in range(len(df)):
-        if i == 0:
-            U.append(0)
-            D.append(0)
-            continue
-        p0 = df.loc[i - 1]['close']
-        p1 = df.loc[i]['close']
-        U.append(max(p1 - p0, 0))
-        D.append(max(p0 - p1, 0))
-    dfc = df.copy()
-    dfc['U'] = U
-    dfc['D'] = D
-    if middle == 'sma':
-        dfc = add_sma(dfc, dt=dt, cols=['U', 'D'])
-    elif middle == 'ema':
-        dfc = add_ema(dfc, dt=dt, cols=['U', 'D'], smoothing=2.0)
-    RS = dfc[f'U_{middle}{dt}'] / dfc[f'D_{middle}{dt}']
-    RSI = 100.0 - 100.0/(1.0 + RS)
-    df[f'rsi{dt}'] = RSI
+    if middle not in ['sma', 'ema', 'wilder']:
+        raise Exception('RSI mean method must be either "sma", "ema" or "wilder"')
+    dts = dt if isinstance(dt, (list, tuple)) else [dt]
+    for w, rsi_col in kernels.rsi(_path_columns(df, 'close'), dts, middle=middle).items():
+        df[f'rsi{w}'] = _flatten_paths(rsi_col)
     return df
 
 def add_macd(df, a=12, b=26, c=9, middle='ema'):
@@ -163,14 +231,19 @@ def add_macd(df, a=12, b=26, c=9, middle='ema'):
         df['macd_hist'] = df['macd'] - df['macd_signal']
     return df
 
-def add_scaler(df, scaler=MinMaxScaler, cols=['close']):
+def add_scaler(df, scaler=None, cols=['close']):
     '''
     Treatment function to apply a scaler to column(s) of a dataset
     :param df: DataFrame dataset
-    :param scaler: either sklearn.preprocessing scaler or custom function
+    :param scaler: either sklearn.preprocessing scaler or custom function,
+    defaults to a MinMaxScaler
     :param cols: list of columns to scale
     :return: treated dataset
     '''
+    import sklearn.base
+    if scaler is None:
+        from sklearn.preprocessing import MinMaxScaler
+        scaler = MinMaxScaler()
     if isinstance(scaler, sklearn.base.TransformerMixin):
         df[cols] = scaler.fit_transform(df[cols])
         return df
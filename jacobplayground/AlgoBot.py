@@ -1,100 +1,146 @@
-import cbpro, time
+import os, time
 
 import numpy as np
 import pandas as pd
 
 from datetime import datetime, timedelta
-from matplotlib import pyplot as plt
 
-import tensorflow as tf
-import tensorflow.keras as keras
-
-from tensorflow.keras import Sequential
-from tensorflow.keras.layers import Dense, LSTM
-from tensorflow.keras.optimizers import Adam
-from tensorflow.keras import initializers
-
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import MinMaxScaler
-
-%matplotlib inline
-
-pubclient = #
-authclient = #
+# TensorFlow is imported by WalkForward/Forecaster when a model is built or
+# loaded, and matplotlib by render(), so none of them load with this module
+from jacobplayground.WalkForward import WalkForward, FEATURES, build_model, make_target
+from jacobplayground.Forecaster import Forecaster
+from jacobplayground.TechnicalIndicators import TechnicalIndicators
+from jacobplayground.Session import TradingSession
+from jacobplayground.Clock import RealClock
+from jacobplayground.Scheduler import Scheduler
+from davidplayground.stats import TradeStats
+
+# clients of the live exchange, e.g. cbpro.PublicClient() and
+# cbpro.AuthenticatedClient(key, b64secret, passphrase); AlgoBot(client=...)
+# takes any object with the same methods, such as a PaperExchange
+pubclient = None
+authclient = None
 
 class AlgoBot:
 
     "Name of the game -- strategic asset allocation"
 
-    def __init__(self, product, initEquity):
+    def __init__(self, product, initEquity, notifier=None, sessionCapacity=1024, spillDir=None,
+                 client=None, clock=None):
 
         self.MAX_TRADING_SESSION: int = 192 # in hours, this is 8 days
         self.product = product
+        self.client = client if client is not None else authclient
+        if self.client is None:
+            raise Exception('AlgoBot needs a client: set authclient or pass client=, e.g. a PaperExchange')
+        self.clock = clock if clock is not None else RealClock()   # VirtualClock to replay without waiting
 
         self.data = None    # this best practice?
+        self.horizon = 12   # hours ahead the target looks
         self._loadData()
         self.lookback = 96
+        self.foldMetrics = None
+        self.forecaster = None
 
         self.initEquity = initEquity    # to monitor progress this should be remembered and not changed
         self.cash = initEquity
         self.unrealized_pl = 0
-        self.netWorth = np.zeros(shape=self.MAX_TRADING_SESSION, dtype=np.float16)
-        self.gNetWorth = []
-        self.transactions = np.zeros(shape=self.MAX_TRADING_SESSION, dtype=object)
-        self.gTransactions = []
+        # candles, transactions and net worth live in fixed-size ring buffers,
+        # older entries are dropped, or spilled to spillDir/product if given
+        self.session = TradingSession(capacity=sessionCapacity, features=FEATURES,
+                                      spillDir=None if spillDir is None else os.path.join(spillDir, product))
+        self.sessionStart = 0   # step the current trading session started at
         self.winRate = np.nan
         self.positionHeld = False
 
         self.commission = 0.005     # equivalent to 0.5% commission on every trade
         self.trailingStopRisk = 0.90    # ?
 
-        # Kelly Criterion starting parameters
+        # signals and fills go out on the notifier's background thread, never stalling
+        # the trading loop, e.g. Notifier([StdoutSink()]).start(); None sends nothing
+        self.notifier = notifier
+
+        # Kelly Criterion starting parameters, the priors of the trade statistics
+        # until enough trades have closed (steps are 12 hours apart: 730 a year)
         self.W = 0.3
         self.R = 3.0
+        self.tradeStats = TradeStats(periods_per_year=730, prior_win_rate=self.W, prior_payoff=self.R)
+        self.coinHeld = 0.0     # coin bought since the position was opened, and what it cost
+        self.costBasis = 0.0
 
     def reset(self):
-        self.gNetWorth.extend(self.netWorth)
-        self.gTransactions.extend(self.transactions)
-        self.netWorth = np.zeros(shape=self.MAX_TRADING_SESSION, dtype=np.float16)
-        self.transactions = np.zeros(shape=self.MAX_TRADING_SESSION, dtype=object)
+        self.session.flush()
+        self.sessionStart = self.session.netWorth.count
 
-    def runSim(self):
+    def runSim(self, scheduler=None, interval=12 * 60 * 60):
+        '''
+        One trading session: a step every `interval` seconds on the bot's
+        clock, through `scheduler` (a new one on the clock by default). With
+        a RealClock the steps wait for real time, with a VirtualClock the
+        session replays as fast as the steps compute.
+        '''
         # 1. Initialize agent, load data, and train network.
-        for i in range(self.MAX_TRADING_SESSION // 6):
-            self.data.loc[len(self.data)] = self.getDataNow()
-            self._addTechnicals()   # recompute technicals
-            # 2. Make a prediction every 6 (?) hrs
-            #   - at the start of each step, record net worth from previous transaction
-            signal = None # return value of predict()
-            if signal > 0:
-                order = self.buy()
-            elif signal < 0:
-                order = self.sell()
-            # add price to transaction entry for logging purposes
-            order['price'] = self.getPrice()
-            self.transactions[i] = order
-            self.netWorth[i] = self.getNetWorth()
-
-            # update KC parameters and winrate
-
-            time.sleep(12 * 60 * 60)
+        scheduler = scheduler if scheduler is not None else Scheduler(self.clock)
+        steps = self.MAX_TRADING_SESSION // 6
+        start = self.clock.time()
+        scheduler.every(interval, self.step, count=steps, start=start)
+        scheduler.run(until=start + steps * interval)
         # 3. Track performance at every prediction, and 
         #   consider aggregating performance data by day
         #   as additional training data
         return
 
+    def step(self):
+        '''
+        One step of the session. The seconds spent fetching data, updating
+        technicals, predicting and ordering are recorded in the session.
+        '''
+        t0 = time.perf_counter()
+        candle = self.getDataNow()
+        t1 = time.perf_counter()
+        self.updateFeatures(candle)
+        t2 = time.perf_counter()
+        # 2. Make a prediction every 6 (?) hrs
+        #   - at the start of each step, record net worth from previous transaction
+        signal = self.predict()
+        t3 = time.perf_counter()
+        order = None
+        if signal > 0:
+            order = self.buy()
+        elif signal < 0:
+            order = self.sell()
+        # add price to transaction entry for logging purposes
+        if order is not None:
+            self.session.recordTransaction(order, self.getPrice())
+        netWorth = self.getNetWorth()
+        self.session.recordNetWorth(netWorth)
+
+        # update KC parameters and winrate (closed trades update them in sell)
+        self.tradeStats.add_value(netWorth)
+
+        self.session.recordStep(t1 - t0, t2 - t1, t3 - t2, time.perf_counter() - t3)
+
     def buy(self):
         '''
         Execute buy order
         '''
         price = self.getPrice()
+        order = None
         if self.cash > 0:
             position_size = self.computeKC() * self.cash
-            order = authclient.place_market_order(self.product, 'buy', funds=position_size, overdraft_enabled=False)
-            fees = order['fill_fees']
+            if position_size <= 0:
+                return None
+            order = self.client.place_market_order(self.product, 'buy', funds=position_size, overdraft_enabled=False)
+            if 'message' in order:
+                return self._rejected(order, 'buy', price)
+            fees = float(order['fill_fees'])
+            self.coinHeld += float(order.get('filled_size', 0.0))
+            self.costBasis += float(order.get('executed_value', position_size - fees)) + fees
             self.cash -= (position_size - fees) # may need to manually compute
             self.unrealized_pl += (position_size - fees)
             self.positionHeld = True
+            self._notify(f'Bought {position_size:.2f} USD at {price:.2f}', kind='fill',
+                         side='buy', funds=position_size, price=price, fees=fees)
         return order
 
     def sell(self):
@@ -102,54 +148,97 @@ class AlgoBot:
         Execute sell order
         '''
         price = self.getPrice()
+        order = None
         if self.unrealized_pl > 0:
             # check if sale price exceeds last buy price at least enough to cover commissions
             lastBuy = self.getLastBuy()
             if (lastBuy is not None) and (price - lastBuy['price'] > lastBuy['fees'] + 0.005 * price):
-                order = authclient.place_market_order(self.product, 'sell', funds=self.unrealized_pl)
-                fees = order['fill_fees']
+                order = self.client.place_market_order(self.product, 'sell', funds=self.unrealized_pl)
+                if 'message' in order:
+                    return self._rejected(order, 'sell', price)
+                fees = float(order['fill_fees'])
+                self.updateKC(self._closedProfit(order, fees))
+                self._notify(f'Sold {self.unrealized_pl:.2f} USD at {price:.2f}', kind='fill',
+                             side='sell', funds=self.unrealized_pl, price=price, fees=fees)
                 self.cash += (self.unrealized_pl - fees)
                 self.unrealized_pl = 0
                 self.positionHeld = False
             else:
-                print('Sale attempted but not worth it!')
+                self._notify('Sale attempted but not worth it!', kind='signal',
+                             side='sell', price=price)
         return order
 
-            
+
+    def _notify(self, message, kind, **fields):
+        if self.notifier is not None:
+            self.notifier.notify(self.product, message, kind=kind, **fields)
+
+    def _rejected(self, order, side, price):
+        '''
+        The exchange answers rejected orders with just a message.
+        '''
+        self._notify(f'{side.capitalize()} order rejected: {order["message"]}', kind='alert',
+                     side=side, price=price)
+        return None
+
     def getLastBuy(self):
-        if self.transactions is None:
-            # raise ValueError('No recorded transactions.')
-            return None
-        for x in reversed(self.transactions):
-            if x['side'] == 'buy':
-                return x
+        # kept aside by the session when recorded, None before the first buy
+        return self.session.getLastBuy()
 
-    def _create_model(self):
+    def _create_model(self, train_size=2000, test_size=500, epochs=25, batch_size=10):
         # 1. data pre-processing
         # 2 create a model & train
         # 3. make future predictions
         '''
         add sortino or sharpe
+
+        Walk-forward training: the model is retrained on rolling folds of
+        lookback windows and scored on the period right after each one. The
+        model of the most recent fold is kept.
         '''
-        x = self.data[['close', 'MACD', 'MACDdiff', 'RSI', 'trix', 'bolu_sd1', 'boll_sd1', 'bolu_sd2', 'boll_sd2']]
-        y = self.data['target']
-        x, y = x.to_numpy(), y.to_numpy()
+        x = self.data[FEATURES].to_numpy(dtype=np.float32)
+        y = self.data['target'].to_numpy(dtype=np.float32)
 
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.3, random_state=69)
+        wf = WalkForward(x, y, lookback=self.lookback, train_size=train_size, test_size=test_size,
+                         gap=self.horizon)
+        self.foldMetrics = wf.run(build_model, epochs=epochs, batch_size=batch_size)
+        self.model = wf.model
 
-        epochs = 25
-        batch_size = 10
+        # warm the forecaster with the feature window of the loaded history
+        self.forecaster = Forecaster(self.model, lookback=self.lookback, scale=wf.scale)
+        self.forecaster.addProduct(self.product, self.data)
 
-        model = Sequential()
-        '''///'''
-        
-        self.model = model
 
+    def forecast(self, candle=None):
+        '''
+        Predicts the sell (-1), hold (0) or buy (1) signal of the product,
+        after adding `candle` ([time, low, high, open, close, volume]) to its
+        feature window.
+        '''
+        if candle is not None:
+            self.updateFeatures(candle)
+        return self.predict()
+
+    def updateFeatures(self, candle):
+        '''
+        Adds `candle` to the feature window of the product and logs both in
+        the session. Features are updated incrementally, not recomputed.
+        '''
+        if self.forecaster is None:
+            self.session.addCandle(candle)
+            return None
+        features = self.forecaster.update(self.product, candle[2], candle[1], candle[4])
+        self.session.addCandle(candle, features)
+        return features
 
-    def forecast(self, data):
-        # predict closing price
-        yhat = [0]
-        return yhat
+    def predict(self):
+        '''
+        Sell (-1), hold (0) or buy (1) signal of the current feature window.
+        '''
+        if self.forecaster is None:
+            return 0
+        signal = self.forecaster.forecast([self.product])[self.product]
+        return 0 if signal is None else signal
 
 
     def _loadData(self, technicals=True):
@@ -164,18 +253,18 @@ class AlgoBot:
         queries = []
         for k in range(timedelta(days = 180) // timedelta(hours = 300)):
             queries.append(pd.DataFrame(
-                data = authclient.get_product_historic_rates(
+                data = self.client.get_product_historic_rates(
                     self.product,
-                    start=get_time(datetime.now() - k * timedelta(hours=300)),
-                    end=get_time(datetime.now() - (k - 1) * timedelta(hours=300)),
+                    start=get_time(self.clock.now() - k * timedelta(hours=300)),
+                    end=get_time(self.clock.now() - (k - 1) * timedelta(hours=300)),
                     granularity=3600
                 ), 
                 columns = ['time', 'low', 'high', 'open', 'close', 'volume'],
-                dtype = object
+                dtype = np.float64
             ))
         self.data = pd.concat(queries)[::-1].dropna().reset_index()
-        # if technicals:
-        #    self._addTechnicals()
+        if technicals:
+            self._addTechnicals()
 
         "MOST RECENT DATA AT BOTTOM OKAY?"
 
@@ -183,12 +272,8 @@ class AlgoBot:
         #   signal indicator:
         #      whenever the 6hr future price exceeds the current price by at least 10% for a buy signal, 
         #      and a drawdown of the same magnitude for a sell signal
-        shifted = self.data['close'].shift(12)      # 12 hr
-        self.data['target'] = np.select(
-            [self.data['close'] > 1.1 * shifted, self.data['close'] < 0.9 * shifted],
-            [1, -1],
-            default = 0
-        )
+        #   (NaN for the last hours, whose future is not known yet)
+        self.data['target'] = make_target(self.data['close'], horizon=self.horizon, threshold=0.1)
 
 
     def _addTechnicals(self):
@@ -199,35 +284,59 @@ class AlgoBot:
             - volume, and
             - volatility.
         """
-        pass
+        self.data = TechnicalIndicators(self.data, trend=['macd', 'trix'], momentum=['rsi'],
+                                        volatility=['bbands']).df
 
 
     def computeKC(self):
-        return self.W - (1 - self.W) / self.R
+        # no bet when the edge is negative
+        return min(max(self.W - (1 - self.W) / self.R, 0.0), 1.0)
+
+    def updateKC(self, pnl):
+        '''
+        Adds a closed trade to the trade statistics, O(1), and moves the
+        Kelly parameters and win rate to them.
+        :param pnl: profit of the trade in USD, fees included
+        '''
+        self.tradeStats.add_trade(pnl)
+        self.W, self.R = self.tradeStats.win_rate(), self.tradeStats.payoff()
+        self.winRate = self.tradeStats.wins / self.tradeStats.trades
+        return self.computeKC()
 
-    def updateKC(self):
+    def _closedProfit(self, order, fees):
         '''
-        needs implemented!
+        Profit of a sell against the average cost of the coin bought since
+        the position opened.
         '''
-        winrate = float()
-        winloss = float()
-        return winloss * winrate - (1 - winrate)
+        sold = float(order.get('filled_size', 0.0))
+        if self.coinHeld <= 0 or sold <= 0:
+            return 0.0
+        sold = min(sold, self.coinHeld)
+        basis = self.costBasis * sold / self.coinHeld
+        self.coinHeld -= sold
+        self.costBasis -= basis
+        return float(order.get('executed_value', 0.0)) - fees - basis
 
     def getPrice(self):
-        return float(authclient.get_product_ticker(self.product)['price'])   
+        return float(self.client.get_product_ticker(self.product)['price'])   
 
     def getDataNow(self):
-        return authclient.get_product_historic_rates(
+        # the latest completed hourly candle, like getData's; a two hour window
+        # holds one wherever the clock is within the hour
+        now = self.clock.now()
+        return self.client.get_product_historic_rates(
             product_id=self.product,
-            start=datetime.now()-timedelta(minutes=1),
-            end=datetime.now()
+            start=now - timedelta(hours=2),
+            end=now,
+            granularity=3600
         )[0]
     
     def render(self):
         '''
         needs more! nice graph would be cool
         '''
-        plt.plot(self.netWorth)
+        from matplotlib import pyplot as plt
+        plt.plot(self.session.netWorth.history())
 
         
     def getNetWorth(self):
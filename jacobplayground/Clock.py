@@ -0,0 +1,48 @@
+import time
+from datetime import datetime, timezone
+
+
+class RealClock:
+
+    "Wall-clock time, for live trading."
+
+    def time(self):
+        '''
+        :return: epoch seconds
+        '''
+        return time.time()
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+
+    '''
+    Simulated time for replays and paper trading: `sleep` moves the clock
+    forward instead of blocking, so hours of trading pass as fast as the
+    computation in between allows. `now` is a naive UTC datetime, the way
+    AlgoBot formats its cbpro queries.
+    '''
+
+    def __init__(self, start=0.0):
+        '''
+        :param start: epoch seconds, or a datetime or ISO-8601 string (naive ones are UTC)
+        '''
+        if isinstance(start, str):
+            start = datetime.fromisoformat(start)
+        if isinstance(start, datetime):
+            start = (start if start.tzinfo else start.replace(tzinfo=timezone.utc)).timestamp()
+        self.t = float(start)
+
+    def time(self):
+        return self.t
+
+    def now(self):
+        return datetime.fromtimestamp(self.t, timezone.utc).replace(tzinfo=None)
+
+    def sleep(self, seconds):
+        self.t += seconds
@@ -0,0 +1,342 @@
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from jacobplayground.WalkForward import FEATURES
+from jacobplayground.TechnicalIndicators import _ema, _sma, _wilder
+
+
+class FeatureWindow:
+
+    '''
+    The last `lookback` rows of the model features of one product, updated
+    bar by bar in O(1) instead of recomputing TechnicalIndicators over the
+    whole history. Values match TechnicalIndicators with its default
+    parameters (MACD 12/26/9, TRIX 15, RSI 14, Bollinger 20 with K 1 and 2).
+
+    Rows live twice in a buffer of 2 * lookback rows, so the current window
+    is always one contiguous slice of it.
+    '''
+
+    def __init__(self, lookback=96, scale=None):
+        self.lookback = lookback
+        self.scale = scale
+        self.buffer = np.zeros((2 * lookback, len(FEATURES)), dtype=np.float32)
+        self.n = 0
+
+        self.ema = {}   # name -> current value of the adjust=False EMAs
+        self.prevTrix = np.nan
+        self.prevClose = None
+        self.gains, self.losses = [], []
+        self.avgGain = self.avgLoss = np.nan
+        self.closes = deque(maxlen=20)
+        self.typical = deque(maxlen=20)
+
+    def _ema(self, name, x, span):
+        alpha = 2 / (span + 1)
+        y = self.ema.get(name)
+        y = x if y is None else (1 - alpha) * y + alpha * x
+        self.ema[name] = y
+        return y
+
+    def _rsi(self, close, period=14):
+        diff = 0.0 if self.prevClose is None else close - self.prevClose
+        self.prevClose = close
+        if self.n == 0:
+            return np.nan
+        gain, loss = max(diff, 0.0), max(-diff, 0.0)
+        if self.n < period:
+            self.gains.append(gain)
+            self.losses.append(loss)
+            return np.nan
+        if self.n == period:
+            self.gains.append(gain)
+            self.losses.append(loss)
+            self.avgGain, self.avgLoss = np.mean(self.gains), np.mean(self.losses)
+        else:
+            self.avgGain = (1 - 1 / period) * self.avgGain + gain / period
+            self.avgLoss = (1 - 1 / period) * self.avgLoss + loss / period
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 100 - 100 / (1 + np.float64(self.avgGain) / self.avgLoss)
+
+    def update(self, high, low, close):
+        '''
+        Adds a bar.
+        :return: the feature row of the bar
+        '''
+        macd = self._ema('fast', close, 12) - self._ema('slow', close, 26)
+        signal = self._ema('signal', macd, 9)
+        ema3 = self._ema('trix3', self._ema('trix2', self._ema('trix1', close, 15), 15), 15)
+        trix = 100 * (ema3 - self.prevTrix) / self.prevTrix
+        self.prevTrix = ema3
+        rsi = self._rsi(close)
+
+        self.closes.append(close)
+        self.typical.append((high + low + close) / 3)
+        if len(self.closes) == self.closes.maxlen:
+            mid, sd = np.mean(self.closes), np.std(self.typical, ddof=1)
+        else:
+            mid = sd = np.nan
+
+        row = (close, macd, macd - signal, rsi, trix, mid + sd, mid - sd, mid + 2 * sd, mid - 2 * sd)
+        i = self.n % self.lookback
+        self.buffer[i] = self.buffer[i + self.lookback] = row
+        self.n += 1
+        return self.buffer[i]
+
+    def seed(self, df):
+        '''
+        Brings the window up to date with a historical dataset. Long
+        histories are computed in one vectorized pass that leaves the same
+        indicator state as updating bar by bar.
+        :param df: DataFrame with high, low and close columns
+        :return: self
+        '''
+        H, L, C = (df[c].to_numpy(dtype=np.float64) for c in ('high', 'low', 'close'))
+        if self.n or len(C) <= 2 * self.lookback:
+            for high, low, close in zip(H.tolist(), L.tolist(), C.tolist()):
+                self.update(high, low, close)
+            return self
+
+        fast, slow = _ema(C, span=12), _ema(C, span=26)
+        macd = fast - slow
+        signal = _ema(macd, span=9)
+        trix1 = _ema(C, span=15)
+        trix2 = _ema(trix1, span=15)
+        trix3 = _ema(trix2, span=15)
+        diff = np.zeros(len(C))
+        diff[1:] = C[1:] - C[:-1]
+        gain = _wilder(np.maximum(diff, 0.0), 14, start=1)
+        loss = _wilder(np.maximum(-diff, 0.0), 14, start=1)
+        mid = _sma(C, 20)
+        sd = pd.Series((H + L + C) / 3).rolling(20).std().to_numpy()
+
+        tail = slice(len(C) - self.lookback, len(C))
+        trix = 100 * (trix3[tail] - trix3[len(C) - self.lookback - 1:-1]) / trix3[len(C) - self.lookback - 1:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - 100 / (1 + gain[tail] / loss[tail])
+        rows = np.column_stack([C[tail], macd[tail], macd[tail] - signal[tail], rsi, trix,
+                                mid[tail] + sd[tail], mid[tail] - sd[tail],
+                                mid[tail] + 2 * sd[tail], mid[tail] - 2 * sd[tail]])
+        self.n = len(C)
+        i = self.n % self.lookback
+        # row of bar k sits at k % lookback (and lookback after it)
+        self.buffer[:self.lookback] = np.roll(rows, i, axis=0)
+        self.buffer[self.lookback:] = self.buffer[:self.lookback]
+
+        self.ema = {'fast': fast[-1], 'slow': slow[-1], 'signal': signal[-1],
+                    'trix1': trix1[-1], 'trix2': trix2[-1], 'trix3': trix3[-1]}
+        self.prevTrix = trix3[-1]
+        self.prevClose = C[-1]
+        self.avgGain, self.avgLoss = gain[-1], loss[-1]
+        self.closes.extend(C[-20:].tolist())
+        self.typical.extend(((H[-20:] + L[-20:] + C[-20:]) / 3).tolist())
+        return self
+
+    def window(self):
+        '''
+        :return: (lookback, features) array of the last rows, oldest first,
+        scaled if a scale was given; None until `lookback` bars were seen
+        '''
+        if self.n < self.lookback:
+            return None
+        i = self.n % self.lookback
+        x = self.buffer[i:i + self.lookback]
+        if self.scale is not None:
+            x = (x - self.scale[0]) / self.scale[1]
+        return x
+
+
+def sigmoid(x):
+    # tanh form, no overflow for large |x|
+    return 0.5 * (1 + np.tanh(0.5 * x))
+
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': sigmoid,
+    'softmax': softmax,
+}
+
+
+class NumpyModel:
+
+    '''
+    numpy-only forward pass of a small Sequential model made of an LSTM
+    layer (last output only) followed by Dense layers, for CPU inference
+    without TensorFlow. Weights use the keras layout, LSTM gates in i, f,
+    c, o order.
+    '''
+
+    def __init__(self, layers):
+        '''
+        :param layers: list of ('lstm', kernel, recurrent_kernel, bias) and
+        ('dense', kernel, bias, activation name) tuples
+        '''
+        self.layers = [(layer[0],) + tuple(np.asarray(w, dtype=np.float32) if not isinstance(w, str) else w
+                                           for w in layer[1:]) for layer in layers]
+
+    @classmethod
+    def fromKeras(cls, model):
+        layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            if kind == 'LSTM':
+                if layer.return_sequences:
+                    raise Exception('Only the last output of an LSTM layer is supported')
+                layers.append(('lstm',) + tuple(layer.get_weights()))
+            elif kind == 'Dense':
+                layers.append(('dense',) + tuple(layer.get_weights()) + (layer.activation.__name__,))
+            elif kind not in ('InputLayer', 'Dropout'):
+                raise Exception(f'Layer {kind} has no numpy forward pass')
+        return cls(layers)
+
+    def predict(self, x, verbose=0):
+        '''
+        :param x: (batch, lookback, features) array
+        :return: (batch, outputs) array
+        '''
+        h = np.asarray(x, dtype=np.float32)
+        for layer in self.layers:
+            if layer[0] == 'lstm':
+                kernel, recurrent, bias = layer[1:]
+                units = recurrent.shape[0]
+                # input projections of every step in one matmul
+                z = h @ kernel + bias
+                state = np.zeros((len(h), units), dtype=np.float32)
+                carry = np.zeros((len(h), units), dtype=np.float32)
+                for t in range(h.shape[1]):
+                    g = z[:, t] + state @ recurrent
+                    i, f = sigmoid(g[:, :units]), sigmoid(g[:, units:2 * units])
+                    c, o = np.tanh(g[:, 2 * units:3 * units]), sigmoid(g[:, 3 * units:])
+                    carry = f * carry + i * c
+                    state = o * np.tanh(carry)
+                h = state
+            else:
+                kernel, bias, activation = layer[1:]
+                h = ACTIVATIONS[activation](h @ kernel + bias)
+        return h
+
+
+class TFLiteModel:
+
+    '''
+    A keras model converted to a TFLite interpreter, resized per batch.
+    '''
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        self.interpreter = tf.lite.Interpreter(model_content=converter.convert())
+        self.input = self.interpreter.get_input_details()[0]['index']
+        self.output = self.interpreter.get_output_details()[0]['index']
+        self.batch = None
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        if self.batch != x.shape:
+            self.interpreter.resize_tensor_input(self.input, x.shape)
+            self.interpreter.allocate_tensors()
+            self.batch = x.shape
+        self.interpreter.set_tensor(self.input, x)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output)
+
+
+class Forecaster:
+
+    '''
+    Low-latency inference for one or more products. The model stays loaded
+    between calls, every product keeps an incrementally updated
+    FeatureWindow, and one forecast stacks the windows of all products into
+    a single predict call, so its cost depends on the number of products,
+    not on the length of their history.
+
+        F = Forecaster('model.keras', lookback=96, scale=wf.scale, runtime='numpy')
+        F.addProduct('BTC-USD', history)
+        F.update('BTC-USD', high, low, close)
+        F.forecast()    # {'BTC-USD': -1, 0 or 1}
+        F.latency()     # p50/p99 in ms
+
+    The model (or the path it is saved at) is only loaded, and TensorFlow
+    only imported, on the first forecast.
+    '''
+
+    def __init__(self, model=None, lookback=96, scale=None, runtime='keras', maxLatencies=10000):
+        '''
+        :param model: keras model, path of a saved one, or a NumpyModel
+        :param scale: (mean, std) feature scaling the model was trained with
+        :param runtime: 'keras', 'tflite' or 'numpy'
+        '''
+        if runtime not in ('keras', 'tflite', 'numpy'):
+            raise Exception('Forecaster runtime must be one of "keras", "tflite" or "numpy"')
+        self.source = model
+        self.model = None
+        self.lookback = lookback
+        self.scale = scale
+        self.runtime = runtime
+        self.windows = {}
+        self.latencies = deque(maxlen=maxLatencies)
+
+    def _load(self):
+        model = self.source
+        if isinstance(model, str):
+            from tensorflow import keras
+            model = keras.models.load_model(model)
+        if self.runtime == 'numpy' and not isinstance(model, NumpyModel):
+            model = NumpyModel.fromKeras(model)
+        elif self.runtime == 'tflite':
+            model = TFLiteModel(model)
+        self.model = model
+
+    def addProduct(self, product, history=None):
+        self.windows[product] = FeatureWindow(self.lookback, self.scale)
+        if history is not None:
+            self.windows[product].seed(history)
+
+    def update(self, product, high, low, close):
+        return self.windows[product].update(high, low, close)
+
+    def forecast(self, products=None):
+        '''
+        Predicts the sell/hold/buy class of several products in one call.
+        :param products: products to forecast, all by default
+        :return: dict of product to -1, 0 or 1 (None until its window is full)
+        '''
+        t0 = time.perf_counter()
+        if self.model is None:
+            self._load()
+        products = list(self.windows) if products is None else products
+        windows = {p: self.windows[p].window() for p in products}
+        ready = [p for p in products if windows[p] is not None]
+        result = {p: None for p in products}
+        if ready:
+            x = np.stack([windows[p] for p in ready])
+            if self.runtime == 'keras':
+                # calling the model skips the per-call setup of predict()
+                probs = np.asarray(self.model(x, training=False))
+            else:
+                probs = self.model.predict(x)
+            for p, k in zip(ready, np.argmax(probs, axis=1).tolist()):
+                result[p] = k - 1
+        self.latencies.append(time.perf_counter() - t0)
+        return result
+
+    def latency(self):
+        '''
+        :return: dict of p50 and p99 forecast latency in ms, and the count
+        '''
+        if not self.latencies:
+            return dict(p50=np.nan, p99=np.nan, count=0)
+        p50, p99 = np.percentile(np.array(self.latencies) * 1e3, [50, 99])
+        return dict(p50=p50, p99=p99, count=len(self.latencies))
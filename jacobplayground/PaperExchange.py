@@ -0,0 +1,234 @@
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from jacobplayground.Clock import VirtualClock
+
+CANDLE_COLUMNS = ['time', 'low', 'high', 'open', 'close', 'volume']
+
+
+def toEpoch(t):
+    '''
+    :param t: epoch seconds, datetime or ISO-8601 string; naive times are UTC
+    :return: epoch seconds
+    '''
+    if t is None or isinstance(t, (int, float, np.integer, np.floating)):
+        return t
+    t = pd.Timestamp(t)
+    if t.tzinfo is None:
+        t = t.tz_localize('UTC')
+    return t.timestamp()
+
+
+def num(x):
+    '''
+    cbpro formats every number as a string.
+    '''
+    return repr(float(x))
+
+
+def isoTime(t):
+    return datetime.fromtimestamp(t, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class PaperExchange:
+
+    '''
+    Local stand-in for the subset of the cbpro clients AlgoBot uses:
+    `get_product_ticker`, `get_product_historic_rates` and
+    `place_market_order`, replaying stored candles against a clock.
+
+        clock = VirtualClock(start='2021-07-01')
+        exchange = PaperExchange.fromWiener(hours=24 * 240, start='2021-01-01', clock=clock, cash=1000)
+        bot = AlgoBot('BTC-USD', 1000, client=exchange, clock=clock)
+        bot.runSim()    # 16 days of trading, not blocking on the sleeps
+
+    The price at a time is the close of the last candle completed by then,
+    so nothing ahead of the clock leaks out. Market orders fill at once at
+    that price moved by `slippage` against the order, after `latency`
+    seconds on the clock, and pay `fee` of their executed value in
+    `fill_fees`. Orders, balances and responses follow cbpro's shapes, down
+    to the string-formatted numbers.
+    '''
+
+    def __init__(self, candles, clock=None, cash=10000.0, fee=0.005, slippage=0.0005, latency=0.0,
+                 granularity=None, keepOrders=100000):
+        '''
+        :param candles: DataFrame of candles with time (epoch seconds or
+        datetimes), low, high, open, close and volume columns, any product
+        :param clock: VirtualClock or RealClock, a VirtualClock at the first
+        candle if None
+        :param cash: starting USD balance
+        :param fee: fraction of the executed value charged on every fill
+        :param slippage: fraction the fill price moves against the order
+        :param latency: seconds between placing and filling an order
+        :param granularity: seconds per candle, inferred if None
+        :param keepOrders: number of the latest orders kept in `orders`
+        '''
+        t = candles['time']
+        if not pd.api.types.is_numeric_dtype(t):
+            t = pd.to_datetime(t).astype('datetime64[ns]').astype(np.int64) / 1e9
+        order = np.argsort(t.to_numpy(), kind='stable')
+        self.time = t.to_numpy(dtype=np.float64)[order]
+        self.low, self.high, self.open, self.close, self.volume = [
+            candles[c].to_numpy(dtype=np.float64)[order] for c in CANDLE_COLUMNS[1:]]
+        self.granularity = granularity or (float(np.median(np.diff(self.time))) if len(self.time) > 1 else 60.0)
+        self.clock = clock if clock is not None else VirtualClock(self.time[0])
+        self.fee = fee
+        self.slippage = slippage
+        self.latency = latency
+        self.balances = {'USD': float(cash)}
+        self.orders = deque(maxlen=keepOrders)
+        self.tradeId = 0
+
+    @classmethod
+    def fromWiener(cls, hours, start, s0=30000.0, nsigma=4.0, seed=None, granularity=60, **kwargs):
+        '''
+        Exchange over candles of a WienerDataset path, one path point per
+        candle: each close is a trade, the candle opening at the previous
+        close.
+        :param hours: hours of candles
+        :param start: time of the first candle
+        :param granularity: seconds per candle
+        '''
+        from davidplayground.datasets import WienerDataset
+
+        n = int(hours * 3600 // granularity)
+        rng = np.random.default_rng(seed)
+        close = WienerDataset(s0=s0, nsigma=nsigma).generate(hours=-(-n // 60), rng=rng, raw=True)['close'].to_numpy()[:n]
+        prev = np.concatenate([close[:1], close[:-1]])
+        candles = pd.DataFrame({
+            'time': toEpoch(start) + float(granularity) * np.arange(n),
+            'low': np.minimum(prev, close), 'high': np.maximum(prev, close),
+            'open': prev, 'close': close,
+            'volume': rng.exponential(10.0, n),
+        })
+        return cls(candles, granularity=float(granularity), **kwargs)
+
+    @classmethod
+    def fromArchive(cls, archive, start=None, end=None, **kwargs):
+        '''
+        Exchange over the candles of a CandleArchive between start and end.
+        '''
+        return cls(archive.slice(start, end).to_frame(unit='s'), **kwargs)
+
+    def _last(self, t):
+        '''
+        :return: index of the last candle completed at time t, -1 if none
+        '''
+        return int(np.searchsorted(self.time, t - self.granularity, side='right')) - 1
+
+    def price(self, t=None):
+        i = self._last(self.clock.time() if t is None else t)
+        if i < 0:
+            raise Exception('No candle has completed yet at the time of the exchange clock')
+        return float(self.close[i])
+
+    def _product(self, product_id):
+        return product_id.split('-')[0]
+
+    def get_product_ticker(self, product_id):
+        t = self.clock.time()
+        i = self._last(t)
+        if i < 0:
+            return {'message': 'NotFound'}
+        price = self.close[i]
+        return {'trade_id': i, 'price': num(price), 'size': num(self.volume[i]),
+                'bid': num(price * (1 - self.slippage)), 'ask': num(price * (1 + self.slippage)),
+                'volume': num(self.volume[max(i - int(86400 // self.granularity) + 1, 0):i + 1].sum()),
+                'time': isoTime(t)}
+
+    def get_product_historic_rates(self, product_id, start=None, end=None, granularity=None):
+        '''
+        Candles of `granularity` seconds (a multiple of the stored one)
+        overlapping [start, end], newest first, at most 300 of them as
+        cbpro returns, and only those completed by the clock.
+        :return: list of [time, low, high, open, close, volume]
+        '''
+        now = self.clock.time()
+        granularity = int(granularity or self.granularity)
+        k = max(int(round(granularity / self.granularity)), 1)
+        end = now if end is None else min(toEpoch(end), now)
+        start = end - 300 * granularity if start is None else toEpoch(start)
+        # whole buckets of `granularity` overlapping [start, end], completed by now
+        first = np.floor(start / granularity) * granularity
+        last = min(np.floor(end / granularity) * granularity, np.floor(now / granularity) * granularity - granularity)
+        lo = int(np.searchsorted(self.time, first, side='left'))
+        hi = int(np.searchsorted(self.time, last + granularity, side='left'))
+        if hi <= lo:
+            return []
+        t = self.time[lo:hi]
+        if k == 1:
+            idx = np.arange(lo, hi)
+            rows = np.column_stack([t, self.low[idx], self.high[idx], self.open[idx], self.close[idx],
+                                    self.volume[idx]])
+        else:
+            bucket = np.floor(t / granularity) * granularity
+            starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+            ends = np.append(starts[1:], len(t)) - 1
+            rows = np.column_stack([
+                bucket[starts],
+                np.minimum.reduceat(self.low[lo:hi], starts), np.maximum.reduceat(self.high[lo:hi], starts),
+                self.open[lo:hi][starts], self.close[lo:hi][ends], np.add.reduceat(self.volume[lo:hi], starts),
+            ])
+        rows = rows[rows[:, 0] + granularity > start][-300:][::-1]
+        return [[int(r[0])] + r[1:].tolist() for r in rows]
+
+    def place_market_order(self, product_id, side, size=None, funds=None, client_oid=None, stp=None,
+                           overdraft_enabled=None, funding_amount=None):
+        '''
+        Fills a market order of `size` coin or `funds` USD. Buying with
+        funds spends them fees included; selling with funds sells that much
+        USD worth of the coin.
+        :return: the done order, or {'message': ...} when it is rejected
+        '''
+        if side not in ['buy', 'sell']:
+            return {'message': 'Invalid side'}
+        if (size is None) == (funds is None):
+            return {'message': 'Exactly one of size and funds is required'}
+        created = self.clock.time()
+        if self.latency:
+            self.clock.sleep(self.latency)
+        done = self.clock.time()
+        i = self._last(done)
+        if i < 0:
+            return {'message': 'NotFound'}
+        coin = self._product(product_id)
+        price = float(self.close[i]) * (1 + self.slippage if side == 'buy' else 1 - self.slippage)
+        if side == 'buy':
+            executed = float(size) * price if size is not None else float(funds) / (1 + self.fee)
+            filled = float(size) if size is not None else executed / price
+            fees = executed * self.fee
+            if executed + fees > self.balances['USD'] * (1 + 1e-12):
+                return {'message': 'Insufficient funds'}
+            self.balances['USD'] -= executed + fees
+            self.balances[coin] = self.balances.get(coin, 0.0) + filled
+        else:
+            filled = float(size) if size is not None else float(funds) / price
+            executed = filled * price
+            fees = executed * self.fee
+            if filled > self.balances.get(coin, 0.0) * (1 + 1e-12):
+                return {'message': 'Insufficient funds'}
+            self.balances[coin] = self.balances.get(coin, 0.0) - filled
+            self.balances['USD'] += executed - fees
+        self.tradeId += 1
+        order = {
+            'id': f'paper-{self.tradeId}', 'product_id': product_id, 'side': side, 'type': 'market',
+            'post_only': False, 'created_at': isoTime(created), 'done_at': isoTime(done),
+            'done_reason': 'filled', 'status': 'done', 'settled': True,
+            'filled_size': num(filled), 'executed_value': num(executed), 'fill_fees': num(fees),
+        }
+        if size is not None:
+            order['size'] = num(float(size))
+        else:
+            order['funds'] = order['specified_funds'] = num(float(funds))
+        if client_oid is not None:
+            order['client_oid'] = client_oid
+        self.orders.append(order)
+        return order
+
+    def get_accounts(self):
+        return [{'currency': c, 'balance': num(b), 'available': num(b), 'hold': '0'}
+                for c, b in self.balances.items()]
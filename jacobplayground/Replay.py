@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from jacobplayground.Scheduler import Scheduler
+from jacobplayground.Session import STEP_DTYPE
+
+
+class Replay:
+
+    '''
+    Runs trading sessions of an AlgoBot back to back on its clock, keeping
+    the net worth, transactions and step timings of each one. On a
+    VirtualClock over a PaperExchange, time moves as fast as the steps
+    compute:
+
+        clock = VirtualClock('2021-07-01')
+        exchange = PaperExchange.fromWiener(hours=24 * 365 * 40, start='2021-01-01', clock=clock,
+                                            granularity=3600)
+        bot = AlgoBot('BTC-USD', 1000, client=exchange, clock=clock)
+        replay = Replay(bot).run(sessions=1000)
+        replay.report()     # sessions/hour and per-step latency of every phase
+        replay.summary()    # one row per session
+    '''
+
+    def __init__(self, bot, scheduler=None):
+        self.bot = bot
+        self.scheduler = scheduler if scheduler is not None else Scheduler(bot.clock)
+        self.steps = bot.MAX_TRADING_SESSION // 6
+        if bot.session.netWorth.capacity < self.steps:
+            raise Exception(f'Session capacity {bot.session.netWorth.capacity} is below the {self.steps} steps of a session')
+        self.traces = []
+        self.wall = 0.0
+
+    def run(self, sessions=1):
+        '''
+        :return: self
+        '''
+        bot, session = self.bot, self.bot.session
+        for _ in range(sessions):
+            start = bot.clock.time()
+            transactions = session.transactions.count
+            t0 = time.perf_counter()
+            bot.runSim(self.scheduler)
+            wall = time.perf_counter() - t0
+            self.wall += wall
+            self.traces.append({
+                'start': start, 'end': bot.clock.time(), 'wall': wall,
+                'netWorth': session.netWorth.last(self.steps),
+                'transactions': session.transactions.last(session.transactions.count - transactions),
+                'steps': session.steps.last(self.steps),
+            })
+            bot.reset()
+        return self
+
+    def netWorth(self):
+        '''
+        :return: (sessions, steps) array of the net worth after every step
+        '''
+        return np.array([trace['netWorth'] for trace in self.traces])
+
+    def stepTimes(self):
+        '''
+        :return: structured array (STEP_DTYPE) of the timings of every step
+        '''
+        if not self.traces:
+            return np.zeros(0, dtype=STEP_DTYPE)
+        return np.concatenate([trace['steps'] for trace in self.traces])
+
+    def summary(self):
+        '''
+        :return: DataFrame of one row per session
+        '''
+        return pd.DataFrame([{
+            'start': pd.Timestamp(trace['start'], unit='s'), 'end': pd.Timestamp(trace['end'], unit='s'),
+            'wall': trace['wall'], 'trades': len(trace['transactions']),
+            'buys': int((trace['transactions']['side'] == 1).sum()), 'netWorth': trace['netWorth'][-1],
+        } for trace in self.traces])
+
+    def report(self):
+        '''
+        :return: dict of throughput and per-phase step latency in ms
+        '''
+        steps = self.stepTimes()
+        total = sum(steps[phase].sum() for phase in STEP_DTYPE.names)
+        phases = {}
+        for phase in STEP_DTYPE.names:
+            ms = steps[phase] * 1e3
+            p50, p99 = np.percentile(ms, [50, 99]) if len(ms) else (np.nan, np.nan)
+            phases[phase] = {'mean_ms': ms.mean() if len(ms) else np.nan, 'p50_ms': p50, 'p99_ms': p99,
+                             'share': steps[phase].sum() / total if total else np.nan}
+        simulated = sum(trace['end'] - trace['start'] for trace in self.traces)
+        return {
+            'sessions': len(self.traces), 'steps': len(steps), 'wall_seconds': self.wall,
+            'sessions_per_hour': len(self.traces) / self.wall * 3600 if self.wall else np.nan,
+            'simulated_days': simulated / 86400,
+            'speedup': simulated / self.wall if self.wall else np.nan,
+            'phases': phases,
+        }
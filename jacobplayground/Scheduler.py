@@ -0,0 +1,67 @@
+import heapq
+import itertools
+
+from jacobplayground.Clock import RealClock
+
+
+class Scheduler:
+
+    '''
+    Event scheduler on a clock. Events run in time order, and the clock
+    sleeps until each one is due: on a RealClock that is real waiting, on a
+    VirtualClock time just jumps ahead, so the same schedule runs live or
+    replays as fast as the callbacks allow.
+
+        scheduler = Scheduler(VirtualClock('2021-07-01'))
+        scheduler.every(12 * 60 * 60, bot.step, count=32)
+        scheduler.run()
+    '''
+
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else RealClock()
+        self.queue = []     # heap of (time, sequence, callback, interval, remaining)
+        self.sequence = itertools.count()   # ties run in the order they were scheduled
+
+    def __len__(self):
+        return len(self.queue)
+
+    def at(self, t, callback):
+        '''
+        Runs callback() at clock time t (epoch seconds).
+        :return: self
+        '''
+        heapq.heappush(self.queue, (t, next(self.sequence), callback, None, 1))
+        return self
+
+    def every(self, interval, callback, count=None, start=None):
+        '''
+        Runs callback() every `interval` seconds, `count` times (forever if
+        None), the first time at `start` (now by default).
+        :return: self
+        '''
+        start = self.clock.time() if start is None else start
+        heapq.heappush(self.queue, (start, next(self.sequence), callback, interval, count))
+        return self
+
+    def run(self, until=None):
+        '''
+        Runs the events due before `until` (all of them if None), then
+        sleeps the clock up to `until`.
+        :return: number of events run
+        '''
+        ran = 0
+        while self.queue and (until is None or self.queue[0][0] < until):
+            t, _, callback, interval, remaining = heapq.heappop(self.queue)
+            wait = t - self.clock.time()
+            if wait > 0:
+                self.clock.sleep(wait)
+            callback()
+            ran += 1
+            if interval is not None and (remaining is None or remaining > 1):
+                heapq.heappush(self.queue, (t + interval, next(self.sequence), callback, interval,
+                                            None if remaining is None else remaining - 1))
+        if until is not None:
+            wait = until - self.clock.time()
+            if wait > 0:
+                self.clock.sleep(wait)
+        return ran
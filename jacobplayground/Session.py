@@ -0,0 +1,190 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from jacobplayground.WalkForward import FEATURES
+
+CANDLE_FIELDS = ['time', 'low', 'high', 'open', 'close', 'volume']
+
+SIDES = {'hold': 0, 'buy': 1, 'sell': -1}
+
+TRANSACTION_DTYPE = np.dtype([
+    ('time', np.float64),   # epoch seconds
+    ('side', np.int8),      # SIDES
+    ('price', np.float64),
+    ('size', np.float64),   # coin filled
+    ('funds', np.float64),  # USD spent or received
+    ('fees', np.float64),
+])
+
+# seconds each phase of a trading step took
+STEP_DTYPE = np.dtype([(phase, np.float64) for phase in ['data', 'technicals', 'predict', 'order']])
+
+
+class RingBuffer:
+
+    '''
+    Fixed-capacity buffer of the last `capacity` records of a numpy dtype,
+    preallocated once. Records pushed out of it are appended to a binary
+    spill file if one is given (raw records, readable with `readSpill`), so
+    the full history stays on disk while memory stays constant. The spill
+    file belongs to this buffer: an existing one is truncated, not appended
+    to.
+    '''
+
+    def __init__(self, capacity, dtype, spillPath=None):
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.buffer = np.zeros(capacity, dtype=self.dtype)
+        self.count = 0  # records appended so far, including the spilled ones
+        self.spillPath = spillPath
+        self.spill = open(spillPath, 'wb') if spillPath else None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, record):
+        '''
+        :return: index of the record in the ring
+        '''
+        i = self.count % self.capacity
+        if self.count >= self.capacity and self.spill is not None:
+            self.spill.write(self.buffer[i:i + 1].tobytes())
+        self.buffer[i] = record
+        self.count += 1
+        return i
+
+    def last(self, n=None):
+        '''
+        :return: copy of the last `n` records (all buffered ones by default), oldest first
+        '''
+        n = len(self) if n is None else min(n, len(self))
+        return self.buffer[np.arange(self.count - n, self.count) % self.capacity]
+
+    def latest(self):
+        return None if self.count == 0 else self.buffer[(self.count - 1) % self.capacity]
+
+    def readSpill(self):
+        '''
+        :return: memory-mapped array of the spilled records, oldest first
+        '''
+        if self.spill is None:
+            return np.zeros(0, dtype=self.dtype)
+        self.spill.flush()
+        if os.path.getsize(self.spillPath) == 0:
+            return np.zeros(0, dtype=self.dtype)
+        return np.memmap(self.spillPath, dtype=self.dtype, mode='r')
+
+    def history(self):
+        '''
+        :return: every record ever appended, spilled ones first
+        '''
+        return np.concatenate([self.readSpill(), self.last()])
+
+    def flush(self):
+        if self.spill is not None:
+            self.spill.flush()
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+
+class TradingSession:
+
+    '''
+    Constant-memory state of a trading bot: the latest candles with their
+    features, the transaction log, the net worth after every step and the
+    time each step took, each
+    in a preallocated ring buffer of `capacity` records spilling older ones
+    to `spillDir`.
+
+        session = TradingSession(capacity=1024, spillDir='sessions/BTC-USD')
+        session.addCandle(candle, features)
+        session.recordTransaction(order, price, t)
+        session.recordNetWorth(cash + position)
+        session.getLastBuy()    # O(1)
+        session.candles.history()   # everything, from disk and memory
+
+    The last buy is kept aside when it is recorded, so looking it up does
+    not depend on how many transactions came after it, nor on whether it
+    was spilled.
+    '''
+
+    def __init__(self, capacity=1024, features=FEATURES, spillDir=None):
+        # feature rows come in the order of `features`; ones that are candle
+        # fields too (close) are stored once
+        self.featureIdx = [i for i, f in enumerate(features) if f not in CANDLE_FIELDS]
+        self.features = [features[i] for i in self.featureIdx]
+        self.candleDtype = np.dtype([(f, np.float64) for f in CANDLE_FIELDS + self.features])
+        if spillDir is not None:
+            os.makedirs(spillDir, exist_ok=True)
+        path = lambda name: None if spillDir is None else os.path.join(spillDir, name)
+        self.candles = RingBuffer(capacity, self.candleDtype, path('candles.bin'))
+        self.transactions = RingBuffer(capacity, TRANSACTION_DTYPE, path('transactions.bin'))
+        self.netWorth = RingBuffer(capacity, np.float64, path('networth.bin'))
+        self.steps = RingBuffer(capacity, STEP_DTYPE, path('steps.bin'))
+        self.lastBuy = None
+
+    def addCandle(self, candle, features=None):
+        '''
+        :param candle: [time, low, high, open, close, volume]
+        :param features: values of the `features` given to the session, NaN if None
+        '''
+        record = tuple(candle[:len(CANDLE_FIELDS)]) + (
+            (np.nan,) * len(self.features) if features is None else tuple(features[i] for i in self.featureIdx))
+        self.candles.append(record)
+
+    def recordTransaction(self, order, price, t=None):
+        '''
+        Logs an order in the shape cbpro returns them.
+        :param order: dict with side, and filled_size, executed_value and
+        fill_fees once filled
+        :param price: price of the product when the order was placed
+        :param t: epoch seconds, the order's done_at/created_at if None
+        '''
+        if t is None:
+            stamp = order.get('done_at') or order.get('created_at')
+            t = pd.Timestamp(stamp).timestamp() if stamp else np.nan
+        record = np.array((t, SIDES[order.get('side', 'hold')], price, float(order.get('filled_size', 0.0)),
+                           float(order.get('executed_value', order.get('funds', 0.0))),
+                           float(order.get('fill_fees', 0.0))), dtype=TRANSACTION_DTYPE)
+        self.transactions.append(record)
+        if record['side'] == SIDES['buy']:
+            self.lastBuy = record[()]
+        return record
+
+    def recordNetWorth(self, value):
+        self.netWorth.append(value)
+
+    def recordStep(self, data, technicals, predict, order):
+        self.steps.append((data, technicals, predict, order))
+
+    def getLastBuy(self):
+        '''
+        :return: the last buy record (fields of TRANSACTION_DTYPE), None if
+        there was no buy
+        '''
+        return self.lastBuy
+
+    def frame(self, n=None):
+        '''
+        :return: DataFrame of the last `n` candles and their features
+        '''
+        return pd.DataFrame(self.candles.last(n))
+
+    def nbytes(self):
+        return sum(ring.buffer.nbytes for ring in self.rings())
+
+    def rings(self):
+        return [self.candles, self.transactions, self.netWorth, self.steps]
+
+    def flush(self):
+        for ring in self.rings():
+            ring.flush()
+
+    def close(self):
+        for ring in self.rings():
+            ring.close()
@@ -7,10 +7,12 @@ class TechnicalIndicators:
     Supported indicators:
         + Trend
             - MACD(x,y,z)
+            - TRIX
         + Momentum
             - Williams
             - RSI
             - Balance of Power
+            - Golden Cross
         + Volatility
             - Average True Range
             - Bollinger
@@ -24,64 +26,130 @@ class TechnicalIndicators:
 
     It is assumed that the passed input data has the attributes, in order,
         --> 'time', 'low', 'high', 'open', 'close', 'volume'
+
+    Indicators are requested by group, with optional parameters by name:
+
+        TI = TechnicalIndicators(df, trend=['macd'], momentum=['rsi', 'williams'],
+                                 volatility=['bbands', 'atr'], params={'rsi': {'period': 7}})
+        TI.df # dataset with the indicator columns
     '''
 
-    def __init__(self, data, **kwargs):
+    def __init__(self, data, params=None, **kwargs):
         self.df = data
+        self.features = {}
 
         if not kwargs:
             print('No technical indicators specified.')
             return
 
-        for k, v in kwargs:
+        # every indicator reads the same contiguous float64 arrays, and the
+        # results are added to the frame in one go at the end
+        self._cols = {c: np.ascontiguousarray(data[c].to_numpy(dtype=np.float64))
+                      for c in ('open', 'high', 'low', 'close') if c in data}
+        params = params or {}
+
+        for k, v in kwargs.items():
             if k == 'trend':
                 for x in v:
                     if x.lower() == 'macd':
-                        self._addMACD()
+                        self._addMACD(**params.get('macd', {}))
+                    elif x.lower() == 'trix':
+                        self._addTRIX(**params.get('trix', {}))
+                    else:
+                        print(f'Trend indicator {x} not recognized.')
             elif k == 'momentum':
                 for x in v:
                     if x.lower() == 'rsi':
-                        self._addRSI()
+                        self._addRSI(**params.get('rsi', {}))
                     elif x.lower() == 'williams':
-                        self._addWilliams()
+                        self._addWilliams(**params.get('williams', {}))
                     elif x.lower() == 'bop':
-                        self._addBOP()
+                        self._addBOP(**params.get('bop', {}))
                     elif x.lower() == 'gc':
-                        self._addGoldenCross()
+                        self._addGoldenCross(**params.get('gc', {}))
+                    else:
+                        print(f'Momentum indicator {x} not recognized.')
             elif k == 'volatility':
                 for x in v:
                     if x.lower() == 'bbands':
-                        self._addBBands()
+                        self._addBBands(**params.get('bbands', {}))
                     elif x.lower() == 'atr':
-                        self._addATR()
+                        self._addATR(**params.get('atr', {}))
+                    else:
+                        print(f'Volatility indicator {x} not recognized.')
             elif k == 'price_transform':
-                O, H, L, C = self.df.open, self.df.high, self.df.low, self.df.close
-                # average
-                if v.lower() == 'a':
-                    self.df['ap'] = (O + H + L + C) / 4
-                # median
-                elif v.lower() == 'median':
-                    self.df['mp'] = (H + L) / 2
-                # typical
-                elif v.lower() == 'typical':
-                    self.df['tp'] = (H + L + C) / 3
-                # weighted
-                elif v.lower() == 'weighted':
-                    self.df['wp'] = (2 * C + H + L) / 4
-                else:
-                    print('Price transform value not recognized.')
+                O, H, L, C = (self._cols[c] for c in ('open', 'high', 'low', 'close'))
+                for x in ([v] if isinstance(v, str) else v):
+                    # average
+                    if x.lower() == 'a':
+                        self.features['ap'] = (O + H + L + C) / 4
+                    # median
+                    elif x.lower() == 'median':
+                        self.features['mp'] = (H + L) / 2
+                    # typical
+                    elif x.lower() == 'typical':
+                        self.features['tp'] = (H + L + C) / 3
+                    # weighted
+                    elif x.lower() == 'weighted':
+                        self.features['wp'] = (2 * C + H + L) / 4
+                    else:
+                        print('Price transform value not recognized.')
             elif k == 'sma':
                 for x in v:
-                    self.df['sma_' + str(x)] = self.df.close.rolling(x).mean()
-                
-            
-                
+                    self.features['sma_' + str(x)] = _sma(self._cols['close'], x)
+            else:
+                print(f'Indicator group {k} not recognized.')
+
+        self.df = self.df.assign(**self.features)
 
     # Trend Indicators
 
     def _addMACD(self, slower=12, slowest=26, slow=9):
-        pass
-        
+        '''
+        ___________________________________________________________________
+
+        Description
+            Difference between a fast and a slow EMA of the close, with a
+            signal line that is an EMA of the difference itself.
+
+        Interpretation
+            MACD crossing above its signal line is a buy signal, crossing
+            below it a sell signal.
+
+        Formula
+            MACD = EMA(Close, slower) - EMA(Close, slowest)
+            MACDsignal = EMA(MACD, slow)
+            MACDdiff = MACD - MACDsignal
+        ___________________________________________________________________
+        '''
+        C = self._cols['close']
+        macd = _ema(C, span=slower) - _ema(C, span=slowest)
+        signal = _ema(macd, span=slow)
+        self.features['MACD'] = macd
+        self.features['MACDsignal'] = signal
+        self.features['MACDdiff'] = macd - signal
+
+    def _addTRIX(self, period=15):
+        '''
+        ___________________________________________________________________
+
+        Description
+            Rate of change of a triple-smoothed EMA of the close, filtering
+            out moves shorter than the period.
+
+        Interpretation
+            TRIX > 0: upward momentum, TRIX < 0: downward momentum
+
+        Formula
+            TRIX = 100 * (EMA3_t - EMA3_t-1) / EMA3_t-1
+            EMA3 = EMA(EMA(EMA(Close, period), period), period)
+        ___________________________________________________________________
+        '''
+        ema3 = _ema(_ema(_ema(self._cols['close'], span=period), span=period), span=period)
+        trix = np.full(len(ema3), np.nan)
+        trix[1:] = 100 * (ema3[1:] - ema3[:-1]) / ema3[:-1]
+        self.features['trix'] = trix
+
     # Momentum Indicators
 
     def _addRSI(self, period=14):
@@ -101,9 +169,17 @@ class TechnicalIndicators:
             RSI = 100 - 1 / (1 + RS)
             RS = Average Gain over Period / Average Loss over Period
 
+            Averages use Wilder's smoothing, seeded with the mean of the
+            first `period` price changes.
         ___________________________________________________________________
         '''
-        pass
+        C = self._cols['close']
+        diff = np.zeros(len(C))
+        diff[1:] = C[1:] - C[:-1]
+        gain = _wilder(np.maximum(diff, 0.0), period, start=1)
+        loss = _wilder(np.maximum(-diff, 0.0), period, start=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.features['RSI'] = 100 - 100 / (1 + gain / loss)
     
     def _addWilliams(self, lookback=14):
         '''
@@ -123,9 +199,11 @@ class TechnicalIndicators:
             %R = -100 * [(Highest High - Close) / (Highest High - Lowest Low)]
         ___________________________________________________________________
         '''
-        window = self.df[-lookback:]
-        hh, ll = max(window.high), min(window.low)
-        self.df['Williams %R'] = -100 * ((hh - window.close) / (hh - ll))
+        H, L, C = self._cols['high'], self._cols['low'], self._cols['close']
+        hh = _rolling(H, lookback, np.maximum)
+        ll = _rolling(L, lookback, np.minimum)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.features['Williams %R'] = -100 * ((hh - C) / (hh - ll))
         
 
     def _addBOP(self, period=12):
@@ -147,12 +225,13 @@ class TechnicalIndicators:
         '''
         # Consider use of EMA over SMA since we are interested in the
         # imminent future
-        C, O, H, L = self.df.close, self.df.open, self.df.high, self.df.low
-        self.df['BOP'] = pd.Series((C - O)/(H - L)).rolling(period).mean()
+        C, O, H, L = (self._cols[c] for c in ('close', 'open', 'high', 'low'))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.features['BOP'] = _sma((C - O)/(H - L), period)
 
     # Volatility Indicators
 
-    def _addBBands(self):
+    def _addBBands(self, period=20, K=(1, 2)):
         '''
         ___________________________________________________________________
         
@@ -169,26 +248,103 @@ class TechnicalIndicators:
             bands are considered a hold signal.
 
         Formula
-            UBB, LBB = SMA(Close, period=20) +/- StDev(Typical Price)
+            UBB, LBB = SMA(Close, period=20) +/- K * StDev(Typical Price)
+
+            The bands are added for every K, as bolu_sdK and boll_sdK.
         ___________________________________________________________________
         '''
-        _tp = pd.Series((self.df.high + self.df.low + self.df.close) / 3)
-        
-        pass
+        H, L, C = self._cols['high'], self._cols['low'], self._cols['close']
+        mid = _sma(C, period)
+        sd = pd.Series((H + L + C) / 3).rolling(period).std().to_numpy()
+        for k in K:
+            self.features[f'bolu_sd{k}'] = mid + k * sd
+            self.features[f'boll_sd{k}'] = mid - k * sd
+
+    def _addGoldenCross(self, fast=50, slow=200):
+        '''
+        ___________________________________________________________________
+
+        Description
+            Crossings of a fast and a slow SMA of the close.
+
+        Interpretation
+            +1 on the bar the fast SMA crosses above the slow one (golden
+            cross), -1 when it crosses below (death cross), 0 otherwise.
 
-    def _addGoldenCross(self):
+        Formula
+            GC = sign(SMA(Close, fast) - SMA(Close, slow)), differenced
+        ___________________________________________________________________
         '''
+        C = self._cols['close']
+        with np.errstate(invalid='ignore'):
+            above = np.sign(_sma(C, fast) - _sma(C, slow))
+        cross = np.zeros(len(C))
+        cross[1:] = np.where(np.isnan(above[:-1]), 0, np.sign(above[1:] - above[:-1]))
+        self.features['GC'] = np.nan_to_num(cross)
+
+    def _addATR(self, period=14):
         '''
-        _tp = pd.Series()
-        sma_50 = self.df.close.rolling(20).mean()
-        sma_50
+        ___________________________________________________________________
+
+        Description
+            Average of the true range, the largest of the bar's range and
+            its gaps from the previous close.
 
-    def _addATR(self):
-        pass
+        Interpretation
+            Higher ATR means higher volatility, regardless of direction.
+
+        Formula
+            TR = max(High - Low, |High - Close_t-1|, |Low - Close_t-1|)
+            ATR = Wilder's smoothing of TR over the period
+        ___________________________________________________________________
+        '''
+        H, L, C = self._cols['high'], self._cols['low'], self._cols['close']
+        tr = H - L
+        prev = C[:-1]
+        tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(H[1:] - prev), np.abs(L[1:] - prev)))
+        self.features['ATR'] = _wilder(tr, period)
 
     # Price Transforms
 
 
-        
+def _sma(x, period):
+    return pd.Series(x).rolling(period).mean().to_numpy()
+
 
+def _ema(x, span=None, alpha=None):
+    return pd.Series(x).ewm(span=span, alpha=alpha, adjust=False).mean().to_numpy()
 
+
+def _rolling(x, period, reduce):
+    '''
+    Rolling maximum or minimum (reduce = np.maximum or np.minimum) of the
+    `period` values ending at each bar, NaN until the first window is full.
+    Running extremes within blocks of `period` values, forwards and
+    backwards (van Herk/Gil-Werman), give every window from two lookups.
+    '''
+    n = len(x)
+    out = np.full(n, np.nan)
+    if n >= period:
+        blocks = -(-n // period)
+        padded = np.full(blocks * period, x[-1])
+        padded[:n] = x
+        padded = padded.reshape(blocks, period)
+        forward = reduce.accumulate(padded, axis=1).ravel()
+        backward = reduce.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+        # the window [i - period + 1, i] spans the tail of one block and the head of the next
+        out[period - 1:] = reduce(backward[:n - period + 1], forward[period - 1:n])
+    return out
+
+
+def _wilder(x, period, start=0):
+    '''
+    Wilder's smoothing (alpha = 1 / period) of x[start:], seeded with the
+    mean of its first `period` values.
+    '''
+    out = np.full(len(x), np.nan)
+    first = start + period - 1
+    if len(x) > first:
+        seeded = x[first:].copy()
+        seeded[0] = x[start:first + 1].mean()
+        out[first:] = _ema(seeded, alpha=1.0 / period)
+    return out
@@ -0,0 +1,161 @@
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+FEATURES = ['close', 'MACD', 'MACDdiff', 'RSI', 'trix', 'bolu_sd1', 'boll_sd1', 'bolu_sd2', 'boll_sd2']
+
+
+class WalkForward:
+
+    '''
+    Walk-forward training and evaluation of a sequence model.
+
+    Samples are the lookback windows of a float32 feature matrix, kept as
+    strided views of it so no window is ever copied until it is batched.
+    Folds roll forward in time: train on `train_size` windows, skip `gap`
+    windows so no training label looks into the test period, test on the
+    next `test_size`, then move everything forward by `step`.
+
+        wf = WalkForward(features, target, lookback=96, train_size=2000, test_size=500, gap=12)
+        metrics = wf.run(build_model, epochs=5)
+        wf.model    # trained on the most recent fold, with feature scaling wf.scale
+
+    The target of a window is the target of its last row; windows with a
+    NaN feature or target (indicator warm-up, unknown future) are skipped.
+    '''
+
+    def __init__(self, features, target, lookback=96, train_size=2000, test_size=500, step=None, gap=0):
+        self.X = np.ascontiguousarray(features, dtype=np.float32)
+        self.y = np.asarray(target, dtype=np.float32)
+        self.lookback = lookback
+        self.train_size = train_size
+        self.test_size = test_size
+        self.step = step or test_size
+        self.gap = gap
+
+        # (windows, lookback, features) view into X
+        self.windows = sliding_window_view(self.X, lookback, axis=0).transpose(0, 2, 1)
+        bad = ~np.isfinite(self.X).all(axis=1)
+        bad_windows = sliding_window_view(bad, lookback).any(axis=1) if len(bad) >= lookback else np.zeros(0, bool)
+        self.labels = self.y[lookback - 1:]
+        self.valid = np.flatnonzero(~bad_windows & np.isfinite(self.labels))
+        self.model = None
+        self.scale = None
+        self.metrics = None
+
+    def folds(self):
+        '''
+        :return: list of (train, test) arrays of window indices
+        '''
+        folds = []
+        first = 0
+        while first + self.train_size + self.gap + self.test_size <= len(self.valid):
+            train = self.valid[first:first + self.train_size]
+            test_start = first + self.train_size + self.gap
+            folds.append((train, self.valid[test_start:test_start + self.test_size]))
+            first += self.step
+        return folds
+
+    def scaling(self, train):
+        '''
+        Mean and standard deviation of the features over the rows the
+        training windows cover, so test windows are scaled without peeking.
+        '''
+        rows = self.X[train[0]:train[-1] + self.lookback]
+        mu, sd = rows.mean(axis=0), rows.std(axis=0)
+        return mu, np.where(sd > 0, sd, 1.0).astype(np.float32)
+
+    def batches(self, idx, batch_size=32, scale=None, shuffle=False, seed=None):
+        '''
+        Generator of (windows, labels) batches. Only the batch being yielded
+        is copied out of the feature matrix.
+        :param idx: window indices
+        :param batch_size: windows per batch
+        :param scale: (mean, std) of the features, or None
+        :param shuffle: shuffle the windows every pass
+        :param seed: seed of the shuffle
+        '''
+        if shuffle:
+            idx = np.random.default_rng(seed).permutation(idx)
+        for i in range(0, len(idx), batch_size):
+            b = idx[i:i + batch_size]
+            xb = self.windows[b]
+            if scale is not None:
+                xb = (xb - scale[0]) / scale[1]
+            # classes -1/0/1 as 0/1/2
+            yield xb.astype(np.float32, copy=False), (self.labels[b] + 1).astype(np.int32)
+
+    def dataset(self, idx, batch_size=32, scale=None, shuffle=False, seed=None):
+        '''
+        The batches of `batches` as a prefetching tf.data pipeline.
+        '''
+        import tensorflow as tf
+
+        signature = (tf.TensorSpec(shape=(None, self.lookback, self.X.shape[1]), dtype=tf.float32),
+                     tf.TensorSpec(shape=(None,), dtype=tf.int32))
+        return tf.data.Dataset.from_generator(
+            lambda: self.batches(idx, batch_size, scale=scale, shuffle=shuffle, seed=seed),
+            output_signature=signature
+        ).prefetch(tf.data.AUTOTUNE)
+
+    def run(self, build_model, epochs=5, batch_size=32, verbose=0):
+        '''
+        Retrains a fresh model on every fold and evaluates it on the test
+        windows that follow.
+        :param build_model: callable (lookback, features) -> compiled keras model
+        with an accuracy metric
+        :return: DataFrame of per-fold metrics and throughput in samples/sec
+        '''
+        rows = []
+        for k, (train, test) in enumerate(self.folds()):
+            scale = self.scaling(train)
+            model = build_model(self.lookback, self.X.shape[1])
+            t0 = time.perf_counter()
+            model.fit(self.dataset(train, batch_size, scale, shuffle=True, seed=k), epochs=epochs, verbose=verbose)
+            t_fit = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            loss, accuracy = model.evaluate(self.dataset(test, batch_size, scale), verbose=verbose)
+            t_eval = time.perf_counter() - t0
+            rows.append(dict(
+                fold=k, train_start=int(train[0]), test_start=int(test[0]), test_end=int(test[-1]),
+                loss=loss, accuracy=accuracy,
+                train_samples_per_sec=len(train) * epochs / t_fit, eval_samples_per_sec=len(test) / t_eval,
+            ))
+            self.model, self.scale = model, scale
+        self.metrics = pd.DataFrame(rows)
+        return self.metrics
+
+
+def build_model(lookback, n_features, units=32, learning_rate=1e-3):
+    '''
+    LSTM classifier of the sell/hold/buy target.
+    '''
+    from tensorflow.keras import Sequential
+    from tensorflow.keras.layers import Dense, LSTM, Input
+    from tensorflow.keras.optimizers import Adam
+
+    model = Sequential([
+        Input(shape=(lookback, n_features)),
+        LSTM(units),
+        Dense(3, activation='softmax'),
+    ])
+    model.compile(optimizer=Adam(learning_rate=learning_rate), loss='sparse_categorical_crossentropy',
+                  metrics=['accuracy'])
+    return model
+
+
+def make_target(close, horizon=12, threshold=0.1):
+    '''
+    Sell/hold/buy target: +1 when the close `horizon` rows ahead exceeds the
+    current close by `threshold`, -1 for a drop of the same size, NaN where
+    the future close is not known yet.
+    :param close: array of closes, oldest first
+    :return: float32 array
+    '''
+    close = np.asarray(close, dtype=np.float64)
+    future = np.full(len(close), np.nan)
+    future[:len(close) - horizon] = close[horizon:]
+    target = np.select([future > (1 + threshold) * close, future < (1 - threshold) * close], [1, -1], default=0)
+    return np.where(np.isnan(future), np.nan, target).astype(np.float32)